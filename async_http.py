@@ -0,0 +1,130 @@
+# async_http.py
+
+import asyncio
+import weakref
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_MAX,
+    HTTP_POOL_SIZE,
+)
+import deadlines
+from http_client import (
+    RETRY_STATUSES,
+    REJECTED_STATUSES,
+    IDEMPOTENT_METHODS,
+    CircuitOpenError,
+    backoff,
+    breaker,
+    fits_deadline,
+    retry_after,
+)
+from telemetry import current_span
+from pipeline_logging import get_logger
+
+log = get_logger("http")
+
+# One client per event loop: httpx pools are bound to the loop that made them.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared AsyncClient for the running loop (keep-alive pool per host)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE * 4, max_keepalive_connections=HTTP_POOL_SIZE),
+            follow_redirects=True,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def aclose() -> None:
+    """Close the running loop's client (call before the loop shuts down)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def request(
+    method: str,
+    url: str,
+    *,
+    timeout=None,
+    retries: Optional[int] = None,
+    idempotent: Optional[bool] = None,
+    **kwargs,
+) -> httpx.Response:
+    """
+    Async counterpart of http_client.request(): same timeouts, retry policy,
+    Retry-After handling, deadline clamping and per-host circuit breaker
+    (the breaker state is shared with the sync client).
+    """
+    method = method.upper()
+    host = urlsplit(url).netloc
+    retries = HTTP_MAX_RETRIES if retries is None else retries
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    retry_statuses = RETRY_STATUSES if idempotent else REJECTED_STATUSES
+    connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (
+        (timeout, timeout) if timeout else (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    )
+    client = get_client()
+
+    attempt = 0
+    while True:
+        # Deadline first: a half-open trial must not be admitted and then abandoned.
+        deadlines.check(f"{method} {host}")
+        read = deadlines.clamp_timeout(read_timeout)
+        call_timeout = httpx.Timeout(read, connect=deadlines.clamp_timeout(connect_timeout))
+        if not breaker.allow(host):
+            raise CircuitOpenError(f"circuit open for {host}")
+
+        try:
+            resp = await client.request(method, url, timeout=call_timeout, **kwargs)
+        except (httpx.TransportError, httpx.TimeoutException) as e:
+            breaker.failure(host)
+            sent = not isinstance(e, (httpx.ConnectTimeout, httpx.ConnectError))
+            delay = backoff(attempt)
+            if attempt >= retries or (sent and not idempotent) or not fits_deadline(delay):
+                raise
+            log.debug(f"{method} {host} failed ({type(e).__name__}); retry {attempt + 1}/{retries} in {delay:.2f}s")
+        except BaseException:
+            # Cancelled (hedge loser), interrupted or a local error: no verdict
+            # on the host, but a half-open trial must not be left pending.
+            breaker.release(host)
+            raise
+        else:
+            if resp.status_code in RETRY_STATUSES:
+                breaker.failure(host)
+            else:
+                breaker.success(host)
+
+            if resp.status_code not in retry_statuses or attempt >= retries:
+                return resp
+
+            hinted = retry_after(resp)
+            delay = min(hinted, HTTP_BACKOFF_MAX) if hinted is not None else backoff(attempt)
+            if not fits_deadline(delay):
+                return resp
+            log.debug(f"{method} {host} → {resp.status_code}; retry {attempt + 1}/{retries} in {delay:.2f}s")
+
+        current_span().add("retries")
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, **kwargs)
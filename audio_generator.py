@@ -1,13 +1,17 @@
 # audio_generator.py
 
+import asyncio
 import os
 import wave
 
-from config import USE_MOCK_AI, LANGUAGE_MODE, require_env
+from config import USE_MOCK_AI, LANGUAGE_MODE
+import openai_scheduler
+from telemetry import span, traced
+from workspace import atomic_output, atomic_write
+from pipeline_logging import get_logger
 
-# Only import OpenAI in real mode
-if not USE_MOCK_AI:
-    from openai import OpenAI
+log = get_logger("tts")
+mock_log = get_logger("tts:mock")
 
 # Base TTS model
 MODEL = "gpt-4o-mini-tts"
@@ -18,81 +22,176 @@ VOICE_ES = "sofia"       # Spanish Latin American voice (best for Argentina)
 
 SPEED = 1.2  # 1.2x speed for snappy commentary
 
+# response_format="pcm": raw 24 kHz, 16-bit, mono samples
+PCM_RATE = 24000
 
-def _select_voice() -> str:
+
+def select_voice() -> str:
     """Choose voice based on LANGUAGE_MODE."""
     if LANGUAGE_MODE == "es":
-        print("[tts] LANGUAGE_MODE=es → Using Spanish voice 'sofia'")
+        log.info("LANGUAGE_MODE=es → Using Spanish voice 'sofia'")
         return VOICE_ES
     else:
-        print("[tts] LANGUAGE_MODE=en → Using English voice 'marin'")
+        log.info("LANGUAGE_MODE=en → Using English voice 'marin'")
         return VOICE_EN
 
 
+def _mock_wav(output_path: str) -> str:
+    mock_log.info("Mock mode enabled — generating silent WAV instead of calling OpenAI")
+
+    try:
+        with atomic_output(output_path) as tmp, wave.open(tmp, "w") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(16000)
+            wav.writeframes(b"\x00\x00" * 4000)  # ~0.25s silence
+
+        mock_log.info(f"Mock WAV created successfully ({output_path})")
+    except Exception as e:
+        mock_log.error(f"creating mock WAV: {e}")
+        return None
+
+    return output_path
+
+
+def _build_request(text: str, voice: str) -> dict:
+    if not text or not text.strip():
+        log.error("empty script passed to TTS")
+        raise ValueError("Empty transcript passed to TTS")
+
+    log.info("Real TTS mode — calling OpenAI API")
+    log.info(f"Model={MODEL}, Voice={voice}, Speed={SPEED}")
+    return {"model": MODEL, "voice": voice, "speed": SPEED, "input": text}
+
+
+@traced("stage.tts")
 def generate_tts_audio(text: str, output_path: str) -> str:
     """
     Generate TTS audio (real or mock), with full debug logging.
     """
-    print(f"[tts] Starting TTS generation → output: {output_path}")
+    log.info(f"Starting TTS generation → output: {output_path}")
 
     # Select correct voice
-    voice = _select_voice()
+    voice = select_voice()
 
     # ----------------------------------------------------
     # MOCK MODE — create a tiny silent WAV file
     # ----------------------------------------------------
     if USE_MOCK_AI:
-        print("[tts:mock] Mock mode enabled — generating silent WAV instead of calling OpenAI")
+        return _mock_wav(output_path)
 
-        try:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # ----------------------------------------------------
+    # REAL MODE — call OpenAI TTS API
+    # ----------------------------------------------------
+    request = _build_request(text, voice)
 
-            with wave.open(output_path, "w") as wav:
-                wav.setnchannels(1)
-                wav.setsampwidth(2)
-                wav.setframerate(16000)
-                wav.writeframes(b"\x00\x00" * 4000)  # ~0.25s silence
+    client = openai_scheduler.get_client()
 
-            print(f"[tts:mock] Mock WAV created successfully ({output_path})")
-        except Exception as e:
-            print(f"[tts:mock] ERROR creating mock WAV: {e}")
-            return None
+    try:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        return output_path
+        with span("openai.speech", model=MODEL, bytes_out=len(text.encode("utf-8"))) as sp:
+            response = openai_scheduler.call(
+                client.audio.speech.with_raw_response.create,
+                priority=openai_scheduler.HIGH,
+                hedge="openai.speech",
+                **request,
+            )
 
-    # ----------------------------------------------------
-    # REAL MODE — call OpenAI TTS API
-    # ----------------------------------------------------
-    if not text or not text.strip():
-        print("[tts] ERROR — empty script passed to TTS")
-        raise ValueError("Empty transcript passed to TTS")
+            if hasattr(response, "write_to_file"):
+                with atomic_output(output_path) as tmp:
+                    response.write_to_file(tmp)
+            else:
+                atomic_write(output_path, response.read())
 
-    print("[tts] Real TTS mode — calling OpenAI API")
-    print(f"[tts] Model={MODEL}, Voice={voice}, Speed={SPEED}")
+            sp.set("bytes_in", os.path.getsize(output_path))
 
-    api_key = require_env("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+        log.info(f"TTS audio saved successfully: {output_path}")
+
+    except Exception as e:
+        log.error(f"during real TTS generation: {e}")
+        return None
+
+    return output_path
+
+
+@traced("stage.tts")
+async def generate_tts_audio_async(text: str, output_path: str) -> str:
+    """Async generate_tts_audio(); same mock behavior and return contract."""
+    log.info(f"Starting TTS generation → output: {output_path}")
+
+    voice = select_voice()
+
+    if USE_MOCK_AI:
+        return _mock_wav(output_path)
+
+    request = _build_request(text, voice)
 
     try:
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        response = client.audio.speech.create(
-            model=MODEL,
-            voice=voice,
-            speed=SPEED,
-            input=text,
-        )
+        client = openai_scheduler.get_async_client()
+        with span("openai.speech", model=MODEL, bytes_out=len(text.encode("utf-8"))) as sp:
+            response = await openai_scheduler.acall(
+                client.audio.speech.with_raw_response.create,
+                priority=openai_scheduler.HIGH,
+                hedge="openai.speech",
+                **request,
+            )
+            data = response.content
+            await asyncio.to_thread(atomic_write, output_path, data)
+            sp.set("bytes_in", len(data))
 
-        if hasattr(response, "write_to_file"):
-            response.write_to_file(output_path)
-        else:
-            with open(output_path, "wb") as f:
-                f.write(response.read())
-
-        print(f"[tts] TTS audio saved successfully: {output_path}")
+        log.info(f"TTS audio saved successfully: {output_path}")
 
     except Exception as e:
-        print(f"[tts] ERROR during real TTS generation: {e}")
+        log.error(f"during real TTS generation: {e}")
         return None
 
-    return output_path
\ No newline at end of file
+    return output_path
+
+
+# ---------------------------------------------------------
+#   PIECEWISE TTS (streamed commentary, see voiceover_stream.py)
+# ---------------------------------------------------------
+def _pcm_request(text: str, voice: str) -> dict:
+    return {"model": MODEL, "voice": voice, "speed": SPEED, "input": text, "response_format": "pcm"}
+
+
+def synthesize_pcm(client, text: str, voice: str) -> bytes:
+    """Raw PCM for one piece of the script; pieces are joined with write_wav()."""
+    with span("openai.speech", model=MODEL, bytes_out=len(text.encode("utf-8"))) as sp:
+        response = openai_scheduler.call(
+            client.audio.speech.with_raw_response.create,
+            priority=openai_scheduler.HIGH,
+            hedge="openai.speech",
+            **_pcm_request(text, voice),
+        )
+        data = response.content
+        sp.set("bytes_in", len(data))
+    return data
+
+
+async def synthesize_pcm_async(client, text: str, voice: str) -> bytes:
+    with span("openai.speech", model=MODEL, bytes_out=len(text.encode("utf-8"))) as sp:
+        response = await openai_scheduler.acall(
+            client.audio.speech.with_raw_response.create,
+            priority=openai_scheduler.HIGH,
+            hedge="openai.speech",
+            **_pcm_request(text, voice),
+        )
+        data = response.content
+        sp.set("bytes_in", len(data))
+    return data
+
+
+def write_wav(output_path: str, pcm_pieces) -> str:
+    """Write PCM pieces, in order, as one WAV file (atomically)."""
+    with atomic_output(output_path) as tmp, wave.open(tmp, "w") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(PCM_RATE)
+        for pcm in pcm_pieces:
+            wav.writeframes(pcm)
+    log.info(f"TTS audio saved successfully: {output_path}")
+    return output_path
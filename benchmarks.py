@@ -0,0 +1,310 @@
+# benchmarks.py
+#
+# CPU microbenchmarks for the pipeline's local (no-network) hot paths.
+#
+#   python benchmarks.py                          # full run, saved as output/benchmarks/<label>.json
+#   python benchmarks.py --quick                  # small sizes only
+#   python benchmarks.py --compare output/benchmarks/baseline.json
+#   python benchmarks.py --only split_script,text_analysis
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+# Benchmarks never touch real APIs; keep logging and telemetry out of the timings.
+os.environ.setdefault("USE_MOCK_AI", "true")
+os.environ.setdefault("ENABLE_TELEMETRY", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import safe_image_prompt_filter  # noqa: E402
+import shotstack_renderer  # noqa: E402
+import text_analysis  # noqa: E402
+import transcript_fetcher  # noqa: E402
+from candidate_store import CandidateStore  # noqa: E402
+
+RESULTS_DIR = "output/benchmarks"
+
+TEXT_SIZES = [2_000, 20_000, 200_000, 2_000_000, 8_000_000]
+QUICK_TEXT_SIZES = [2_000, 20_000, 200_000]
+FILE_SIZES = [64 * 1024, 1024 * 1024, 8 * 1024 * 1024]
+QUICK_FILE_SIZES = [64 * 1024, 1024 * 1024]
+ID_COUNTS = [100, 10_000]
+CANDIDATE_COUNTS = [100, 10_000, 1_000_000]
+QUICK_CANDIDATE_COUNTS = [100, 10_000]
+
+MIN_TIME_S = 0.2
+REPEATS = 3
+
+_WORDS_EN = (
+    "the workers and capital of state power media class labor wage profit "
+    "market union strike housing rent war empire police budget crisis news"
+).split()
+_WORDS_ES = (
+    "el la los las que de y para como pero porque cuando según gobierno "
+    "política trabajo salario huelga crisis una un hay está qué cómo"
+).split()
+
+
+# ---------------------------------------------------------
+#   SYNTHETIC INPUTS
+# ---------------------------------------------------------
+def _text(size: int, spanish_ratio: float = 0.2, seed: int = 7) -> str:
+    """Deterministic pseudo-transcript of roughly `size` characters."""
+    rng = random.Random(seed)
+    parts, n = [], 0
+    while n < size:
+        vocab = _WORDS_ES if rng.random() < spanish_ratio else _WORDS_EN
+        w = rng.choice(vocab)
+        parts.append(w)
+        n += len(w) + 1
+        if rng.random() < 0.08:
+            parts[-1] += "."
+    return " ".join(parts)[:size]
+
+
+def _urls(count: int, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-"
+    forms = (
+        "https://www.youtube.com/watch?v={}",
+        "https://youtu.be/{}",
+        "https://www.youtube.com/watch/{}",
+        "{}",
+    )
+    return [
+        rng.choice(forms).format("".join(rng.choice(alphabet) for _ in range(11)))
+        for _ in range(count)
+    ]
+
+
+def _blob_file(directory: str, size: int, suffix: str) -> str:
+    path = os.path.join(directory, f"blob_{size}{suffix}")
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+    return path
+
+
+def _rules_file(directory: str) -> str:
+    """Substitution rules in the `before => after` form load_rules parses."""
+    path = os.path.join(directory, "rules.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        for i, w in enumerate(_WORDS_EN):
+            f.write(f"{w} => {w.upper()}_{i}\n")
+    return path
+
+
+# ---------------------------------------------------------
+#   MEASUREMENT
+# ---------------------------------------------------------
+def _seconds_per_call(fn) -> float:
+    """Best-of-REPEATS mean call time, scaling the loop until it runs MIN_TIME_S."""
+    best = float("inf")
+    for _ in range(REPEATS):
+        n = 1
+        while True:
+            t0 = time.perf_counter()
+            for _ in range(n):
+                fn()
+            dt = time.perf_counter() - t0
+            if dt >= MIN_TIME_S or n >= 1 << 20:
+                break
+            n *= 2 if dt == 0 else max(2, min(10, int(MIN_TIME_S / dt) + 1))
+        best = min(best, dt / n)
+    return best
+
+
+def _peak_bytes(fn) -> int:
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _measure(name: str, size_label: str, nbytes: int, fn) -> dict:
+    fn()  # warm caches (regex compile, file cache)
+    sec = _seconds_per_call(fn)
+    peak = _peak_bytes(fn)
+    result = {
+        "bench": name,
+        "size": size_label,
+        "input_bytes": nbytes,
+        "sec_per_call": sec,
+        "mb_per_s": (nbytes / 1e6) / sec if sec > 0 else None,
+        "peak_kib": round(peak / 1024, 1),
+    }
+    mbps = f"{result['mb_per_s']:10.1f} MB/s" if result["mb_per_s"] is not None else ""
+    print(f"  {name:<22} {size_label:>10}  {sec * 1e3:10.3f} ms  {mbps}  peak {result['peak_kib']:>10.1f} KiB")
+    return result
+
+
+# ---------------------------------------------------------
+#   BENCHMARKS
+# ---------------------------------------------------------
+def bench_split_script(sizes, **_):
+    for size in sizes:
+        text = _text(size)
+        yield _measure("split_script", f"{size:,}", size,
+                       lambda: shotstack_renderer._split_script(text, 8))
+
+
+def bench_safe_substitutions(sizes, workdir, **_):
+    safe_image_prompt_filter.RULES_PATH = type(safe_image_prompt_filter.RULES_PATH)(_rules_file(workdir))
+    for size in sizes:
+        # storyboard-shaped input: 8 prompts sharing the total size
+        prompts = [_text(size // 8, seed=i) for i in range(8)]
+        yield _measure("safe_substitutions", f"{size:,}", size,
+                       lambda: safe_image_prompt_filter.apply_safe_substitutions(prompts))
+
+
+def bench_text_analysis(sizes, **_):
+    for size in sizes:
+        text = _text(size)
+        yield _measure("text_analysis", f"{size:,}", size,
+                       lambda: text_analysis.analyze(text))
+
+
+def bench_extract_video_id(_sizes, **__):
+    for count in ID_COUNTS:
+        urls = _urls(count)
+        nbytes = sum(len(u) for u in urls)
+
+        def run():
+            for u in urls:
+                transcript_fetcher._extract_video_id(u)
+
+        yield _measure("extract_video_id", f"{count:,} ids", nbytes, run)
+
+
+def bench_encode_file(_sizes, workdir, file_sizes, **_):
+    for size in file_sizes:
+        path = _blob_file(workdir, size, ".png")
+        yield _measure("encode_file", f"{size // 1024:,} KiB", size,
+                       lambda: shotstack_renderer._encode_file(path))
+
+
+def bench_shotstack_payload(_sizes, workdir, file_sizes, **_):
+    script = _text(6_000)
+    for size in file_sizes:
+        images = [_blob_file(workdir, size, f".{i}.png") for i in range(8)]
+        audio = _blob_file(workdir, size * 4, ".wav")
+        nbytes = size * 12
+
+        def run():
+            payload = shotstack_renderer._build_payload(audio, images, script, 5.0)
+            json.dumps(payload)
+
+        yield _measure("shotstack_payload", f"8x{size // 1024:,} KiB", nbytes, run)
+
+
+def bench_virality_rank(_sizes, quick=False, **_):
+    rng = random.Random(5)
+    for count in QUICK_CANDIDATE_COUNTS if quick else CANDIDATE_COUNTS:
+        store = CandidateStore(capacity=count)
+        for i in range(count):
+            store.append({"video_id": f"v{i}", "duration_s": 300 + i % 900},
+                         rng.randint(1_000, 2_000_000), rng.randint(10, 80_000))
+        yield _measure("virality_rank", f"{count:,} cands", count * 32,
+                       lambda: store.ranked(20))
+
+
+BENCHMARKS = {
+    "split_script": bench_split_script,
+    "safe_substitutions": bench_safe_substitutions,
+    "text_analysis": bench_text_analysis,
+    "extract_video_id": bench_extract_video_id,
+    "encode_file": bench_encode_file,
+    "shotstack_payload": bench_shotstack_payload,
+    "virality_rank": bench_virality_rank,
+}
+
+
+# ---------------------------------------------------------
+#   RESULTS
+# ---------------------------------------------------------
+def _git_rev() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _compare(current: list, baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["bench"], r["size"]): r for r in json.load(f)["results"]}
+
+    print(f"\nComparison against {baseline_path} (ratio < 1.0 = faster now):")
+    for r in current:
+        old = baseline.get((r["bench"], r["size"]))
+        if not old:
+            continue
+        ratio = r["sec_per_call"] / old["sec_per_call"] if old["sec_per_call"] else float("nan")
+        mem = r["peak_kib"] - old["peak_kib"]
+        print(f"  {r['bench']:<22} {r['size']:>10}  time x{ratio:5.2f}   peak {mem:+10.1f} KiB")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Leninware hot-path microbenchmarks")
+    parser.add_argument("--quick", action="store_true", help="small inputs only")
+    parser.add_argument("--only", default="", help="comma-separated benchmark names")
+    parser.add_argument("--label", default="", help="results file name (default: git rev)")
+    parser.add_argument("--compare", default="", help="earlier results JSON to compare with")
+    args = parser.parse_args(argv)
+
+    selected = [s for s in args.only.split(",") if s] or list(BENCHMARKS)
+    unknown = [s for s in selected if s not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    sizes = QUICK_TEXT_SIZES if args.quick else TEXT_SIZES
+    file_sizes = QUICK_FILE_SIZES if args.quick else FILE_SIZES
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="leninware-bench-") as workdir:
+        for name in selected:
+            print(f"[bench] {name}")
+            results.extend(BENCHMARKS[name](sizes, workdir=workdir, file_sizes=file_sizes, quick=args.quick))
+
+    rev = _git_rev()
+    label = args.label or rev
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out_path = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "meta": {
+                    "label": label,
+                    "git_rev": rev,
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "quick": args.quick,
+                },
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"\n[bench] Results saved → {out_path}")
+
+    if args.compare:
+        _compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# candidate_store.py
+
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Score = Σ weight × column. Defaults reproduce the original views + likes*20.
+DEFAULT_WEIGHTS = {
+    "views": 1.0, "likes": 20.0, "duration": 0.0, "age": 0.0,
+    "velocity": 0.0, "accel": 0.0,
+}
+
+# Velocity mode: views/hour plus acceleration projected one day ahead.
+VELOCITY_WEIGHTS = {
+    "views": 0.0, "likes": 0.0, "duration": 0.0, "age": 0.0,
+    "velocity": 1.0, "accel": 24.0,
+}
+
+_COLUMNS = ("views", "likes", "duration", "age", "velocity", "accel")
+
+_INITIAL_CAPACITY = 256
+
+
+def parse_weights(spec: str, base: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Parse "views=1,likes=20,age=-5" into a weight dict (unset → base, default DEFAULT_WEIGHTS)."""
+    weights = dict(base or DEFAULT_WEIGHTS)
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in weights:
+            raise ValueError(f"Unknown virality weight '{name}' (expected one of {sorted(weights)})")
+        weights[name] = float(value)
+    return weights
+
+
+def _age_hours(published_at: Optional[str], now: datetime) -> float:
+    if not published_at:
+        return 0.0
+    try:
+        ts = datetime.fromisoformat(published_at.replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    return max((now - ts).total_seconds() / 3600.0, 0.0)
+
+
+class CandidateStore:
+    """
+    Columnar candidate table. Numeric stats live in NumPy arrays so scoring is
+    a single vectorized expression; the per-candidate dicts from ingest are
+    kept by reference and only materialized for the selected top-k.
+    """
+
+    def __init__(self, capacity: int = _INITIAL_CAPACITY):
+        capacity = max(capacity, 1)
+        self._n = 0
+        self.records: List[Dict] = []
+        self.views = np.zeros(capacity, dtype=np.int64)
+        self.likes = np.zeros(capacity, dtype=np.int64)
+        self.duration = np.zeros(capacity, dtype=np.float64)
+        self.age = np.zeros(capacity, dtype=np.float64)
+        self.velocity = np.zeros(capacity, dtype=np.float64)
+        self.accel = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _grow(self, needed: int) -> None:
+        cap = len(self.views)
+        if needed <= cap:
+            return
+        new_cap = max(needed, cap * 2)
+        for name in _COLUMNS:
+            col = getattr(self, name)
+            grown = np.zeros(new_cap, dtype=col.dtype)
+            grown[: self._n] = col[: self._n]
+            setattr(self, name, grown)
+
+    def append(
+        self,
+        candidate: Dict,
+        views: int,
+        likes: int,
+        now: Optional[datetime] = None,
+        velocity: Optional[Tuple[float, float]] = None,
+    ) -> None:
+        """
+        Add one candidate. velocity is (views/hour, views/hour²) from the stats
+        history; without it the lifetime average views/age is used.
+        """
+        self._grow(self._n + 1)
+        i = self._n
+        self.records.append(candidate)
+        self.views[i] = views
+        self.likes[i] = likes
+        self.duration[i] = candidate.get("duration_s") or 0
+        self.age[i] = age = _age_hours(candidate.get("published_at"), now or datetime.now(timezone.utc))
+        if velocity is not None:
+            self.velocity[i], self.accel[i] = velocity
+        else:
+            self.velocity[i] = views / age if age > 0 else 0.0
+            self.accel[i] = 0.0
+        self._n += 1
+
+    @classmethod
+    def from_stats(
+        cls,
+        candidates: Iterable[Dict],
+        stats: Dict[str, Dict],
+        history: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> "CandidateStore":
+        """
+        Build a store from ingest candidates and a video_id → stats map
+        (missing stats skipped). history is an optional video_id → velocity map.
+        """
+        candidates = list(candidates)
+        history = history or {}
+        store = cls(capacity=len(candidates))
+        now = datetime.now(timezone.utc)
+        for c in candidates:
+            s = stats.get(c["video_id"])
+            if s:
+                store.append(c, s["views"], s["likes"], now, history.get(c["video_id"]))
+        return store
+
+    def scores(self, weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+        w = weights or DEFAULT_WEIGHTS
+        n = self._n
+        return (
+            w.get("views", 0.0) * self.views[:n]
+            + w.get("likes", 0.0) * self.likes[:n]
+            + w.get("duration", 0.0) * self.duration[:n]
+            + w.get("age", 0.0) * self.age[:n]
+            + w.get("velocity", 0.0) * self.velocity[:n]
+            + w.get("accel", 0.0) * self.accel[:n]
+        )
+
+    def top_k(self, k: int, weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Indices of the k best candidates, best first (k <= 0 → full ranking)."""
+        return self._select(self.scores(weights), k)
+
+    @staticmethod
+    def _select(scores: np.ndarray, k: int) -> np.ndarray:
+        # O(n) partition, then sort only the k survivors.
+        n = len(scores)
+        if n == 0:
+            return np.empty(0, dtype=np.intp)
+        if k <= 0 or k >= n:
+            return np.argsort(-scores, kind="stable")
+        part = np.argpartition(-scores, k - 1)[:k]
+        return part[np.argsort(-scores[part], kind="stable")]
+
+    def ranked(self, k: int, weights: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """Top-k as candidate dicts carrying views, likes, velocity and virality, best first."""
+        scores = self.scores(weights)
+        out = []
+        for i in self._select(scores, k):
+            score = float(scores[i])
+            out.append({
+                **self.records[i],
+                "views": int(self.views[i]),
+                "likes": int(self.likes[i]),
+                "views_per_hour": round(float(self.velocity[i]), 3),
+                "accel": round(float(self.accel[i]), 3),
+                "virality": int(score) if score.is_integer() else round(score, 3),
+            })
+        return out
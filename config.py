@@ -26,6 +26,10 @@ LANGUAGE_MODE = os.getenv("LANGUAGE_MODE", "en").lower()
 # (used only if older modules referenced it; can be removed later)
 LEGACY_LANGUAGE_MODE = LANGUAGE_MODE
 
+# Optional override for the script safety filter's language.
+# Empty → the script's detected language (text_analysis.py).
+LENINWARE_LANG_MODE = os.getenv("LENINWARE_LANG_MODE", "").lower()
+
 
 # ---------------------------------------------------------
 #   YOUTUBE UPLOAD TOGGLE
@@ -41,6 +45,27 @@ if USE_MOCK_AI:
 else:
     OPENAI_API_KEY = require_env("OPENAI_API_KEY")
 
+# Client-side rate limits per model: "model=RPM/TPM" (0 = unlimited).
+# Set these to your account tier; 429s still pause the model's queue.
+OPENAI_RATE_LIMITS = os.getenv(
+    "OPENAI_RATE_LIMITS",
+    "gpt-4o-mini=500/200000,gpt-image-1=5/100000,gpt-4o-mini-tts=500/50000",
+)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+
+# Per-stage token budgets: "stage=INPUT/OUTPUT" tokens. A stage's variable
+# input (transcript, summary, script) is trimmed so the whole prompt fits
+# INPUT (and the model's context); OUTPUT is the completion's max_tokens.
+# The safety rewrite always gets at least its script's length.
+LLM_TOKEN_BUDGETS = os.getenv(
+    "LLM_TOKEN_BUDGETS",
+    "summary=3500/900,commentary=3000/900,safety=8000/1200,storyboard=8000/900",
+)
+# USD per 1M input/output tokens, for the pre-call cost estimate.
+OPENAI_PRICES = os.getenv("OPENAI_PRICES", "gpt-4o-mini=0.15/0.60")
+# chars-per-token and latency calibration learned from response.usage.
+TOKEN_CALIBRATION_PATH = os.getenv("TOKEN_CALIBRATION_PATH", "output/tokens/calibration.json")
+
 
 # ---------------------------------------------------------
 #   Transcript API
@@ -50,7 +75,7 @@ if USE_MOCK_AI:
 else:
     TRANSCRIPT_API_KEY = require_env("TRANSCRIPT_API_KEY")
 
-TRANSCRIPT_API_BASE_URL = "https://transcriptapi.com"
+TRANSCRIPT_API_BASE_URL = os.getenv("TRANSCRIPT_API_BASE_URL", "https://transcriptapi.com")
 TRANSCRIPT_API_V2_URL = f"{TRANSCRIPT_API_BASE_URL}/api/v2/youtube"
 
 
@@ -62,6 +87,33 @@ if USE_MOCK_AI:
 else:
     YOUTUBE_API_KEY = require_env("YOUTUBE_API_KEY")
 
+YOUTUBE_API_BASE_URL = os.getenv("YOUTUBE_API_BASE_URL", "https://www.googleapis.com/youtube/v3")
+
+# Daily quota shared by ingest, virality and upload (persisted across runs).
+# The upload reserve is only spendable by uploads; lower-priority calls are deferred.
+YOUTUBE_QUOTA_DAILY = int(os.getenv("YOUTUBE_QUOTA_DAILY", "10000"))
+YOUTUBE_QUOTA_UPLOAD_RESERVE = int(os.getenv("YOUTUBE_QUOTA_UPLOAD_RESERVE", "1600"))
+YOUTUBE_QUOTA_STATE_PATH = os.getenv("YOUTUBE_QUOTA_STATE_PATH", "output/quota/youtube_quota.json")
+
+
+# ---------------------------------------------------------
+#   VIRALITY SCORING
+#   VIRALITY_MODE=totals   → lifetime views/likes (default)
+#   VIRALITY_MODE=velocity → views per hour + acceleration from stats history
+#   VIRALITY_WEIGHTS="views=1,likes=20,velocity=0,accel=0"  (unset → mode defaults)
+#   VIRALITY_TOP_K: candidates kept after ranking (0 = full ranking)
+# ---------------------------------------------------------
+VIRALITY_MODE = os.getenv("VIRALITY_MODE", "totals").lower()
+VIRALITY_WEIGHTS = os.getenv("VIRALITY_WEIGHTS", "")
+VIRALITY_TOP_K = int(os.getenv("VIRALITY_TOP_K", "20"))
+
+# Stats snapshots (memory-mapped, append-only) for velocity scoring.
+ENABLE_STATS_HISTORY = os.getenv("ENABLE_STATS_HISTORY", "true").lower() == "true"
+STATS_HISTORY_PATH = os.getenv("STATS_HISTORY_PATH", "output/stats/snapshots.bin")
+STATS_RETENTION_DAYS = float(os.getenv("STATS_RETENTION_DAYS", "14"))
+STATS_MAX_SNAPSHOTS = int(os.getenv("STATS_MAX_SNAPSHOTS", "8"))
+STATS_COMPACT_BYTES = int(os.getenv("STATS_COMPACT_BYTES", str(4 * 1024 * 1024)))
+
 
 # ---------------------------------------------------------
 #   YouTube Upload (OAuth)
@@ -75,6 +127,22 @@ else:
     YOUTUBE_CLIENT_SECRET = require_env("GOOGLE_CLIENT_SECRET")
     YOUTUBE_REFRESH_TOKEN = require_env("GOOGLE_REFRESH_TOKEN")
 
+GOOGLE_TOKEN_URI = os.getenv("GOOGLE_TOKEN_URI", "https://oauth2.googleapis.com/token")
+# Empty → the discovery document bundled with googleapiclient (no fetch)
+YOUTUBE_DISCOVERY_URL = os.getenv("YOUTUBE_DISCOVERY_URL", "")
+# The upload client and access token live for the whole process; the token
+# is refreshed once it is within this many seconds of expiring.
+YOUTUBE_TOKEN_REFRESH_MARGIN_S = float(os.getenv("YOUTUBE_TOKEN_REFRESH_MARGIN_S", "300"))
+
+# Resumable uploads: the file goes up in YOUTUBE_UPLOAD_CHUNK_MB pieces
+# (rounded to 256 KiB; 0 = one request), each retried up to
+# YOUTUBE_UPLOAD_MAX_RETRIES times. Session URIs are kept in
+# YOUTUBE_UPLOAD_SESSION_DIR so an interrupted upload of the same file
+# resumes from the last byte YouTube confirmed.
+YOUTUBE_UPLOAD_CHUNK_MB = float(os.getenv("YOUTUBE_UPLOAD_CHUNK_MB", "8"))
+YOUTUBE_UPLOAD_MAX_RETRIES = int(os.getenv("YOUTUBE_UPLOAD_MAX_RETRIES", "5"))
+YOUTUBE_UPLOAD_SESSION_DIR = os.getenv("YOUTUBE_UPLOAD_SESSION_DIR", "output/uploads")
+
 
 # ---------------------------------------------------------
 #   Shotstack API
@@ -84,4 +152,172 @@ if USE_MOCK_AI:
 else:
     SHOTSTACK_API_KEY = require_env("SHOTSTACK_API_KEY")
 
-SHOTSTACK_API_URL = "https://api.shotstack.io/v1/render"
\ No newline at end of file
+SHOTSTACK_API_URL = os.getenv("SHOTSTACK_API_URL", "https://api.shotstack.io/v1/render")
+
+
+# ---------------------------------------------------------
+#   HTTP CLIENT (shared pooled session for all plain HTTP calls)
+#   Timeouts in seconds; retries use full-jitter exponential backoff
+#   and honor Retry-After. A host's circuit opens after
+#   HTTP_BREAKER_FAILURES consecutive failures for HTTP_BREAKER_COOLDOWN s.
+# ---------------------------------------------------------
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "20"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", "5"))
+HTTP_BREAKER_COOLDOWN = float(os.getenv("HTTP_BREAKER_COOLDOWN", "30"))
+
+
+# ---------------------------------------------------------
+#   DEADLINES + HEDGING (tail-latency control)
+#   RUN_DEADLINE_S: wall-clock budget per run (0 = none). Each stage gets
+#   weight / (sum of its own and later weights) of the time left.
+#   HEDGE_TARGETS: idempotent call types that may be duplicated once they
+#   run past the HEDGE_PERCENTILE latency: transcript, openai.chat,
+#   openai.images, openai.speech, or all. Empty = no hedging.
+# ---------------------------------------------------------
+RUN_DEADLINE_S = float(os.getenv("RUN_DEADLINE_S", "1800"))
+STAGE_BUDGET_WEIGHTS = os.getenv(
+    "STAGE_BUDGET_WEIGHTS",
+    "stage.ingest=1,stage.virality=1,stage.transcript=1,stage.summary=2,"
+    "stage.commentary=2,stage.safety=2,stage.storyboard=1,stage.images=4,"
+    "stage.tts=2,stage.render=6,stage.upload=4",
+)
+HEDGE_TARGETS = os.getenv("HEDGE_TARGETS", "")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "32"))
+
+
+# ---------------------------------------------------------
+#   PROCESSED-VIDEO LEDGER
+#   Append-only record of source videos already claimed, rendered or
+#   uploaded; candidates found there are dropped right after ingest.
+#   A claim older than LEDGER_STALE_CLAIM_H is treated as abandoned;
+#   failed videos are retried up to LEDGER_MAX_ATTEMPTS times.
+#   Off by default in mock mode (the mock candidates never change).
+# ---------------------------------------------------------
+ENABLE_LEDGER = os.getenv("ENABLE_LEDGER", "false" if USE_MOCK_AI else "true").lower() == "true"
+LEDGER_PATH = os.getenv("LEDGER_PATH", "output/ledger/videos.jsonl")
+LEDGER_STALE_CLAIM_H = float(os.getenv("LEDGER_STALE_CLAIM_H", "2"))
+LEDGER_MAX_ATTEMPTS = int(os.getenv("LEDGER_MAX_ATTEMPTS", "3"))
+
+
+# ---------------------------------------------------------
+#   NEAR-DUPLICATE TRANSCRIPTS
+#   MinHash signatures (NEAR_DUP_NUM_PERM hashes of word
+#   NEAR_DUP_SHINGLE_WORDS-grams) of recently used transcripts, held in an
+#   LSH table of NEAR_DUP_BANDS bands. A fetched transcript whose estimated
+#   similarity to one used in the last NEAR_DUP_WINDOW_DAYS reaches
+#   NEAR_DUP_THRESHOLD is skipped in favour of the next candidate.
+#   Off by default in mock mode, like the ledger.
+# ---------------------------------------------------------
+ENABLE_NEAR_DUP = os.getenv("ENABLE_NEAR_DUP", "false" if USE_MOCK_AI else "true").lower() == "true"
+NEAR_DUP_PATH = os.getenv("NEAR_DUP_PATH", "output/dedup/minhash.bin")
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+NEAR_DUP_WINDOW_DAYS = float(os.getenv("NEAR_DUP_WINDOW_DAYS", "14"))
+NEAR_DUP_NUM_PERM = int(os.getenv("NEAR_DUP_NUM_PERM", "128"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "16"))
+NEAR_DUP_SHINGLE_WORDS = int(os.getenv("NEAR_DUP_SHINGLE_WORDS", "5"))
+
+
+# ---------------------------------------------------------
+#   TRANSCRIPT QUALITY GATE
+#   Local checks run on every fetched transcript before any OpenAI spend:
+#   spoken word count, repeated trigrams, share of non-speech tags
+#   ([Music], ♪ ...), EN/ES language confidence and words per minute of
+#   video. A transcript failing any of them is rejected and the next
+#   candidate is tried.
+#   Off by default in mock mode (the mock transcript is a single sentence).
+# ---------------------------------------------------------
+ENABLE_QUALITY_GATE = os.getenv("ENABLE_QUALITY_GATE", "false" if USE_MOCK_AI else "true").lower() == "true"
+QUALITY_MIN_WORDS = int(os.getenv("QUALITY_MIN_WORDS", "150"))
+QUALITY_MAX_REPETITION = float(os.getenv("QUALITY_MAX_REPETITION", "0.5"))
+QUALITY_MAX_TAG_SHARE = float(os.getenv("QUALITY_MAX_TAG_SHARE", "0.2"))
+QUALITY_MIN_LANG_CONFIDENCE = float(os.getenv("QUALITY_MIN_LANG_CONFIDENCE", "0.5"))
+QUALITY_MIN_WPM = float(os.getenv("QUALITY_MIN_WPM", "40"))
+QUALITY_MAX_WPM = float(os.getenv("QUALITY_MAX_WPM", "320"))
+
+
+# ---------------------------------------------------------
+#   SCRIPT SAFETY FILTER
+#   selective: sentences are pre-screened locally against
+#   prompts/script_safety_patterns.txt; only flagged ones are rewritten by
+#   the LLM (up to SAFETY_MAX_CONCURRENCY at a time) and a clean script
+#   skips the LLM. More than SAFETY_FULL_PASS_RATIO of the sentences
+#   flagged falls back to one whole-script pass.
+#   full (default): always rewrite the whole script in one call. The
+#   pattern list does not yet cover every rule in the safety prompt, so
+#   selective mode is opt-in.
+# ---------------------------------------------------------
+SAFETY_MODE = os.getenv("SAFETY_MODE", "full").lower()
+SAFETY_FULL_PASS_RATIO = float(os.getenv("SAFETY_FULL_PASS_RATIO", "0.5"))
+SAFETY_MAX_CONCURRENCY = int(os.getenv("SAFETY_MAX_CONCURRENCY", "8"))
+# Steps 6 + 7 as one structured (JSON schema) call returning the safe
+# script and the storyboard prompts; a field that fails validation is
+# redone by its own stage. The fused call rewrites the whole script, so
+# with SAFETY_MODE=selective and only a few flagged sentences the two
+# stages run separately instead. Ignored when STREAM_COMMENTARY_TTS is on
+# (streaming takes precedence; a warning is logged).
+FUSED_SAFETY_STORYBOARD = os.getenv("FUSED_SAFETY_STORYBOARD", "false").lower() == "true"
+
+
+# ---------------------------------------------------------
+#   STREAMING
+#   STREAM_COMMENTARY_TTS: stream the commentary and send each finished
+#   group of sentences (>= STREAM_TTS_MIN_CHARS) through the safety
+#   pre-screen into TTS while the rest is still being written, with up to
+#   STREAM_TTS_CONCURRENCY groups in flight. Needs the sentence pre-screen
+#   (SAFETY_MODE=selective with a pattern list); otherwise commentary,
+#   safety filter and TTS run in sequence. Takes precedence over
+#   FUSED_SAFETY_STORYBOARD.
+#   STREAM_STORYBOARD: stream the storyboard list and send each prompt
+#   through the substitution rules to image generation (up to
+#   STREAM_IMAGE_CONCURRENCY frames at a time) as soon as its line is done.
+# ---------------------------------------------------------
+STREAM_COMMENTARY_TTS = os.getenv("STREAM_COMMENTARY_TTS", "false").lower() == "true"
+STREAM_TTS_MIN_CHARS = int(os.getenv("STREAM_TTS_MIN_CHARS", "200"))
+STREAM_TTS_CONCURRENCY = int(os.getenv("STREAM_TTS_CONCURRENCY", "6"))
+STREAM_STORYBOARD = os.getenv("STREAM_STORYBOARD", "false").lower() == "true"
+STREAM_IMAGE_CONCURRENCY = int(os.getenv("STREAM_IMAGE_CONCURRENCY", "8"))
+
+
+# ---------------------------------------------------------
+#   JOB WORKSPACES
+#   Each run writes its images, audio and video under WORKSPACE_ROOT/<run_id>/.
+#   Finished workspaces are deleted oldest-first once all of them together
+#   exceed WORKSPACE_DISK_BUDGET_MB (0 = keep everything). An active one
+#   counts as finished once its process is gone or it outlived RUN_DEADLINE_S.
+# ---------------------------------------------------------
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", "output/jobs")
+WORKSPACE_DISK_BUDGET_MB = float(os.getenv("WORKSPACE_DISK_BUDGET_MB", "2048"))
+
+
+# ---------------------------------------------------------
+#   TELEMETRY (trace spans + Prometheus metrics)
+#   Written locally: TELEMETRY_DIR/traces.jsonl and metrics.prom
+# ---------------------------------------------------------
+ENABLE_TELEMETRY = os.getenv("ENABLE_TELEMETRY", "true").lower() == "true"
+TELEMETRY_DIR = os.getenv("TELEMETRY_DIR", "output/telemetry")
+
+
+# ---------------------------------------------------------
+#   LOGGING
+#   LOG_LEVEL=DEBUG enables per-item output (rules, prompts, polls)
+#   LOG_FORMAT=json emits one JSON object per line
+# ---------------------------------------------------------
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+
+# ---------------------------------------------------------
+#   PROFILING (opt-in, cProfile + tracemalloc)
+#   PROFILE_STAGES=stage.transcript,shotstack.payload  or  all
+#   Reports go to PROFILE_DIR/<run_id>/
+# ---------------------------------------------------------
+PROFILE_STAGES = os.getenv("PROFILE_STAGES", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "output/profiles")
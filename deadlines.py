@@ -0,0 +1,106 @@
+# deadlines.py
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from config import RUN_DEADLINE_S, STAGE_BUDGET_WEIGHTS
+from telemetry import inc, current_span
+from pipeline_logging import get_logger
+
+log = get_logger("deadline")
+
+
+class DeadlineExceeded(TimeoutError):
+    """The current stage (or the whole run) is out of time."""
+
+
+def parse_stage_weights(spec: str) -> Dict[str, float]:
+    """Parse "stage.summary=3,stage.images=6" preserving order (= pipeline order)."""
+    weights = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, value = part.partition("=")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+# Pipeline order matters: a stage's share is taken from the time left,
+# split among it and the stages after it.
+_WEIGHTS = parse_stage_weights(STAGE_BUDGET_WEIGHTS)
+_ORDER = list(_WEIGHTS)
+
+_run_deadline: ContextVar[Optional[float]] = ContextVar("leninware_run_deadline", default=None)
+_stage_deadline: ContextVar[Optional[float]] = ContextVar("leninware_stage_deadline", default=None)
+
+
+def start_run_deadline(seconds: float = RUN_DEADLINE_S) -> Optional[float]:
+    """Start the run clock for this context; seconds <= 0 disables deadlines."""
+    deadline = time.monotonic() + seconds if seconds > 0 else None
+    _run_deadline.set(deadline)
+    _stage_deadline.set(None)
+    return deadline
+
+
+def deadline() -> Optional[float]:
+    """Absolute (monotonic) deadline for the current work, or None."""
+    stage, run = _stage_deadline.get(), _run_deadline.get()
+    if stage is None:
+        return run
+    if run is None:
+        return stage
+    return min(stage, run)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current stage (never negative), or None if unbounded."""
+    d = deadline()
+    return None if d is None else max(d - time.monotonic(), 0.0)
+
+
+def check(what: str = "") -> None:
+    """Raise DeadlineExceeded if the current stage is out of time."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"deadline exceeded{f' before {what}' if what else ''}")
+
+
+def clamp_timeout(timeout: Optional[float]) -> Optional[float]:
+    """Shrink a per-call timeout so it cannot outlive the stage deadline."""
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(left, 0.001)
+    return left if timeout is None else min(timeout, left)
+
+
+def _stage_budget(name: str, run_left: float) -> Optional[float]:
+    if name not in _WEIGHTS:
+        return None
+    rest = sum(_WEIGHTS[s] for s in _ORDER[_ORDER.index(name):])
+    return run_left * _WEIGHTS[name] / rest if rest > 0 else run_left
+
+
+@contextmanager
+def stage_deadline(name: str):
+    """
+    Give stage `name` its share of the remaining run time. Time a stage
+    does not use rolls forward to the stages after it.
+    """
+    run = _run_deadline.get()
+    if run is None or name not in _WEIGHTS:
+        yield
+        return
+
+    budget = _stage_budget(name, max(run - time.monotonic(), 0.0))
+    stage_end = min(time.monotonic() + budget, run)
+    token = _stage_deadline.set(stage_end)
+    current_span().set("budget_s", round(budget, 3))
+    log.debug(f"{name} budget {budget:.1f}s")
+    try:
+        yield
+    finally:
+        _stage_deadline.reset(token)
+        if time.monotonic() > stage_end:
+            inc("leninware_stage_deadline_exceeded_total", stage=name)
+            log.warning(f"{name} overran its {budget:.1f}s budget")
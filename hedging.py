@@ -0,0 +1,195 @@
+# hedging.py
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextvars import copy_context
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from config import (
+    HEDGE_TARGETS,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MAX_RATIO,
+    HEDGE_WORKERS,
+)
+import deadlines
+from telemetry import inc, current_span
+from pipeline_logging import get_logger
+
+log = get_logger("hedge")
+
+T = TypeVar("T")
+
+_ENABLED = {s.strip() for s in HEDGE_TARGETS.split(",") if s.strip()}
+_WINDOW = 256
+
+
+class _LatencyWindow:
+    """Recent latencies for one call type; percentile() is None until warmed up."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=_WINDOW)
+        self.calls = 0
+        self.hedges = 0
+
+    def count_call(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * pct / 100.0), len(ordered) - 1)]
+
+    def take_hedge(self) -> bool:
+        """Hedges are capped at HEDGE_MAX_RATIO of calls to bound duplicate spend."""
+        with self._lock:
+            if self.hedges + 1 > HEDGE_MAX_RATIO * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+
+_windows: dict = {}
+_windows_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def is_hedged(key: str) -> bool:
+    return "all" in _ENABLED or key in _ENABLED
+
+
+def _window(key: str) -> _LatencyWindow:
+    with _windows_lock:
+        w = _windows.get(key)
+        if w is None:
+            w = _windows[key] = _LatencyWindow()
+        return w
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _windows_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _executor
+
+
+def _timed(window: _LatencyWindow, fn: Callable[[], T]) -> Callable[[], T]:
+    def run():
+        t0 = time.perf_counter()
+        result = fn()
+        window.add(time.perf_counter() - t0)
+        return result
+    return run
+
+
+def _submit(fn):
+    # Each attempt runs in a copy of the caller's context (span, run id, deadline).
+    return _pool().submit(copy_context().run, fn)
+
+
+def hedged(key: str, fn: Callable[[], T]) -> T:
+    """
+    Run an idempotent call. If it has not answered after the HEDGE_PERCENTILE
+    latency seen for `key`, send one duplicate and return whichever succeeds
+    first. The loser's result is discarded; a call already in flight on a
+    thread cannot be interrupted, so it finishes in the background.
+    Keys not listed in HEDGE_TARGETS run fn() directly.
+    """
+    if not _ENABLED or not is_hedged(key):
+        return fn()
+
+    window = _window(key)
+    window.count_call()
+    delay = window.percentile(HEDGE_PERCENTILE)
+    timed = _timed(window, fn)
+    if delay is None:
+        return timed()
+
+    left = deadlines.remaining()
+    if left is not None and left <= delay:
+        return timed()
+
+    primary = _submit(timed)
+    done, _ = wait([primary], timeout=delay)
+    if done or not window.take_hedge():
+        return primary.result()
+
+    inc("leninware_hedges_total", key=key)
+    current_span().add("hedges")
+    log.debug(f"{key} slower than p{HEDGE_PERCENTILE:g} ({delay:.2f}s); sending hedge")
+    backup = _submit(timed)
+
+    pending = {primary, backup}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                for other in pending:
+                    other.cancel()
+                if fut is backup:
+                    inc("leninware_hedge_wins_total", key=key)
+                return fut.result()
+            error = fut.exception()
+    raise error
+
+
+async def ahedged(key: str, make_call: Callable[[], Awaitable[T]]) -> T:
+    """
+    hedged() for coroutines. make_call() must return a fresh awaitable each
+    time. Unlike the threaded version, the losing attempt is cancelled.
+    """
+    if not _ENABLED or not is_hedged(key):
+        return await make_call()
+
+    window = _window(key)
+    window.count_call()
+    delay = window.percentile(HEDGE_PERCENTILE)
+
+    async def timed():
+        t0 = time.perf_counter()
+        result = await make_call()
+        window.add(time.perf_counter() - t0)
+        return result
+
+    left = deadlines.remaining()
+    if delay is None or (left is not None and left <= delay):
+        return await timed()
+
+    primary = asyncio.ensure_future(timed())
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done or not window.take_hedge():
+        return await primary
+
+    inc("leninware_hedges_total", key=key)
+    current_span().add("hedges")
+    log.debug(f"{key} slower than p{HEDGE_PERCENTILE:g} ({delay:.2f}s); sending hedge")
+    backup = asyncio.ensure_future(timed())
+
+    pending = {primary, backup}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is backup:
+                        inc("leninware_hedge_wins_total", key=key)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
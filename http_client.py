@@ -0,0 +1,235 @@
+# http_client.py
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_BASE,
+    HTTP_BACKOFF_MAX,
+    HTTP_POOL_SIZE,
+    HTTP_BREAKER_FAILURES,
+    HTTP_BREAKER_COOLDOWN,
+)
+import deadlines
+from telemetry import current_span
+from pipeline_logging import get_logger
+
+log = get_logger("http")
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Statuses that mean the server refused the request before acting on it,
+# so even a non-idempotent POST can be resent.
+REJECTED_STATUSES = frozenset({429, 503})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without touching the network while a host's breaker is open."""
+
+
+# ---------------------------------------------------------
+#   CIRCUIT BREAKER
+# ---------------------------------------------------------
+class CircuitBreaker:
+    """
+    Per-host breaker. After `threshold` consecutive failures (connection
+    errors, timeouts, retryable statuses) the host is short-circuited for
+    `cooldown` seconds; then one trial request is let through (half-open)
+    and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: int = HTTP_BREAKER_FAILURES, cooldown: float = HTTP_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures: dict = {}
+        self._opened_at: dict = {}
+        self._trial: set = set()
+
+    def allow(self, host: str) -> bool:
+        with self._lock:
+            opened = self._opened_at.get(host)
+            if opened is None:
+                return True
+            if time.monotonic() - opened < self.cooldown or host in self._trial:
+                return False
+            self._trial.add(host)
+            return True
+
+    def success(self, host: str) -> None:
+        with self._lock:
+            if host in self._opened_at:
+                log.info(f"Circuit closed for {host}")
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._trial.discard(host)
+
+    def failure(self, host: str) -> None:
+        with self._lock:
+            n = self._failures.get(host, 0) + 1
+            self._failures[host] = n
+            was_trial = host in self._trial
+            self._trial.discard(host)
+            if was_trial or (n >= self.threshold and host not in self._opened_at):
+                self._opened_at[host] = time.monotonic()
+                log.warning(f"Circuit open for {host} after {n} consecutive failures ({self.cooldown:g}s cooldown)")
+
+    def release(self, host: str) -> None:
+        """A request ended with no verdict on the host (cancelled, interrupted): free its trial slot."""
+        with self._lock:
+            self._trial.discard(host)
+
+    def is_open(self, host: str) -> bool:
+        with self._lock:
+            return host in self._opened_at
+
+
+# ---------------------------------------------------------
+#   SESSION
+# ---------------------------------------------------------
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+breaker = CircuitBreaker()
+
+
+def get_session() -> requests.Session:
+    """Process-wide Session; urllib3 keeps one keep-alive pool per host."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            # Retries are handled in request() so they can see the breaker and Retry-After.
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+
+def never_sent(e: requests.RequestException) -> bool:
+    """True if the request failed before reaching the server (connect timeout, refused, DNS)."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def retry_after(resp: requests.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+def fits_deadline(delay: float) -> bool:
+    left = deadlines.remaining()
+    return left is None or delay < left
+
+
+def request(
+    method: str,
+    url: str,
+    *,
+    timeout=None,
+    retries: Optional[int] = None,
+    idempotent: Optional[bool] = None,
+    **kwargs,
+) -> requests.Response:
+    """
+    Send a request through the shared session.
+
+    - timeout defaults to (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), and is
+      shrunk to the stage deadline; no retry is started that would outlive it
+    - connection errors, timeouts and 429/5xx are retried up to `retries`
+      times with jittered exponential backoff, honoring Retry-After
+    - non-idempotent methods (POST, PATCH) are only retried when the
+      request provably never ran (connection not made, 429, 503) unless the
+      caller passes idempotent=True
+    - the last response is returned even if its status is an error;
+      callers keep their own status handling
+    """
+    method = method.upper()
+    host = urlsplit(url).netloc
+    retries = HTTP_MAX_RETRIES if retries is None else retries
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    retry_statuses = RETRY_STATUSES if idempotent else REJECTED_STATUSES
+    connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (
+        (timeout, timeout) if timeout else (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    )
+    session = get_session()
+
+    attempt = 0
+    while True:
+        # Deadline first: a half-open trial must not be admitted and then abandoned.
+        deadlines.check(f"{method} {host}")
+        call_timeout = (deadlines.clamp_timeout(connect_timeout), deadlines.clamp_timeout(read_timeout))
+        if not breaker.allow(host):
+            raise CircuitOpenError(f"circuit open for {host}")
+
+        try:
+            resp = session.request(method, url, timeout=call_timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            breaker.failure(host)
+            sent = not never_sent(e)
+            if attempt >= retries or (sent and not idempotent):
+                raise
+            delay = backoff(attempt)
+            if not fits_deadline(delay):
+                raise
+            log.debug(f"{method} {host} failed ({type(e).__name__}); retry {attempt + 1}/{retries} in {delay:.2f}s")
+        except BaseException:
+            # Cancelled (hedge loser), interrupted or a local error: no verdict
+            # on the host, but a half-open trial must not be left pending.
+            breaker.release(host)
+            raise
+        else:
+            if resp.status_code in RETRY_STATUSES:
+                breaker.failure(host)
+            else:
+                breaker.success(host)
+
+            if resp.status_code not in retry_statuses or attempt >= retries:
+                return resp
+
+            hinted = retry_after(resp)
+            delay = min(hinted, HTTP_BACKOFF_MAX) if hinted is not None else backoff(attempt)
+            if not fits_deadline(delay):
+                return resp
+            log.debug(f"{method} {host} → {resp.status_code}; retry {attempt + 1}/{retries} in {delay:.2f}s")
+            resp.close()
+
+        current_span().add("retries")
+        attempt += 1
+        time.sleep(delay)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
@@ -1,94 +1,169 @@
 # image_generator.py
 
+import asyncio
 import os
 import base64
 
-from config import USE_MOCK_AI, require_env
+from config import USE_MOCK_AI
+import openai_scheduler
+from telemetry import span, traced
+from workspace import atomic_write
+from pipeline_logging import get_logger
 
-# Only import OpenAI if NOT in mock mode
-if not USE_MOCK_AI:
-    from openai import OpenAI
+log = get_logger("image")
+mock_log = get_logger("image:mock")
 
 MODEL = "gpt-image-1"  # or whichever model you're using
 
 
-def generate_images_from_prompts(prompts: list[str]) -> list[str]:
-    """
-    Generate images from prompts (mock or real), with full debug logging.
-    Returns a list of saved file paths.
-    """
+TRANSPARENT_PNG = (
+    b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'
+    b'\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06'
+    b'\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00'
+    b'\x0cIDATx\x9cc`\x00\x00\x00\x02\x00\x01'
+    b'\xe2!\xbc3\x00\x00\x00\x00IEND\xaeB`\x82'
+)
+
+
+DEFAULT_OUTPUT_DIR = "output/images"
+
 
-    print(f"[image] Starting image generation — {len(prompts)} prompts")
+def _prepare(prompts: list[str], output_dir: str) -> str:
+    """Validate input and create the output directory."""
+    log.info(f"Starting image generation — {len(prompts)} prompts")
 
     if not prompts:
-        print("[image] ERROR — No prompts passed to image generator")
+        log.error("No prompts passed to image generator")
         raise ValueError("No prompts passed to image generator")
 
-    output_dir = "output/images"
     os.makedirs(output_dir, exist_ok=True)
-    print(f"[image] Output directory ready: {output_dir}")
+    log.info(f"Output directory ready: {output_dir}")
+    return output_dir
+
+
+def _mock_images(prompts: list[str], output_dir: str) -> list[str]:
+    mock_log.info("Mock mode enabled — generating transparent PNGs")
 
     image_paths = []
+    for i, prompt in enumerate(prompts, start=1):
+        mock_log.debug(f"Creating mock frame {i} from prompt (len={len(prompt)})")
 
-    # ----------------------------------------------------
-    # MOCK MODE — free tiny PNGs
-    # ----------------------------------------------------
-    if USE_MOCK_AI:
-        print("[image:mock] Mock mode enabled — generating transparent PNGs")
+        img_path = os.path.join(output_dir, f"frame_{i}.png")
+        try:
+            atomic_write(img_path, TRANSPARENT_PNG)
+            mock_log.debug(f"Saved mock image → {img_path}")
+            image_paths.append(img_path)
+
+        except Exception as e:
+            mock_log.error(f"saving mock image {i}: {e}")
+
+    mock_log.info(f"Completed generating {len(image_paths)} mock images")
+    return image_paths
+
+
+def _request(prompt: str) -> dict:
+    return {"model": MODEL, "prompt": prompt, "size": "1024x1024"}
+
+
+def _save_frame(resp, output_dir: str, i: int, sp) -> str:
+    image_base64 = resp.data[0].b64_json
+    sp.set("bytes_in", len(image_base64))
+    img_path = os.path.join(output_dir, f"frame_{i}.png")
+
+    atomic_write(img_path, base64.b64decode(image_base64))
+
+    log.debug(f"Saved frame {i} → {img_path}")
+    return img_path
 
-        transparent_png = (
-            b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'
-            b'\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06'
-            b'\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00'
-            b'\x0cIDATx\x9cc`\x00\x00\x00\x02\x00\x01'
-            b'\xe2!\xbc3\x00\x00\x00\x00IEND\xaeB`\x82'
-        )
 
-        for i, prompt in enumerate(prompts, start=1):
-            print(f"[image:mock] Creating mock frame {i} from prompt (len={len(prompt)})")
+def generate_frame(client, prompt: str, i: int, output_dir: str):
+    """One frame → output_dir/frame_<i>.png, or None if it failed."""
+    try:
+        with span("openai.images", model=MODEL, frame=i, bytes_out=len(prompt)) as sp:
+            resp = openai_scheduler.call(
+                client.images.with_raw_response.generate,
+                priority=openai_scheduler.HIGH,
+                hedge="openai.images",
+                **_request(prompt),
+            )
+            return _save_frame(resp, output_dir, i, sp)
+    except Exception as e:
+        log.error(f"generating image {i}: {e}")
+        return None
+
+
+async def generate_frame_async(client, prompt: str, i: int, output_dir: str):
+    try:
+        with span("openai.images", model=MODEL, frame=i, bytes_out=len(prompt)) as sp:
+            resp = await openai_scheduler.acall(
+                client.images.with_raw_response.generate,
+                priority=openai_scheduler.HIGH,
+                hedge="openai.images",
+                **_request(prompt),
+            )
+            return _save_frame(resp, output_dir, i, sp)
+    except Exception as e:
+        log.error(f"generating image {i}: {e}")
+        return None
 
-            img_path = os.path.join(output_dir, f"frame_{i}.png")
-            try:
-                with open(img_path, "wb") as f:
-                    f.write(transparent_png)
-                print(f"[image:mock] Saved mock image → {img_path}")
-                image_paths.append(img_path)
 
-            except Exception as e:
-                print(f"[image:mock] ERROR saving mock image {i}: {e}")
+@traced("stage.images")
+def generate_images_from_prompts(prompts: list[str], output_dir: str = DEFAULT_OUTPUT_DIR) -> list[str]:
+    """
+    Generate images from prompts (mock or real), with full debug logging.
+    Frames are written to output_dir/frame_<i>.png (the run's workspace).
+    Returns a list of saved file paths.
+    """
 
-        print(f"[image:mock] Completed generating {len(image_paths)} mock images")
-        return image_paths
+    output_dir = _prepare(prompts, output_dir)
+
+    # ----------------------------------------------------
+    # MOCK MODE — free tiny PNGs
+    # ----------------------------------------------------
+    if USE_MOCK_AI:
+        return _mock_images(prompts, output_dir)
 
     # ----------------------------------------------------
     # REAL MODE — OpenAI Images API
     # ----------------------------------------------------
-    print("[image] Real mode enabled — Calling OpenAI image model")
-    api_key = require_env("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+    log.info("Real mode enabled — Calling OpenAI image model")
+    client = openai_scheduler.get_client()
+
+    image_paths = []
 
     for i, prompt in enumerate(prompts, start=1):
-        print(f"[image] Generating image {i}/{len(prompts)}")
-        print(f"[image] Prompt length: {len(prompt)} chars")
+        log.debug(f"Generating image {i}/{len(prompts)} (prompt {len(prompt)} chars)")
+        img_path = generate_frame(client, prompt, i, output_dir)
+        if img_path:
+            image_paths.append(img_path)
 
-        try:
-            resp = client.images.generate(
-                model=MODEL,
-                prompt=prompt,
-                size="1024x1024"
-            )
+    log.info(f"Finished generating {len(image_paths)} images total")
+    return image_paths
 
-            image_base64 = resp.data[0].b64_json
-            img_path = os.path.join(output_dir, f"frame_{i}.png")
 
-            with open(img_path, "wb") as img_file:
-                img_file.write(base64.b64decode(image_base64))
+@traced("stage.images")
+async def generate_images_from_prompts_async(prompts: list[str], output_dir: str = DEFAULT_OUTPUT_DIR) -> list[str]:
+    """
+    Async generate_images_from_prompts(). Frames are requested concurrently
+    (the scheduler still enforces the model's rate limits); the returned
+    paths keep prompt order and skip failed frames, as in the sync version.
+    """
 
-            print(f"[image] Saved frame {i} → {img_path}")
-            image_paths.append(img_path)
+    output_dir = _prepare(prompts, output_dir)
 
-        except Exception as e:
-            print(f"[image] ERROR generating image {i}: {e}")
+    if USE_MOCK_AI:
+        return _mock_images(prompts, output_dir)
+
+    log.info("Real mode enabled — Calling OpenAI image model")
+
+    client = openai_scheduler.get_async_client()
+
+    async def one(i: int, prompt: str):
+        log.debug(f"Generating image {i}/{len(prompts)} (prompt {len(prompt)} chars)")
+        return await generate_frame_async(client, prompt, i, output_dir)
+
+    results = await asyncio.gather(*(one(i, p) for i, p in enumerate(prompts, start=1)))
 
-    print(f"[image] Finished generating {len(image_paths)} images total")
-    return image_paths
\ No newline at end of file
+    image_paths = [p for p in results if p]
+    log.info(f"Finished generating {len(image_paths)} images total")
+    return image_paths
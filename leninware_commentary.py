@@ -1,18 +1,23 @@
 # leninware_commentary.py
 
+import time
 from pathlib import Path
-from config import USE_MOCK_AI, LANGUAGE_MODE, require_env
+from typing import Callable
+from config import USE_MOCK_AI, LANGUAGE_MODE
+import openai_scheduler
+import token_budget
+from telemetry import span, traced, record_openai_usage
+from pipeline_logging import get_logger
 
-# Only import OpenAI if NOT in mock mode
-if not USE_MOCK_AI:
-    from openai import OpenAI
+log = get_logger("commentary")
+mock_log = get_logger("commentary:mock")
 
 PROMPT_PATH = Path("prompts/leninware_raw.txt")
 
 
 def load_leninware_system_prompt() -> str:
     """Load the raw Leninware system prompt from disk, with debug logging."""
-    print(f"[commentary] Loading system prompt from {PROMPT_PATH}")
+    log.info(f"Loading system prompt from {PROMPT_PATH}")
 
     if not PROMPT_PATH.exists():
         raise RuntimeError(
@@ -21,7 +26,7 @@ def load_leninware_system_prompt() -> str:
         )
 
     text = PROMPT_PATH.read_text(encoding="utf-8")
-    print(f"[commentary] Loaded system prompt ({len(text)} chars)")
+    log.info(f"Loaded system prompt ({len(text)} chars)")
     return text
 
 
@@ -32,7 +37,7 @@ def _wrap_prompt_for_language(system_prompt: str) -> str:
     - LANGUAGE_MODE=es → wrap to enforce Rioplatense Spanish output
     """
     if LANGUAGE_MODE == "es":
-        print("[commentary] LANGUAGE_MODE=es — Spanish commentary enabled.")
+        log.info("LANGUAGE_MODE=es — Spanish commentary enabled.")
         return (
             "Responde SIEMPRE en español rioplatense natural, fluido y militante.\n"
             "No traduzcas literalmente; escribe como un comunicador político argentino.\n"
@@ -43,74 +48,242 @@ def _wrap_prompt_for_language(system_prompt: str) -> str:
             f"{system_prompt}"
         )
     else:
-        print("[commentary] LANGUAGE_MODE=en — English commentary mode.")
+        log.info("LANGUAGE_MODE=en — English commentary mode.")
         return system_prompt
 
 
-def generate_leninware_commentary(transcript: str) -> str:
-    """Generate Leninware commentary (real or mock), with full debug logging."""
+MOCK_COMMENTARY = (
+    "MOCK LENINWARE COMMENTARY:\n"
+    "The bourgeois media spreads its narratives once again. "
+    "This is placeholder commentary generated in mock mode."
+)
+
 
-    print("[commentary] Generating Leninware commentary...")
-    print(f"[commentary] Transcript length: {len(transcript)} chars")
+def _validate(transcript: str) -> None:
+    log.info("Generating Leninware commentary...")
+    log.info(f"Transcript length: {len(transcript)} chars")
 
     if not transcript or not transcript.strip():
-        print("[commentary] ERROR — Empty transcript passed to commentary")
+        log.error("Empty transcript passed to commentary")
         raise ValueError("Empty transcript passed to Leninware commentary")
 
+
+def _build_request(transcript: str, system_prompt: str) -> dict:
+    """Chat completion arguments for the commentary call."""
+
+    # Build user input
+    user_content = (
+        "Use ONLY the text inside the TRANSCRIPT block.\n"
+        "Ignore logs, stack traces, or errors from any pipeline stage.\n\n"
+        "TRANSCRIPT:\n"
+        "<<<BEGIN_TRANSCRIPT>>>\n"
+        f"{transcript}\n"
+        "<<<END_TRANSCRIPT>>>"
+    )
+
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content},
+        ],
+        "max_tokens": 900,
+        "temperature": 0.8,
+    }
+
+
+def _plan_request(transcript: str) -> dict:
+    """The commentary request, with its input sized to the "commentary" token budget."""
+
+    # Load original system prompt, wrapped for bilingual mode
+    system_prompt = _wrap_prompt_for_language(load_leninware_system_prompt().strip())
+
+    request = token_budget.size_request(
+        "commentary",
+        lambda text: _build_request(text, system_prompt),
+        transcript,
+    )
+    log.info(f"Sending request to OpenAI (model={request['model']}, max_tokens={request['max_tokens']}, temp=0.8)")
+    return request
+
+
+def _finish(resp) -> str:
+    output = (resp.choices[0].message.content or "").strip()
+
+    log.info(f"Commentary generated ({len(output)} chars)")
+
+    return output
+
+
+@traced("stage.commentary")
+def generate_leninware_commentary(transcript: str) -> str:
+    """Generate Leninware commentary (real or mock), with full debug logging."""
+
+    _validate(transcript)
+
     # ----------------------------------------------------
     # MOCK MODE (free)
     # ----------------------------------------------------
     if USE_MOCK_AI:
-        print("[commentary:mock] Mock mode enabled — returning dummy commentary")
-        return (
-            "MOCK LENINWARE COMMENTARY:\n"
-            "The bourgeois media spreads its narratives once again. "
-            "This is placeholder commentary generated in mock mode."
-        )
+        mock_log.info("Mock mode enabled — returning dummy commentary")
+        return MOCK_COMMENTARY
 
     # ----------------------------------------------------
     # REAL MODE — now uses gpt-4o-mini (cheap + stable)
     # ----------------------------------------------------
-    print("[commentary] Real mode enabled — Calling OpenAI GPT")
+    log.info("Real mode enabled — Calling OpenAI GPT")
 
-    api_key = require_env("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+    client = openai_scheduler.get_client()
 
-    # Load original system prompt
-    base_prompt = load_leninware_system_prompt().strip()
+    request = _plan_request(transcript)
 
-    # Wrap for bilingual mode
-    system_prompt = _wrap_prompt_for_language(base_prompt)
+    try:
+        with span("openai.chat", model="gpt-4o-mini",
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            resp = openai_scheduler.call(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.NORMAL,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, resp, "gpt-4o-mini")
+    except Exception as e:
+        log.error(f"calling OpenAI: {e}")
+        return ""
 
-    # Build user input
-    user_content = (
-        "Use ONLY the text inside the TRANSCRIPT block.\n"
-        "Ignore logs, stack traces, or errors from any pipeline stage.\n\n"
-        "TRANSCRIPT:\n"
-        "<<<BEGIN_TRANSCRIPT>>>\n"
-        f"{transcript}\n"
-        "<<<END_TRANSCRIPT>>>"
-    )
+    return _finish(resp)
 
-    print("[commentary] Sending request to OpenAI...")
-    print("[commentary] Model=gpt-4o-mini, max_tokens=900, temp=0.8")
+
+@traced("stage.commentary")
+async def generate_leninware_commentary_async(transcript: str) -> str:
+    """Async generate_leninware_commentary(): same result and mock behavior."""
+
+    _validate(transcript)
+
+    if USE_MOCK_AI:
+        mock_log.info("Mock mode enabled — returning dummy commentary")
+        return MOCK_COMMENTARY
+
+    log.info("Real mode enabled — Calling OpenAI GPT")
+
+    request = _plan_request(transcript)
 
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content},
-            ],
-            max_tokens=900,
-            temperature=0.8,
-        )
+        client = openai_scheduler.get_async_client()
+        with span("openai.chat", model="gpt-4o-mini",
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            resp = await openai_scheduler.acall(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.NORMAL,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, resp, "gpt-4o-mini")
     except Exception as e:
-        print(f"[commentary] ERROR calling OpenAI: {e}")
+        log.error(f"calling OpenAI: {e}")
         return ""
 
-    output = (resp.choices[0].message.content or "").strip()
+    return _finish(resp)
+
+
+def _finish_stream(parts: list) -> str:
+    output = "".join(parts).strip()
+    log.info(f"Commentary streamed ({len(output)} chars in {len(parts)} chunks)")
+    return output
+
+
+def _stream_request(transcript: str) -> dict:
+    """The commentary request as a token stream, with usage in its last chunk."""
+    # Streams are never hedged: a duplicate would deliver the text twice.
+    return dict(_plan_request(transcript), stream=True, stream_options={"include_usage": True})
+
+
+def _on_chunk(sp, chunk, parts: list, on_text: Callable[[str], None], t0: float) -> None:
+    for choice in chunk.choices or []:
+        delta = getattr(choice.delta, "content", None)
+        if not delta:
+            continue
+        if not parts:
+            sp.set("ttft_s", round(time.monotonic() - t0, 3))
+        parts.append(delta)
+        on_text(delta)
+
+
+@traced("stage.commentary")
+def stream_leninware_commentary(transcript: str, on_text: Callable[[str], None]) -> str:
+    """
+    generate_leninware_commentary() as a token stream: on_text(delta) is
+    called with each piece of text as it arrives. Returns the whole
+    commentary ("" on error, like the non-streaming call).
+    """
 
-    print(f"[commentary] Commentary generated ({len(output)} chars)")
+    _validate(transcript)
+
+    if USE_MOCK_AI:
+        mock_log.info("Mock mode enabled — returning dummy commentary")
+        on_text(MOCK_COMMENTARY)
+        return MOCK_COMMENTARY
+
+    log.info("Real mode enabled — Streaming OpenAI GPT")
+
+    client = openai_scheduler.get_client()
+    request = _stream_request(transcript)
+
+    parts, last = [], None
+    try:
+        with span("openai.chat", model="gpt-4o-mini", stream=True,
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            t0 = time.monotonic()
+            stream = openai_scheduler.call(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.NORMAL,
+                **request,
+            )
+            for chunk in stream:
+                last = chunk
+                _on_chunk(sp, chunk, parts, on_text, t0)
+            record_openai_usage(sp, last, "gpt-4o-mini")
+            openai_scheduler.account_stream("gpt-4o-mini", request, last, time.monotonic() - t0)
+    except Exception as e:
+        log.error(f"streaming from OpenAI: {e}")
+        return ""
+
+    return _finish_stream(parts)
+
+
+@traced("stage.commentary")
+async def stream_leninware_commentary_async(transcript: str, on_text: Callable[[str], None]) -> str:
+    """Async stream_leninware_commentary(); on_text runs on the event loop."""
+
+    _validate(transcript)
+
+    if USE_MOCK_AI:
+        mock_log.info("Mock mode enabled — returning dummy commentary")
+        on_text(MOCK_COMMENTARY)
+        return MOCK_COMMENTARY
+
+    log.info("Real mode enabled — Streaming OpenAI GPT")
+
+    request = _stream_request(transcript)
+
+    parts, last = [], None
+    try:
+        client = openai_scheduler.get_async_client()
+        with span("openai.chat", model="gpt-4o-mini", stream=True,
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            t0 = time.monotonic()
+            stream = await openai_scheduler.acall(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.NORMAL,
+                **request,
+            )
+            async for chunk in stream:
+                last = chunk
+                _on_chunk(sp, chunk, parts, on_text, t0)
+            record_openai_usage(sp, last, "gpt-4o-mini")
+            openai_scheduler.account_stream("gpt-4o-mini", request, last, time.monotonic() - t0)
+    except Exception as e:
+        log.error(f"streaming from OpenAI: {e}")
+        return ""
 
-    return output
\ No newline at end of file
+    return _finish_stream(parts)
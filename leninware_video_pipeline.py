@@ -3,10 +3,51 @@
 import os
 from typing import List
 from config import USE_MOCK_AI
+from telemetry import traced
+from workspace import atomic_write
+from pipeline_logging import get_logger
 
-from shotstack_renderer import render_video_with_shotstack
+from shotstack_renderer import (
+    DUMMY_MP4,
+    render_video_with_shotstack,
+    render_video_with_shotstack_async,
+)
 
+log = get_logger("pipeline")
+mock_log = get_logger("pipeline:mock")
 
+
+def _mock_video(video_path: str) -> str:
+    mock_log.info("Mock mode enabled — skipping Shotstack.")
+    mock_log.info(f"Creating tiny placeholder MP4 at {video_path}")
+
+    try:
+        atomic_write(video_path, DUMMY_MP4)
+    except Exception as e:
+        mock_log.error(f"writing dummy MP4: {e}")
+        raise
+
+    mock_log.info("Mock video complete.")
+    return video_path
+
+
+def _start(image_paths: List[str], audio_path: str, workdir: str) -> str:
+    log.info("===== Video Pipeline Starting =====")
+    log.info(f"workdir: {workdir}")
+    log.info(f"audio path: {audio_path}")
+    log.info(f"image count: {len(image_paths)}")
+
+    os.makedirs(workdir, exist_ok=True)
+    return os.path.join(workdir, "final.mp4")
+
+
+def _done(video_path: str) -> str:
+    log.info(f"Video rendering complete → {video_path}")
+    log.info("=====================================")
+    return video_path
+
+
+@traced("stage.render")
 def create_leninware_video(
     script_text: str,
     image_paths: List[str],
@@ -19,37 +60,19 @@ def create_leninware_video(
     - real mode: render via Shotstack
     """
 
-    print("\n[pipeline] ===== Video Pipeline Starting =====")
-    print(f"[pipeline] workdir: {workdir}")
-    print(f"[pipeline] audio path: {audio_path}")
-    print(f"[pipeline] image count: {len(image_paths)}")
-
-    os.makedirs(workdir, exist_ok=True)
-    video_path = os.path.join(workdir, "final.mp4")
+    video_path = _start(image_paths, audio_path, workdir)
 
     # ----------------------------------------------------
     # MOCK MODE
     # ----------------------------------------------------
     if USE_MOCK_AI:
-        print("[pipeline:mock] Mock mode enabled — skipping Shotstack.")
-        print(f"[pipeline:mock] Creating tiny placeholder MP4 at {video_path}")
-
-        try:
-            dummy_mp4 = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42mp41"
-            with open(video_path, "wb") as f:
-                f.write(dummy_mp4)
-        except Exception as e:
-            print(f"[pipeline:mock] ERROR writing dummy MP4: {e}")
-            raise
-
-        print("[pipeline:mock] Mock video complete.\n")
-        return video_path
+        return _mock_video(video_path)
 
     # ----------------------------------------------------
     # REAL MODE — Shotstack renderer
     # ----------------------------------------------------
-    print("[pipeline] Real mode — invoking Shotstack renderer...")
-    print(f"[pipeline] Rendering with {len(image_paths)} images and audio.")
+    log.info("Real mode — invoking Shotstack renderer...")
+    log.info(f"Rendering with {len(image_paths)} images and audio.")
 
     try:
         render_video_with_shotstack(
@@ -59,10 +82,38 @@ def create_leninware_video(
             output_video_path=video_path,
         )
     except Exception as e:
-        print(f"[pipeline] ERROR during Shotstack render: {e}")
+        log.error(f"during Shotstack render: {e}")
         raise
 
-    print(f"[pipeline] Video rendering complete → {video_path}")
-    print("[pipeline] =====================================\n")
+    return _done(video_path)
+
+
+@traced("stage.render")
+async def create_leninware_video_async(
+    script_text: str,
+    image_paths: List[str],
+    audio_path: str,
+    workdir: str = "/tmp/leninware",
+) -> str:
+    """Async create_leninware_video()."""
+
+    video_path = _start(image_paths, audio_path, workdir)
+
+    if USE_MOCK_AI:
+        return _mock_video(video_path)
+
+    log.info("Real mode — invoking Shotstack renderer...")
+    log.info(f"Rendering with {len(image_paths)} images and audio.")
+
+    try:
+        await render_video_with_shotstack_async(
+            audio_file=audio_path,
+            image_files=image_paths,
+            script_text=script_text,
+            output_video_path=video_path,
+        )
+    except Exception as e:
+        log.error(f"during Shotstack render: {e}")
+        raise
 
-    return video_path
\ No newline at end of file
+    return _done(video_path)
@@ -0,0 +1,224 @@
+# load_driver.py
+#
+# Runs many full pipelines (REAL mode) against the local stand-in APIs in
+# mock_api_server.py and reports throughput and tail latency.
+#
+#   python load_driver.py --runs 40 --concurrency 8
+#   python load_driver.py --runs 20 --concurrency 4 --latency-scale 0.1 --set openai.chat.error_rate=0.05
+#   python load_driver.py --target http://127.0.0.1:8765      # use an already-running server
+#   python load_driver.py --runs 40 --concurrency 40 --async  # all runs on one event loop
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+from mock_api_server import pipeline_env
+
+RESULTS_DIR = "output/loadtest"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _server_stats(base_url: str) -> dict:
+    with urllib.request.urlopen(f"{base_url}/__stats", timeout=5) as r:
+        return json.loads(r.read())
+
+
+def _start_server(args) -> tuple:
+    """Run the stand-in server in its own process so it does not share our GIL."""
+    port = _free_port()
+    cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_api_server.py"),
+           "--port", str(port), "--latency-scale", str(args.latency_scale), "--seed", str(args.seed)]
+    if args.server_config:
+        cmd += ["--config", args.server_config]
+    for item in args.set:
+        cmd += ["--set", item]
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            _server_stats(base_url)
+            return proc, base_url
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("stand-in server did not start")
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _one_run(run_pipeline, index: int) -> dict:
+    t0 = time.perf_counter()
+    try:
+        video_path = run_pipeline.main()
+        outcome = "ok" if video_path else "no_output"
+        error = None
+    except Exception as e:
+        outcome, error = "error", f"{type(e).__name__}: {e}"[:300]
+    return {"run": index, "outcome": outcome, "seconds": time.perf_counter() - t0, "error": error}
+
+
+async def _one_run_async(run_pipeline, index: int, gate: asyncio.Semaphore) -> dict:
+    async with gate:
+        t0 = time.perf_counter()
+        try:
+            video_path = await run_pipeline.run_async()
+            outcome = "ok" if video_path else "no_output"
+            error = None
+        except Exception as e:
+            outcome, error = "error", f"{type(e).__name__}: {e}"[:300]
+        return {"run": index, "outcome": outcome, "seconds": time.perf_counter() - t0, "error": error}
+
+
+def _report(r: dict) -> None:
+    print(f"[load] run {r['run']:>4}  {r['outcome']:<9} {r['seconds']:8.2f}s"
+          + (f"  {r['error']}" if r["error"] else ""))
+
+
+async def _run_all_async(run_pipeline, args) -> list:
+    import async_http
+    import openai_scheduler
+
+    gate = asyncio.Semaphore(args.concurrency)
+    results = []
+    try:
+        for fut in asyncio.as_completed([_one_run_async(run_pipeline, i, gate) for i in range(args.runs)]):
+            r = await fut
+            results.append(r)
+            _report(r)
+    finally:
+        await async_http.aclose()
+        await openai_scheduler.aclose()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load harness for the reaction pipeline")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--channels", type=int, default=3, help="stand-in channels to ingest")
+    parser.add_argument("--target", default="", help="base URL of a running mock_api_server")
+    parser.add_argument("--server-config", default="", help="JSON endpoint profiles for the server")
+    parser.add_argument("--set", action="append", default=[], metavar="ENDPOINT.FIELD=VALUE")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--upload", action="store_true", help="also exercise the YouTube upload path")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="run pipelines as coroutines on one event loop instead of threads")
+    parser.add_argument("--rate-limits", default="",
+                        help="OPENAI_RATE_LIMITS for the runs (default: unlimited, so the "
+                             "stand-ins are measured rather than the client-side limiter)")
+    args = parser.parse_args(argv)
+
+    proc = None
+    if args.target:
+        base_url = args.target.rstrip("/")
+    else:
+        proc, base_url = _start_server(args)
+
+    # Config is read at import time, so the environment must be in place first.
+    os.environ.update(pipeline_env(base_url))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["OPENAI_RATE_LIMITS"] = args.rate_limits
+    os.environ.setdefault("TELEMETRY_DIR", os.path.join(RESULTS_DIR, "telemetry"))
+    # Stand-in calls must not eat into the real daily YouTube quota ledger.
+    os.environ.setdefault("YOUTUBE_QUOTA_STATE_PATH", os.path.join(RESULTS_DIR, "youtube_quota.json"))
+    os.environ.setdefault("YOUTUBE_QUOTA_DAILY", str(10**9))
+    os.environ.setdefault("WORKSPACE_ROOT", os.path.join(RESULTS_DIR, "jobs"))
+    # Every run sees the same stand-in videos; the ledger would skip all but the first.
+    os.environ.setdefault("ENABLE_LEDGER", "false")
+    os.environ.setdefault("ENABLE_NEAR_DUP", "false")
+    # Stand-in transcripts are random words; the quality gate would reject them all.
+    os.environ.setdefault("ENABLE_QUALITY_GATE", "false")
+    os.environ["ENABLE_YOUTUBE_UPLOAD"] = "true" if args.upload else "false"
+
+    import run_pipeline
+    import youtube_ingest
+
+    channels_file = tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False)
+    with channels_file:
+        for i in range(args.channels):
+            channels_file.write(f"UCstandin{i:04d}\n")
+    youtube_ingest.CHANNELS_FILE = Path(channels_file.name)
+
+    mode = "async" if args.use_async else "threads"
+    print(f"[load] {args.runs} runs, concurrency {args.concurrency} ({mode}), stand-ins at {base_url}")
+    results = []
+    started = time.perf_counter()
+    try:
+        if args.use_async:
+            results = asyncio.run(_run_all_async(run_pipeline, args))
+        else:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                futures = [pool.submit(_one_run, run_pipeline, i) for i in range(args.runs)]
+                for fut in as_completed(futures):
+                    r = fut.result()
+                    results.append(r)
+                    _report(r)
+        wall = time.perf_counter() - started
+        server_stats = _server_stats(base_url)
+    finally:
+        os.unlink(channels_file.name)
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    lat = sorted(r["seconds"] for r in results if r["outcome"] == "ok")
+    summary = {
+        "runs": args.runs,
+        "concurrency": args.concurrency,
+        "ok": sum(r["outcome"] == "ok" for r in results),
+        "no_output": sum(r["outcome"] == "no_output" for r in results),
+        "errors": sum(r["outcome"] == "error" for r in results),
+        "wall_seconds": round(wall, 3),
+        "throughput_runs_per_min": round(len(lat) / wall * 60, 3) if wall else 0.0,
+        "latency_s": {
+            "p50": round(_percentile(lat, 50), 3),
+            "p90": round(_percentile(lat, 90), 3),
+            "p95": round(_percentile(lat, 95), 3),
+            "p99": round(_percentile(lat, 99), 3),
+            "max": round(lat[-1], 3) if lat else 0.0,
+        },
+        "server": server_stats,
+    }
+
+    print("\n[load] ===== Summary =====")
+    print(f"[load] ok={summary['ok']} no_output={summary['no_output']} errors={summary['errors']} "
+          f"wall={summary['wall_seconds']}s throughput={summary['throughput_runs_per_min']} runs/min")
+    print("[load] latency " + "  ".join(f"{k}={v}s" for k, v in summary["latency_s"].items()))
+    print(f"[load] server requests: {server_stats.get('requests')}")
+    print(f"[load] injected errors: {server_stats.get('errors')}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out_path = os.path.join(RESULTS_DIR, f"load_{stamp}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"args": vars(args), "summary": summary, "runs": results}, f, indent=2)
+    print(f"[load] Report saved → {out_path}")
+    return 0 if summary["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
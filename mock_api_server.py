@@ -0,0 +1,613 @@
+# mock_api_server.py
+#
+# Local stand-ins for every external API the pipeline calls, with configurable
+# latency, error rate and payload size. Unlike USE_MOCK_AI (which short-circuits
+# inside each module), the pipeline runs in REAL mode against this server, so
+# HTTP clients, retries, timeouts and concurrency behave as they would live.
+#
+#   python mock_api_server.py --port 8765
+#   python mock_api_server.py --port 8765 --config loadtest.json --set openai.chat.latency_ms=4000
+#
+# Point the pipeline at it with the environment from `pipeline_env(base_url)`.
+
+import argparse
+import base64
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+import wave
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# ---------------------------------------------------------
+#   ENDPOINT PROFILES
+#   latency_ms   median response latency
+#   sigma        log-normal spread (0 = fixed latency; 1 = heavy tail)
+#   error_rate   probability of answering with error_status
+#   size         payload size knob (chars, bytes, seconds — per endpoint)
+#   per_kchar_ms openai.speech only: added latency per 1000 input chars
+# ---------------------------------------------------------
+DEFAULT_PROFILES = {
+    "youtube.search": {"latency_ms": 120, "sigma": 0.4, "error_rate": 0.0, "error_status": 500, "size": 5},
+    "youtube.videos": {"latency_ms": 80, "sigma": 0.4, "error_rate": 0.0, "error_status": 500, "size": 0},
+    "transcript": {"latency_ms": 900, "sigma": 0.6, "error_rate": 0.0, "error_status": 503, "size": 40_000},
+    "openai.chat": {"latency_ms": 2500, "sigma": 0.5, "error_rate": 0.0, "error_status": 429, "size": 2_400},
+    "openai.images": {"latency_ms": 9000, "sigma": 0.4, "error_rate": 0.0, "error_status": 429, "size": 600_000},
+    "openai.speech": {"latency_ms": 3000, "sigma": 0.4, "error_rate": 0.0, "error_status": 429, "size": 45,
+                      "per_kchar_ms": 0},
+    "shotstack.submit": {"latency_ms": 400, "sigma": 0.3, "error_rate": 0.0, "error_status": 500, "size": 0},
+    "shotstack.status": {"latency_ms": 60, "sigma": 0.3, "error_rate": 0.0, "error_status": 500, "size": 0},
+    "shotstack.render": {"latency_ms": 20_000, "sigma": 0.3, "error_rate": 0.0, "error_status": 0, "size": 0},
+    "shotstack.asset": {"latency_ms": 500, "sigma": 0.3, "error_rate": 0.0, "error_status": 500, "size": 4_000_000},
+    "google.token": {"latency_ms": 150, "sigma": 0.3, "error_rate": 0.0, "error_status": 500, "size": 0},
+    "upload": {"latency_ms": 300, "sigma": 0.3, "error_rate": 0.0, "error_status": 503, "size": 0},
+}
+
+_WORDS = (
+    "capital labor wage profit workers union strike rent housing empire media "
+    "state power class market crisis budget war police news solidarity"
+).split()
+
+_TINY_PNG = (
+    b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'
+    b'\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06'
+    b'\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00'
+    b'\x0cIDATx\x9cc`\x00\x00\x00\x02\x00\x01'
+    b'\xe2!\xbc3\x00\x00\x00\x00IEND\xaeB`\x82'
+)
+
+
+def _words(n_chars: int, seed) -> str:
+    rng = random.Random(seed)
+    out, n = [], 0
+    while n < n_chars:
+        w = rng.choice(_WORDS)
+        out.append(w)
+        n += len(w) + 1
+    return " ".join(out)
+
+
+def _prose(n_chars: int, seed) -> str:
+    """_words() cut into sentences of 8-16 words, for chat completions."""
+    words = _words(n_chars, seed).split()
+    rng = random.Random(f"{seed}:prose")
+    out, i = [], 0
+    while i < len(words):
+        n = rng.randint(8, 16)
+        sentence = " ".join(words[i:i + n])
+        out.append(sentence[:1].upper() + sentence[1:] + ".")
+        i += n
+    return " ".join(out)
+
+
+def _schema_doc(schema: dict, size: int, seed, n_items: int):
+    """A document matching a (structured-output) JSON schema; strings are filler words."""
+    kind = schema.get("type")
+    if kind == "object":
+        return {k: _schema_doc(v, size, f"{seed}:{k}", n_items) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_schema_doc(schema.get("items", {}), size // max(n_items, 1), f"{seed}:{i}", n_items)
+                for i in range(n_items)]
+    if kind in ("integer", "number"):
+        return 1
+    if kind == "boolean":
+        return True
+    return _words(size, seed)
+
+
+def _wav_bytes(seconds: float) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(b"\x00\x00" * int(16000 * seconds))
+    return buf.getvalue()
+
+
+def _youtube_discovery(base_url: str) -> dict:
+    """Just enough of the YouTube v3 discovery document for videos.insert."""
+    return {
+        "kind": "discovery#restDescription",
+        "discoveryVersion": "v1",
+        "id": "youtube:v3",
+        "name": "youtube",
+        "version": "v3",
+        "rootUrl": f"{base_url}/",
+        "servicePath": "youtube/v3/",
+        "batchPath": "batch",
+        "parameters": {
+            "alt": {"type": "string", "default": "json", "location": "query"},
+        },
+        "schemas": {"Video": {"id": "Video", "type": "object"}},
+        "resources": {
+            "videos": {
+                "methods": {
+                    "insert": {
+                        "id": "youtube.videos.insert",
+                        "path": "videos",
+                        "flatPath": "videos",
+                        "httpMethod": "POST",
+                        "parameters": {
+                            "part": {"type": "string", "required": True, "repeated": True, "location": "query"},
+                        },
+                        "parameterOrder": ["part"],
+                        "request": {"$ref": "Video"},
+                        "response": {"$ref": "Video"},
+                        "supportsMediaUpload": True,
+                        "mediaUpload": {
+                            "accept": ["video/*", "application/octet-stream"],
+                            "maxSize": "274877906944",
+                            "protocols": {
+                                "simple": {"multipart": True, "path": "/upload/youtube/v3/videos"},
+                                "resumable": {"multipart": True, "path": "/resumable/upload/youtube/v3/videos"},
+                            },
+                        },
+                    }
+                }
+            }
+        },
+    }
+
+
+class MockState:
+    """Profiles, request counters and in-flight renders/uploads, shared by handler threads."""
+
+    def __init__(self, profiles: dict, seed: int = 1):
+        self.profiles = profiles
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts: dict = {}
+        self.errors: dict = {}
+        self.renders: dict = {}   # render id → ready_at (epoch seconds)
+        self.uploads: dict = {}   # session id → bytes received
+        self._blobs: dict = {}
+
+    def blob(self, kind: str, size: int) -> bytes:
+        key = (kind, size)
+        with self.lock:
+            if key not in self._blobs:
+                if kind == "png":
+                    self._blobs[key] = _TINY_PNG + bytes(max(0, size - len(_TINY_PNG)))
+                elif kind == "wav":
+                    self._blobs[key] = _wav_bytes(size)
+                else:
+                    self._blobs[key] = bytes(size)
+            return self._blobs[key]
+
+    def sample_latency(self, name: str) -> float:
+        p = self.profiles[name]
+        median = max(p["latency_ms"], 0) / 1000.0
+        with self.lock:
+            if p["sigma"] <= 0 or median == 0:
+                return median
+            return self.rng.lognormvariate(math.log(median), p["sigma"])
+
+    def should_fail(self, name: str) -> bool:
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            fail = self.rng.random() < self.profiles[name]["error_rate"]
+            if fail:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            return fail
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "LeninwareMock/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # -- plumbing ------------------------------------------------------
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def log_message(self, fmt, *args):  # silence per-request stderr lines
+        pass
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, status: int, doc, headers=None):
+        self._send(status, json.dumps(doc).encode("utf-8"), headers=headers)
+
+    def _simulate(self, name: str, latency: float = None) -> bool:
+        """Sleep for the sampled (or given) latency; answer with an error and return False on injected failure."""
+        time.sleep(self.state.sample_latency(name) if latency is None else latency)
+        if self.state.should_fail(name):
+            status = self.state.profiles[name]["error_status"] or 500
+            headers = {"Retry-After": "1"} if status in (429, 503) else None
+            self._json(status, {"error": {"message": f"injected {name} failure", "code": status}}, headers)
+            return False
+        return True
+
+    # -- routing -------------------------------------------------------
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = parse_qs(url.query)
+        path = url.path
+
+        if path == "/__stats":
+            with self.state.lock:
+                return self._json(200, {"requests": dict(self.state.counts), "errors": dict(self.state.errors)})
+        if path == "/youtube/v3/search":
+            return self._youtube_search(q)
+        if path == "/youtube/v3/videos":
+            return self._youtube_videos(q)
+        if path == "/api/v2/youtube/transcript":
+            return self._transcript(q)
+        if path.startswith("/discovery/"):
+            return self._json(200, _youtube_discovery(self.base_url))
+        m = re.fullmatch(r"/shotstack/v1/render/([\w-]+)", path)
+        if m:
+            return self._shotstack_status(m.group(1))
+        m = re.fullmatch(r"/shotstack/assets/([\w-]+)\.mp4", path)
+        if m:
+            return self._shotstack_asset()
+        self._json(404, {"error": f"no stand-in for GET {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        path = url.path
+        body = self._read_body()
+
+        if path == "/v1/chat/completions":
+            return self._openai_chat(body)
+        if path == "/v1/images/generations":
+            return self._openai_images(body)
+        if path == "/v1/audio/speech":
+            return self._openai_speech(body)
+        if path == "/shotstack/v1/render":
+            return self._shotstack_submit(body)
+        if path == "/token":
+            return self._token()
+        if path in ("/resumable/upload/youtube/v3/videos", "/upload/youtube/v3/videos"):
+            return self._upload_start(parse_qs(url.query))
+        self._json(404, {"error": f"no stand-in for POST {path}"})
+
+    def do_PUT(self):
+        m = re.fullmatch(r"/upload/session/([\w-]+)", urlparse(self.path).path)
+        if not m:
+            return self._json(404, {"error": "unknown upload session"})
+        self._upload_chunk(m.group(1))
+
+    # -- YouTube Data API ----------------------------------------------
+    def _youtube_search(self, q):
+        if not self._simulate("youtube.search"):
+            return
+        channel = q.get("channelId", ["chan"])[0]
+        n = int(q.get("maxResults", [self.state.profiles["youtube.search"]["size"]])[0])
+        items = [
+            {
+                "id": {"kind": "youtube#video", "videoId": f"{channel[-6:]}{i:05d}"},
+                "snippet": {
+                    "title": f"Stand-in video {i} from {channel}",
+                    "channelTitle": f"Channel {channel}",
+                    "publishedAt": f"2024-01-{1 + i % 28:02d}T12:00:00Z",
+                },
+            }
+            for i in range(n)
+        ]
+        self._json(200, {"kind": "youtube#searchListResponse", "items": items})
+
+    def _youtube_videos(self, q):
+        if not self._simulate("youtube.videos"):
+            return
+        ids = ",".join(q.get("id", [""])).split(",")
+        part = q.get("part", [""])[0]
+        items = []
+        for vid in filter(None, ids):
+            rng = random.Random(vid)
+            item = {"id": vid}
+            if "contentDetails" in part:
+                item["contentDetails"] = {"duration": f"PT{rng.randint(4, 40)}M{rng.randint(0, 59)}S"}
+            if "statistics" in part:
+                item["statistics"] = {
+                    "viewCount": str(rng.randint(1_000, 2_000_000)),
+                    "likeCount": str(rng.randint(10, 80_000)),
+                }
+            items.append(item)
+        self._json(200, {"kind": "youtube#videoListResponse", "items": items})
+
+    # -- transcriptapi.com ---------------------------------------------
+    def _transcript(self, q):
+        if not self._simulate("transcript"):
+            return
+        vid = q.get("video_url", ["x"])[0]
+        text = _words(self.state.profiles["transcript"]["size"], vid)
+        words = text.split()
+        chunks = [
+            {"text": " ".join(words[i:i + 12]), "start": i * 0.4, "duration": 4.8}
+            for i in range(0, len(words), 12)
+        ]
+        self._json(200, {"video_id": vid, "transcript": chunks})
+
+    # -- OpenAI --------------------------------------------------------
+    def _openai_chat(self, body: bytes):
+        req = json.loads(body or b"{}")
+        # A streamed completion sends its first chunk after a quarter of the
+        # sampled latency and spreads the rest over the chunks.
+        latency = self.state.sample_latency("openai.chat")
+        stream = bool(req.get("stream"))
+        if not self._simulate("openai.chat", latency * 0.25 if stream else latency):
+            return
+        prompt_text = " ".join(str(m.get("content", "")) for m in req.get("messages", []))
+        size = self.state.profiles["openai.chat"]["size"]
+
+        m = re.search(r"Create (\d+) symbolic storyboard", prompt_text)
+        fmt = req.get("response_format") or {}
+        if fmt.get("type") == "json_schema":
+            doc = _schema_doc(fmt["json_schema"]["schema"], size, len(prompt_text), int(m.group(1)) if m else 3)
+            content = json.dumps(doc)
+        elif m:
+            n = int(m.group(1))
+            lines = [_words(size // max(n, 1), f"{i}:{len(prompt_text)}") for i in range(1, n + 1)]
+            content = "\n".join(f"{i}. {line}" for i, line in enumerate(lines, start=1))
+        else:
+            content = _prose(size, len(prompt_text))
+
+        if stream:
+            return self._openai_chat_stream(req, prompt_text, content, latency * 0.75)
+
+        self._json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": req.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt_text) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt_text) + len(content)) // 4,
+            },
+        })
+
+    def _openai_chat_stream(self, req: dict, prompt_text: str, content: str, duration: float):
+        """Server-sent chat.completion.chunk events, one per word, then usage and [DONE]."""
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": req.get("model", "gpt-4o-mini"),
+        }
+        pieces = re.findall(r"\S+\s*", content) or [""]
+        events = [
+            dict(base, choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            for piece in pieces
+        ]
+        events.append(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (req.get("stream_options") or {}).get("include_usage"):
+            events.append(dict(base, choices=[], usage={
+                "prompt_tokens": len(prompt_text) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt_text) + len(content)) // 4,
+            }))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        # The SDK may drop the connection right after [DONE].
+        self.send_header("Connection", "close")
+        self.close_connection = True
+        self.end_headers()
+        pause = duration / len(pieces)
+        for doc in events:
+            self._chunk(f"data: {json.dumps(doc)}\n\n".encode("utf-8"))
+            time.sleep(pause)
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _openai_images(self, body: bytes):
+        if not self._simulate("openai.images"):
+            return
+        png = self.state.blob("png", self.state.profiles["openai.images"]["size"])
+        self._json(200, {
+            "created": int(time.time()),
+            "data": [{"b64_json": base64.b64encode(png).decode("ascii")}],
+        })
+
+    def _openai_speech(self, body: bytes):
+        req = json.loads(body or b"{}")
+        # Optional extra latency per 1000 input characters (synthesis time grows with the text).
+        profile = self.state.profiles["openai.speech"]
+        extra = profile.get("per_kchar_ms", 0) / 1000.0 * len(req.get("input", "")) / 1000.0
+        if not self._simulate("openai.speech", self.state.sample_latency("openai.speech") + extra):
+            return
+        seconds = profile["size"]
+        if req.get("response_format") == "pcm":
+            # Raw 24 kHz 16-bit mono, about 15 characters of input per second.
+            pcm_seconds = min(seconds, len(req.get("input", "")) / 15)
+            return self._send(200, bytes(2 * int(24000 * pcm_seconds)), "audio/pcm")
+        self._send(200, self.state.blob("wav", seconds), "audio/wav")
+
+    # -- Shotstack -----------------------------------------------------
+    def _shotstack_submit(self, body: bytes):
+        if not self._simulate("shotstack.submit"):
+            return
+        render_id = uuid.uuid4().hex
+        seconds = self.state.sample_latency("shotstack.render")
+        with self.state.lock:
+            self.state.renders[render_id] = time.time() + seconds
+        self._json(201, {"success": True, "message": "Created", "response": {"id": render_id, "message": "Render Successfully Queued"}})
+
+    def _shotstack_status(self, render_id: str):
+        if not self._simulate("shotstack.status"):
+            return
+        with self.state.lock:
+            ready_at = self.state.renders.get(render_id)
+        if ready_at is None:
+            return self._json(404, {"success": False, "response": {"status": "failed"}})
+        done = time.time() >= ready_at
+        resp = {"id": render_id, "status": "done" if done else "rendering"}
+        if done:
+            resp["url"] = f"{self.base_url}/shotstack/assets/{render_id}.mp4"
+        self._json(200, {"success": True, "response": resp})
+
+    def _shotstack_asset(self):
+        if not self._simulate("shotstack.asset"):
+            return
+        self._send(200, self.state.blob("mp4", self.state.profiles["shotstack.asset"]["size"]), "video/mp4")
+
+    # -- Google OAuth + YouTube upload ---------------------------------
+    def _token(self):
+        if not self._simulate("google.token"):
+            return
+        self._json(200, {"access_token": f"standin-{uuid.uuid4().hex[:8]}", "expires_in": 3599, "token_type": "Bearer"})
+
+    def _upload_start(self, q):
+        if not self._simulate("upload"):
+            return
+        session = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.uploads[session] = 0
+        self._send(200, b"", headers={"Location": f"{self.base_url}/upload/session/{session}"})
+
+    def _upload_chunk(self, session: str):
+        body = self._read_body()
+        if not self._simulate("upload"):
+            return
+        with self.state.lock:
+            if session not in self.state.uploads:
+                return self._json(404, {"error": "unknown upload session"})
+            # Content-Range: bytes START-END/TOTAL   or   bytes */TOTAL (status query)
+            m = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", self.headers.get("Content-Range", ""))
+            if m and int(m.group(1)) == self.state.uploads[session]:
+                self.state.uploads[session] += len(body)
+            elif not self.headers.get("Content-Range"):
+                self.state.uploads[session] += len(body)
+            received = self.state.uploads[session]
+            total_m = re.search(r"/(\d+)$", self.headers.get("Content-Range", ""))
+            total = int(total_m.group(1)) if total_m else received
+
+        if received >= total:
+            return self._json(200, {"kind": "youtube#video", "id": f"UP{session[:9]}"})
+        headers = {"Range": f"bytes=0-{received - 1}"} if received else {}
+        self._send(308, b"", headers=headers)
+
+
+class MockAPIServer:
+    """ThreadingHTTPServer wrapper that can run in a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, profiles=None, seed: int = 1):
+        merged = deepcopy(DEFAULT_PROFILES)
+        for name, overrides in (profiles or {}).items():
+            merged.setdefault(name, {}).update(overrides)
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = MockState(merged, seed)
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockAPIServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def pipeline_env(base_url: str) -> dict:
+    """Environment that points every pipeline module at a stand-in server."""
+    return {
+        "USE_MOCK_AI": "false",
+        "OPENAI_API_KEY": "standin",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "TRANSCRIPT_API_KEY": "standin",
+        "TRANSCRIPT_API_BASE_URL": base_url,
+        "YOUTUBE_API_KEY": "standin",
+        "YOUTUBE_API_BASE_URL": f"{base_url}/youtube/v3",
+        "SHOTSTACK_API_KEY": "standin",
+        "SHOTSTACK_API_URL": f"{base_url}/shotstack/v1/render",
+        "GOOGLE_CLIENT_ID": "standin",
+        "GOOGLE_CLIENT_SECRET": "standin",
+        "GOOGLE_REFRESH_TOKEN": "standin",
+        "GOOGLE_TOKEN_URI": f"{base_url}/token",
+        "YOUTUBE_DISCOVERY_URL": f"{base_url}/discovery/{{api}}/{{apiVersion}}",
+    }
+
+
+def load_profiles(config_path: str = "", overrides=(), latency_scale: float = 1.0) -> dict:
+    """
+    Read a JSON profile file, apply `endpoint.field=value` overrides and
+    multiply every latency by latency_scale (e.g. 0.1 for quick local runs).
+    """
+    profiles: dict = {}
+    if config_path:
+        with open(config_path, encoding="utf-8") as f:
+            profiles = json.load(f)
+    for item in overrides:
+        key, _, value = item.partition("=")
+        endpoint, _, field = key.rpartition(".")
+        if endpoint not in DEFAULT_PROFILES or field not in DEFAULT_PROFILES[endpoint]:
+            raise ValueError(f"unknown profile setting: {key}")
+        profiles.setdefault(endpoint, {})[field] = float(value) if "." in value else int(value)
+    if latency_scale != 1.0:
+        for endpoint, defaults in DEFAULT_PROFILES.items():
+            p = profiles.setdefault(endpoint, {})
+            p["latency_ms"] = p.get("latency_ms", defaults["latency_ms"]) * latency_scale
+            if "per_kchar_ms" in defaults:
+                p["per_kchar_ms"] = p.get("per_kchar_ms", defaults["per_kchar_ms"]) * latency_scale
+    return profiles
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local stand-ins for the pipeline's external APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", default="", help="JSON file of endpoint profile overrides")
+    parser.add_argument("--set", action="append", default=[], metavar="ENDPOINT.FIELD=VALUE")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply every latency")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    profiles = load_profiles(args.config, args.set, args.latency_scale)
+    server = MockAPIServer(args.host, args.port, profiles, args.seed)
+    print(f"[mock_api] Serving stand-in APIs on {server.base_url}", flush=True)
+    for k, v in pipeline_env(server.base_url).items():
+        print(f"  {k}={v}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,322 @@
+# near_duplicates.py
+
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    ENABLE_NEAR_DUP,
+    NEAR_DUP_PATH,
+    NEAR_DUP_THRESHOLD,
+    NEAR_DUP_WINDOW_DAYS,
+    NEAR_DUP_NUM_PERM,
+    NEAR_DUP_BANDS,
+    NEAR_DUP_SHINGLE_WORDS,
+)
+from telemetry import inc
+from workspace import atomic_output, file_lock
+from pipeline_logging import get_logger
+
+log = get_logger("dedup")
+
+# File layout: 8-byte magic, num_perm and shingle size (u32 each), then
+# fixed-size records. Signatures from different parameters are not comparable.
+_MAGIC = b"LWMINH01"
+_HEADER_LEN = 16
+
+_WORD_RE = re.compile(r"\w+")
+_SEED = 0x4C57  # fixed: signatures must be stable across processes
+_CHUNK = 4096   # shingles hashed per step (bounds the num_perm × chunk matrix)
+_SHINGLE_BASE = np.uint64(1099511628211)  # FNV prime, for the rolling k-gram hash
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def _record_dtype(num_perm: int) -> np.dtype:
+    return np.dtype([
+        ("video_id", "S16"),
+        ("ts", "<f8"),
+        ("sig", "<u4", (num_perm,)),
+    ])
+
+
+def _header(num_perm: int, shingle: int) -> bytes:
+    return _MAGIC + struct.pack("<II", num_perm, shingle)
+
+
+def shingle_hashes(text: str, k: int = NEAR_DUP_SHINGLE_WORDS) -> np.ndarray:
+    """Distinct 32-bit hashes of the word k-grams in text (lowercased)."""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+
+    # Hash each distinct word once, then combine k consecutive word hashes.
+    vocab, inverse = np.unique(np.array(words), return_inverse=True)
+    word_hash = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in vocab), dtype=np.uint64, count=len(vocab))
+    seq = word_hash[inverse]
+
+    k = min(k, len(seq))
+    n = len(seq) - k + 1
+    h = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        h = h * _SHINGLE_BASE + seq[j:j + n]  # wraps mod 2^64
+    h ^= h >> np.uint64(32)
+    return np.unique(h & _MASK32)
+
+
+class MinHasher:
+    """num_perm universal hashes x → (a·x + b) >> 32 over 64-bit words."""
+
+    def __init__(self, num_perm: int = NEAR_DUP_NUM_PERM, seed: int = _SEED):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingles: np.ndarray) -> Optional[np.ndarray]:
+        if not len(shingles):
+            return None
+        sig = np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint64)
+        a, b = self.a[:, None], self.b[:, None]
+        for start in range(0, len(shingles), _CHUNK):
+            x = shingles[None, start:start + _CHUNK]
+            np.minimum(sig, ((a * x + b) >> np.uint64(32)).min(axis=1), out=sig)
+        return sig.astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures of recently processed transcripts in an LSH table.
+
+    Each signature is split into `bands`; transcripts sharing any band are
+    candidates, and a candidate is a near-duplicate when its estimated
+    Jaccard similarity (share of equal signature slots) reaches `threshold`.
+    A query touches `bands` dict buckets plus a handful of candidates, so it
+    stays well under a millisecond at tens of thousands of transcripts.
+
+    Signatures are appended to a fixed-record file under a cross-process
+    file lock; records written by other processes are picked up on the next
+    query. Entries older than the window are ignored, and dropped when an
+    add finds most of the file expired and compacts it.
+    """
+
+    def __init__(
+        self,
+        path: str = NEAR_DUP_PATH,
+        threshold: float = NEAR_DUP_THRESHOLD,
+        window_days: float = NEAR_DUP_WINDOW_DAYS,
+        num_perm: int = NEAR_DUP_NUM_PERM,
+        bands: int = NEAR_DUP_BANDS,
+        shingle: int = NEAR_DUP_SHINGLE_WORDS,
+    ):
+        if num_perm % bands:
+            raise ValueError(f"NEAR_DUP_NUM_PERM ({num_perm}) must be a multiple of NEAR_DUP_BANDS ({bands})")
+        self.path = path
+        self.threshold = threshold
+        self.window_s = window_days * 86400.0
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self.hasher = MinHasher(num_perm)
+        self.dtype = _record_dtype(num_perm)
+
+        self._lock = threading.Lock()
+        self._clear()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # -----------------------------------------------------
+    #   IN-MEMORY TABLE
+    # -----------------------------------------------------
+    def _clear(self) -> None:
+        self._ids: List[str] = []
+        self._ts = np.empty(1024, dtype=np.float64)
+        self._sigs = np.empty((1024, self.dtype["sig"].shape[0]), dtype=np.uint32)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._inode = None
+        self._offset = _HEADER_LEN
+        self._records = 0  # in the file, expired ones included
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        r = self.rows
+        return [sig[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+
+    def _insert(self, video_id: str, ts: float, sig: np.ndarray) -> None:
+        row = len(self._ids)
+        if row == len(self._ts):
+            self._ts = np.resize(self._ts, 2 * row)
+            self._sigs = np.resize(self._sigs, (2 * row, self._sigs.shape[1]))
+        self._ids.append(video_id)
+        self._ts[row] = ts
+        self._sigs[row] = sig
+        for bucket, key in zip(self._buckets, self._band_keys(sig)):
+            bucket.setdefault(key, []).append(row)
+
+    # -----------------------------------------------------
+    #   STORAGE
+    # -----------------------------------------------------
+    def _refresh(self) -> None:
+        """Index records appended since the last look. Caller holds _lock."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            # Stat the open file, so a compaction that swaps the path under
+            # us cannot pair one file's inode with the other's contents.
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                # First read, or the file was compacted by another process.
+                self._clear()
+                self._inode = st.st_ino
+                if f.read(_HEADER_LEN) != self._header():
+                    log.warning(f"{self.path} was built with other MinHash parameters; ignoring it")
+                    self._offset = -1  # set aside by the next add()
+                    return
+            if self._offset < 0 or st.st_size - self._offset < self.dtype.itemsize:
+                return
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+
+        count = len(data) // self.dtype.itemsize  # ignore a torn trailing record
+        records = np.frombuffer(data, dtype=self.dtype, count=count)
+        cutoff = time.time() - self.window_s
+        for rec in records[records["ts"] >= cutoff]:
+            self._insert(rec["video_id"].decode("ascii"), float(rec["ts"]), rec["sig"])
+        self._records += count
+        self._offset += count * self.dtype.itemsize
+
+    def _header(self) -> bytes:
+        return _header(self.dtype["sig"].shape[0], self.shingle)
+
+    def _rewrite(self, records: np.ndarray) -> None:
+        """Replace the file with `records`. Caller holds _lock and the file lock."""
+        with atomic_output(self.path) as tmp:
+            with open(tmp, "wb") as f:
+                f.write(self._header())
+                f.write(records.tobytes())
+        self._inode = os.stat(self.path).st_ino
+        self._offset = _HEADER_LEN + len(records) * self.dtype.itemsize
+        self._records = len(records)
+
+    def _compact(self, now: float) -> None:
+        """Drop expired signatures from the file. Caller holds _lock and the file lock."""
+        live = [row for row in range(len(self._ids)) if self._ts[row] >= now - self.window_s]
+        records = np.zeros(len(live), dtype=self.dtype)
+        records["video_id"] = [self._ids[row].encode("ascii", "ignore")[:16] for row in live]
+        records["ts"] = self._ts[live]
+        records["sig"] = self._sigs[live]
+        before = self._records
+        self._clear()
+        self._rewrite(records)
+        for rec in records:
+            self._insert(rec["video_id"].decode("ascii"), float(rec["ts"]), rec["sig"])
+        log.info(f"Compacted near-duplicate index: {before} → {len(records)} signatures")
+
+    def _append(self, video_id: str, ts: float, sig: np.ndarray) -> None:
+        """Append one record. Caller holds _lock and the file lock and has refreshed."""
+        rec = np.zeros(1, dtype=self.dtype)
+        rec["video_id"] = video_id.encode("ascii", "ignore")[:16]
+        rec["ts"] = ts
+        rec["sig"] = sig
+        if self._offset < 0:
+            os.replace(self.path, f"{self.path}.old")
+            self._clear()
+        if not os.path.exists(self.path):
+            self._rewrite(rec[:0])
+        with open(self.path, "r+b") as f:
+            # Writers hold the file lock, so anything past our offset is a
+            # torn record from a crashed writer.
+            f.truncate(self._offset)
+            f.seek(self._offset)
+            f.write(rec.tobytes())
+        self._offset += self.dtype.itemsize
+        self._records += 1
+
+    # -----------------------------------------------------
+    #   QUERIES
+    # -----------------------------------------------------
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        return self.hasher.signature(shingle_hashes(text, self.shingle))
+
+    def _query(self, sig: np.ndarray, exclude: str, now: float) -> Optional[Tuple[str, float]]:
+        rows = set()
+        for bucket, key in zip(self._buckets, self._band_keys(sig)):
+            hit = bucket.get(key)
+            if hit:
+                rows.update(hit)
+
+        best = None
+        cutoff = now - self.window_s
+        for row in rows:
+            if self._ids[row] == exclude or self._ts[row] < cutoff:
+                continue
+            sim = float(np.count_nonzero(self._sigs[row] == sig)) / len(sig)
+            if sim >= self.threshold and (best is None or sim > best[1]):
+                best = (self._ids[row], sim)
+        return best
+
+    def find(self, text: str, exclude: str = "") -> Optional[Tuple[str, float]]:
+        """Most similar recent transcript at or above the threshold → (video_id, similarity)."""
+        sig = self.signature(text)
+        if sig is None:
+            return None
+        with self._lock:
+            self._refresh()
+            return self._query(sig, exclude, time.time())
+
+    def check(self, video_id: str, text: str) -> Optional[Tuple[str, float]]:
+        """find() for a candidate at selection time; counts the duplicates it reports."""
+        match = self.find(text, exclude=video_id)
+        if match:
+            inc("leninware_near_duplicates_total")
+        return match
+
+    def add(self, video_id: str, text: str) -> None:
+        """
+        Record text under video_id so later and concurrent runs see it. Called
+        once the run has produced its video, so a failed run never blocks
+        other candidates covering the same story.
+        """
+        sig = self.signature(text)
+        if sig is None:
+            return
+        now = time.time()
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            self._append(video_id, now, sig)
+            self._insert(video_id, now, sig)
+            live = np.count_nonzero(self._ts[:len(self._ids)] >= now - self.window_s)
+            if live < self._records // 2:
+                self._compact(now)
+
+
+class _DisabledIndex:
+    """ENABLE_NEAR_DUP=false: nothing is a duplicate and nothing is stored."""
+
+    def find(self, text: str, exclude: str = "") -> Optional[Tuple[str, float]]:
+        return None
+
+    def check(self, video_id: str, text: str) -> Optional[Tuple[str, float]]:
+        return None
+
+    def add(self, video_id: str, text: str) -> None:
+        pass
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex() if ENABLE_NEAR_DUP else _DisabledIndex()
+        return _index
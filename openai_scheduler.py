@@ -0,0 +1,435 @@
+# openai_scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+
+from config import USE_MOCK_AI, OPENAI_RATE_LIMITS, OPENAI_MAX_RETRIES, require_env
+import deadlines
+import hedging
+from telemetry import inc, observe, current_span
+from token_budget import get_estimator, estimate_cost
+from pipeline_logging import get_logger
+
+# Only import OpenAI when NOT in mock mode
+if not USE_MOCK_AI:
+    from openai import OpenAI, AsyncOpenAI, APIConnectionError
+
+log = get_logger("openai")
+
+# Lower runs first. Stages nearer the finished video outrank new work, so
+# in-flight pipelines complete before fresh ones start spending.
+HIGH = 0     # storyboard, images, TTS
+NORMAL = 1   # commentary, safety filter
+LOW = 2      # transcript summary
+
+_ASYNC_POLL_S = 0.05
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_limits(spec: str) -> Dict[str, tuple]:
+    """Parse "gpt-4o-mini=500/200000,gpt-image-1=5/0" into model → (rpm, tpm); 0 = unlimited."""
+    limits = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        model, _, value = part.partition("=")
+        rpm, _, tpm = value.partition("/")
+        limits[model.strip()] = (float(rpm or 0), float(tpm or 0))
+    return limits
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """OpenAI reset headers look like "1s", "6m0s", "20ms"; Retry-After is plain seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+
+
+def estimate_tokens(request: dict) -> int:
+    """
+    Pre-send token count as OpenAI meters it against TPM: the calibrated
+    prompt estimate (token_budget.py) plus the requested completion budget.
+    """
+    return get_estimator().prompt_tokens(request) + int(request.get("max_tokens") or 0)
+
+
+def request_chars(request: dict) -> int:
+    """Prompt size in characters (for the span's bytes_out)."""
+    return sum(len(m.get("content") or "") for m in request.get("messages") or [])
+
+
+class TokenBucket:
+    """capacity units, refilled continuously over one minute. capacity <= 0 → unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.stamp = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        if self.capacity > 0:
+            self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        if self.capacity <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)  # a single oversized request still gets through
+        return max(amount - self.level, 0.0) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.level -= min(amount, self.capacity)
+
+    def clamp(self, remaining: float) -> None:
+        """Server says only `remaining` is left this window."""
+        if self.capacity > 0:
+            self.level = min(self.level, remaining)
+
+
+class _ModelLimiter:
+    """RPM + TPM buckets for one model with a priority-ordered wait queue."""
+
+    def __init__(self, model: str, rpm: float, tpm: float):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._queue: list = []
+        self._seq = itertools.count()
+
+    def _try_take(self, entry: tuple, tokens: int, deadline: Optional[float]) -> Optional[float]:
+        """
+        Caller holds the lock. Returns 0 once granted, seconds to wait if
+        `entry` is at the head of the queue, or None if others are ahead.
+        Raises DeadlineExceeded (leaving the queue) once `entry` cannot be
+        served before its own deadline, wherever it is in the queue.
+        """
+        now = time.monotonic()
+        if self._queue[0] != entry:
+            if deadline is not None and now >= deadline:
+                self._drop(entry)
+                raise deadlines.DeadlineExceeded(
+                    f"{self.model} rate limit queue wait exceeded the stage deadline"
+                )
+            return None
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(
+            self.paused_until - now,
+            self.requests.wait_for(1),
+            self.tokens.wait_for(tokens),
+        )
+        if wait <= 0:
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            heapq.heappop(self._queue)
+            self._cond.notify_all()
+            return 0.0
+        if deadline is not None and now + wait > deadline:
+            self._drop(entry)
+            raise deadlines.DeadlineExceeded(
+                f"{self.model} rate limit wait {wait:.1f}s exceeds the stage deadline"
+            )
+        return wait
+
+    def _drop(self, entry: tuple) -> None:
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+        self._cond.notify_all()
+
+    def acquire(self, tokens: int, priority: int, deadline: Optional[float] = None) -> float:
+        """
+        Block until this request may be sent; returns seconds waited.
+        Raises DeadlineExceeded instead of waiting past `deadline`.
+        """
+        t0 = time.monotonic()
+        entry = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            while True:
+                wait = self._try_take(entry, tokens, deadline)
+                if wait == 0:
+                    return time.monotonic() - t0
+                if wait is None and deadline is not None:
+                    # Behind others: still wake at our own deadline to give up.
+                    wait = max(deadline - time.monotonic(), 0.001)
+                self._cond.wait(timeout=wait)
+
+    async def aacquire(self, tokens: int, priority: int, deadline: Optional[float] = None) -> float:
+        """acquire() for coroutines: sleeps on the event loop instead of blocking a thread."""
+        t0 = time.monotonic()
+        entry = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take(entry, tokens, deadline)
+                if wait == 0:
+                    return time.monotonic() - t0
+                # Not at the head: poll, since thread-side notify cannot wake a coroutine.
+                await asyncio.sleep(_ASYNC_POLL_S if wait is None else min(wait, 1.0))
+        except asyncio.CancelledError:
+            with self._cond:
+                if entry in self._queue:
+                    self._drop(entry)
+            raise
+
+    def observe_headers(self, headers) -> None:
+        """Sync local buckets with x-ratelimit-* headers from a response."""
+        if headers is None:
+            return
+        now = time.monotonic()
+        with self._cond:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                bucket.refill(now)
+                bucket.clamp(remaining)
+                if remaining <= 0:
+                    reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    if reset:
+                        self.paused_until = max(self.paused_until, now + reset)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+
+class OpenAIScheduler:
+    """Process-wide gate every OpenAI request passes through."""
+
+    def __init__(self, limits: Optional[Dict[str, tuple]] = None, max_retries: int = OPENAI_MAX_RETRIES):
+        self.limits = parse_limits(OPENAI_RATE_LIMITS) if limits is None else limits
+        self.max_retries = max_retries
+        self._limiters: Dict[str, _ModelLimiter] = {}
+        self._lock = threading.Lock()
+
+    def _limiter(self, model: str) -> _ModelLimiter:
+        with self._lock:
+            lim = self._limiters.get(model)
+            if lim is None:
+                rpm, tpm = self.limits.get(model, (0, 0))
+                lim = self._limiters[model] = _ModelLimiter(model, rpm, tpm)
+            return lim
+
+    def call(self, create, *, priority: int = NORMAL, hedge: str = "", **request):
+        """
+        Send one request through `create`, which must be a `with_raw_response`
+        method (e.g. client.chat.completions.with_raw_response.create) so the
+        rate-limit headers are visible. Returns the parsed response.
+        429s pause the model's queue for the advertised reset and are retried.
+        With `hedge` set to a HEDGE_TARGETS key, a slow call may be duplicated;
+        each attempt passes through the rate limiter on its own.
+        """
+        model = request.get("model", "")
+        limiter = self._limiter(model)
+        tokens = estimate_tokens(request)
+        current_span().set("est_tokens", tokens)
+
+        def send():
+            return self._send(limiter, create, request, tokens, priority)
+
+        return hedging.hedged(hedge, send) if hedge else send()
+
+    async def acall(self, create, *, priority: int = NORMAL, hedge: str = "", **request):
+        """call() for AsyncOpenAI `with_raw_response` methods."""
+        model = request.get("model", "")
+        limiter = self._limiter(model)
+        tokens = estimate_tokens(request)
+        current_span().set("est_tokens", tokens)
+
+        def send():
+            return self._asend(limiter, create, request, tokens, priority)
+
+        return await (hedging.ahedged(hedge, send) if hedge else send())
+
+    def _send(self, limiter: _ModelLimiter, create, request: dict, tokens: int, priority: int):
+        attempt = 0
+        while True:
+            waited = limiter.acquire(tokens, priority, deadlines.deadline())
+            self._record_wait(limiter.model, waited)
+            t0 = time.monotonic()
+            try:
+                raw = create(**_with_deadline(request))
+            except Exception as e:
+                delay = self._on_error(limiter, e, attempt)
+                attempt += 1
+                if delay:
+                    time.sleep(delay)
+                continue
+            limiter.observe_headers(getattr(raw, "headers", None))
+            parsed = raw.parse()
+            _account(limiter.model, request, parsed, time.monotonic() - t0)
+            return parsed
+
+    async def _asend(self, limiter: _ModelLimiter, create, request: dict, tokens: int, priority: int):
+        attempt = 0
+        while True:
+            waited = await limiter.aacquire(tokens, priority, deadlines.deadline())
+            self._record_wait(limiter.model, waited)
+            t0 = time.monotonic()
+            try:
+                raw = await create(**_with_deadline(request))
+            except Exception as e:
+                delay = self._on_error(limiter, e, attempt)
+                attempt += 1
+                if delay:
+                    await asyncio.sleep(delay)
+                continue
+            limiter.observe_headers(getattr(raw, "headers", None))
+            parsed = raw.parse()
+            _account(limiter.model, request, parsed, time.monotonic() - t0)
+            return parsed
+
+    @staticmethod
+    def _record_wait(model: str, waited: float) -> None:
+        if waited > 0.001:
+            current_span().add("queue_wait_s", round(waited, 3))
+        observe("leninware_openai_queue_wait_seconds", waited, model=model)
+
+    def _on_error(self, limiter: _ModelLimiter, e: Exception, attempt: int) -> float:
+        """
+        Re-raise anything not retryable. A 429 pauses the model's queue
+        (returns 0); a 5xx or connection error returns a jittered backoff to
+        sleep before the retry. The SDK's own retries are off (get_client()),
+        so every attempt is counted against the buckets.
+        """
+        status = getattr(e, "status_code", None)
+        transient = (status is not None and status >= 500) or isinstance(e, APIConnectionError)
+        if attempt >= self.max_retries or not (status == 429 or transient):
+            raise e
+        if transient:
+            delay = random.uniform(0.5, 2.0) * (2 ** attempt)
+            left = deadlines.remaining()
+            if left is not None and delay >= left:
+                raise e
+            log.warning(f"{limiter.model} {status or type(e).__name__}; retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            current_span().add("retries")
+            return delay
+        headers = getattr(getattr(e, "response", None), "headers", None) or {}
+        delay = (
+            _parse_duration(headers.get("retry-after"))
+            or _parse_duration(headers.get("x-ratelimit-reset-requests"))
+            or _parse_duration(headers.get("x-ratelimit-reset-tokens"))
+            or random.uniform(0.5, 2.0) * (2 ** attempt)
+        )
+        inc("leninware_openai_throttled_total", model=limiter.model)
+        log.warning(f"{limiter.model} rate limited (429); pausing queue {delay:.2f}s")
+        limiter.pause(delay)
+        current_span().add("retries")
+        return 0.0
+
+
+def _account(model: str, request: dict, response, elapsed: float) -> None:
+    """Calibrate the token estimator from response.usage and count the actual cost."""
+    usage = getattr(response, "usage", None)
+    if usage is None or not getattr(usage, "prompt_tokens", None):
+        return
+    get_estimator().observe(model, request, usage, elapsed)
+    cost = estimate_cost(model, usage.prompt_tokens, getattr(usage, "completion_tokens", 0) or 0)
+    if cost:
+        current_span().set("cost_usd", round(cost, 6))
+        inc("leninware_openai_cost_usd_total", cost, model=model)
+
+
+def account_stream(model: str, request: dict, last_chunk, elapsed: float) -> None:
+    """
+    Accounting for a streamed completion (stream_options include_usage),
+    whose usage only arrives with the last chunk, after call() has returned.
+    """
+    _account(model, request, last_chunk, elapsed)
+
+
+def _with_deadline(request: dict) -> dict:
+    """The SDK's own timeout is bounded by what is left of the stage."""
+    left = deadlines.remaining()
+    return dict(request, timeout=max(left, 0.001)) if left is not None else request
+
+
+# ---------------------------------------------------------
+#   CLIENTS
+# ---------------------------------------------------------
+# Every scheduler-routed client is built with max_retries=0: SDK-internal
+# retries would resend 429s on their own backoff, outside the buckets, and
+# _on_error would only see the error after the SDK gave up.
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide OpenAI client (thread-safe; one keep-alive pool)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(api_key=require_env("OPENAI_API_KEY"), max_retries=0)
+        return _client
+
+
+# One AsyncOpenAI per event loop, like async_http's AsyncClient: its httpx
+# pool is bound to the loop, and concurrent runs share its connections.
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Shared AsyncOpenAI client for the running loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed():
+        client = AsyncOpenAI(api_key=require_env("OPENAI_API_KEY"), max_retries=0)
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose() -> None:
+    """Close the running loop's client (call before the loop shuts down)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+_scheduler: Optional[OpenAIScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> OpenAIScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = OpenAIScheduler()
+        return _scheduler
+
+
+def call(create, *, priority: int = NORMAL, hedge: str = "", **request):
+    """Shortcut for get_scheduler().call(...)."""
+    return get_scheduler().call(create, priority=priority, hedge=hedge, **request)
+
+
+async def acall(create, *, priority: int = NORMAL, hedge: str = "", **request):
+    """Shortcut for get_scheduler().acall(...)."""
+    return await get_scheduler().acall(create, priority=priority, hedge=hedge, **request)
@@ -0,0 +1,138 @@
+# pipeline_logging.py
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import telemetry
+from config import LOG_LEVEL, LOG_FORMAT
+
+ROOT_LOGGER = "leninware"
+
+_video_id: ContextVar[str] = ContextVar("leninware_video_id", default="")
+
+_setup_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+
+
+# ---------------------------------------------------------
+#   CORRELATION IDS
+# ---------------------------------------------------------
+def set_video_id(video_id: str) -> None:
+    """Tag subsequent log lines in this context with a source video id."""
+    _video_id.set(video_id or "")
+
+
+@contextmanager
+def video_context(video_id: str):
+    """Tag every log line emitted inside this block with a source video id."""
+    token = _video_id.set(video_id or "")
+    try:
+        yield
+    finally:
+        _video_id.reset(token)
+
+
+class _CorrelationFilter(logging.Filter):
+    """
+    Stamp run/video ids onto the record in the *calling* thread, before the
+    record crosses the queue and loses its context.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.run_id = telemetry.current_run_id()
+        record.video_id = _video_id.get()
+        record.tag = record.name[len(ROOT_LOGGER) + 1:] or ROOT_LOGGER
+        return True
+
+
+# ---------------------------------------------------------
+#   FORMATTERS
+# ---------------------------------------------------------
+class _TextFormatter(logging.Formatter):
+    """Keeps the familiar `[stage] message` look, prefixed with ids when set."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        ids = "/".join(i for i in (record.run_id, record.video_id) if i)
+        prefix = f"{ids} " if ids else ""
+        level = "" if record.levelno == logging.INFO else f"{record.levelname} "
+        line = f"{prefix}{level}[{record.tag}] {record.getMessage()}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "stage": record.tag,
+            "run_id": record.run_id or None,
+            "video_id": record.video_id or None,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            doc.update(fields)
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+
+# ---------------------------------------------------------
+#   SETUP
+# ---------------------------------------------------------
+def _setup() -> None:
+    """Route the `leninware` logger tree through a queue drained by one thread."""
+    global _listener, _queue_handler
+
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(_JsonFormatter() if LOG_FORMAT == "json" else _TextFormatter())
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _queue_handler = logging.handlers.QueueHandler(log_queue)
+        _queue_handler.addFilter(_CorrelationFilter())
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.addHandler(_queue_handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream)
+        _listener.start()
+        atexit.register(shutdown)
+
+
+def shutdown() -> None:
+    """
+    Drain pending records and stop the writer thread. Anything logged
+    afterwards (e.g. from later atexit hooks) is written synchronously.
+    """
+    with _setup_lock:
+        if _listener is None or _listener._thread is None:
+            return
+        _listener.stop()
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.removeHandler(_queue_handler)
+        for handler in _listener.handlers:
+            handler.addFilter(_CorrelationFilter())
+            root.addHandler(handler)
+
+
+def get_logger(tag: str) -> logging.Logger:
+    """Return the logger for a pipeline stage, e.g. get_logger("ingest")."""
+    _setup()
+    return logging.getLogger(f"{ROOT_LOGGER}.{tag}")
@@ -0,0 +1,161 @@
+# profiling.py
+
+import cProfile
+import functools
+import io
+import itertools
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+import telemetry
+from config import PROFILE_STAGES, PROFILE_DIR
+from pipeline_logging import get_logger
+
+log = get_logger("profile")
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+TRACEBACK_DEPTH = 8
+
+_ENABLED = {s.strip() for s in PROFILE_STAGES.split(",") if s.strip()}
+
+# cProfile cannot nest on one thread; inner stages only get memory stats.
+_cpu_active: ContextVar[bool] = ContextVar("leninware_cpu_profile", default=False)
+
+_counter_lock = threading.Lock()
+_counters: dict = {}
+
+# tracemalloc is process-wide: the first profiled stage to enter starts it
+# and the last to leave stops it, so overlapping stages (threads, async
+# runs) never lose tracing between their two snapshots.
+_trace_lock = threading.Lock()
+_trace_users = 0
+_trace_started = False
+
+
+def is_profiled(name: str) -> bool:
+    """True if PROFILE_STAGES selects this stage ("all" selects every stage)."""
+    return "all" in _ENABLED or name in _ENABLED
+
+
+def profile_stage(name: str):
+    """
+    Context manager that profiles CPU and memory for one stage.
+    Returns a no-op context when the stage is not selected.
+    """
+    if not _ENABLED or not is_profiled(name):
+        return nullcontext()
+    return _profile(name)
+
+
+def profiled(fn, name: str):
+    """Wrap fn with profile_stage(name) only if that stage is selected."""
+    if not _ENABLED or not is_profiled(name):
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _profile(name):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def _next_path_stem(name: str) -> str:
+    run_dir = os.path.join(PROFILE_DIR, telemetry.current_run_id() or "no-run")
+    os.makedirs(run_dir, exist_ok=True)
+    with _counter_lock:
+        n = _counters.get(name, 0) + 1
+        _counters[name] = n
+    return os.path.join(run_dir, f"{name}.{n}")
+
+
+def _start_tracing() -> None:
+    global _trace_users, _trace_started
+    with _trace_lock:
+        if _trace_users == 0:
+            # Tracing started outside this module (PYTHONTRACEMALLOC) is left running.
+            _trace_started = not tracemalloc.is_tracing()
+            if _trace_started:
+                tracemalloc.start(TRACEBACK_DEPTH)
+            tracemalloc.reset_peak()
+        _trace_users += 1
+
+
+def _stop_tracing() -> None:
+    global _trace_users
+    with _trace_lock:
+        _trace_users -= 1
+        if _trace_users == 0 and _trace_started:
+            tracemalloc.stop()
+
+
+def _snapshot(name: str):
+    """A tracemalloc snapshot, or None; profiling never fails the stage."""
+    try:
+        return tracemalloc.take_snapshot()
+    except Exception as e:
+        log.warning(f"memory snapshot for {name} failed: {e}")
+        return None
+
+
+@contextmanager
+def _profile(name: str):
+    _start_tracing()
+    before = _snapshot(name)
+
+    prof = None
+    token = None
+    if not _cpu_active.get():
+        prof = cProfile.Profile()
+        token = _cpu_active.set(True)
+        prof.enable()
+
+    try:
+        yield
+    finally:
+        if prof is not None:
+            prof.disable()
+            _cpu_active.reset(token)
+
+        after = _snapshot(name) if before is not None else None
+        _, peak = tracemalloc.get_traced_memory()
+        _stop_tracing()
+
+        try:
+            _write_reports(name, prof, before, after, peak)
+        except Exception as e:
+            log.error(f"writing profile for {name}: {e}")
+
+
+def _write_reports(name, prof, before, after, peak: int) -> None:
+    stem = _next_path_stem(name)
+
+    if prof is not None:
+        prof.dump_stats(f"{stem}.prof")
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        with open(f"{stem}.cpu.txt", "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+
+    diff = []
+    if before is not None and after is not None:
+        ignore = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+        diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+
+    with open(f"{stem}.alloc.txt", "w", encoding="utf-8") as f:
+        f.write(f"stage: {name}\n")
+        # Peak and deltas are process-wide: overlapping stages are counted too.
+        f.write(f"peak traced memory: {peak / 1024:.1f} KiB\n\n")
+        f.write(f"top {TOP_ALLOCATIONS} allocation deltas by line:\n")
+        for stat in itertools.islice(diff, TOP_ALLOCATIONS):
+            f.write(f"{stat}\n")
+
+    log.info(f"Profile for {name} written → {stem}.* (peak {peak / 1024:.1f} KiB)")
@@ -1,132 +1,425 @@
 # run_pipeline.py
 
-from yt_reaction_pipeline.youtube_ingest import get_recent_candidates
-from yt_reaction_pipeline.youtube_virality_worker import run_virality_pass
-from yt_reaction_pipeline.transcript_fetcher import fetch_transcript
+import asyncio
+import sys
+from typing import Optional
 
-from yt_reaction_pipeline.summary_engine import summarize_transcript
-from yt_reaction_pipeline.commentary_engine import generate_commentary
-from yt_reaction_pipeline.script_safety_filter import apply_script_safety_filter
+from youtube_ingest import get_recent_candidates
+from youtube_virality_worker import run_virality_pass
+from transcript_fetcher import fetch_transcript, fetch_transcript_async
 
-from yt_reaction_pipeline.storyboard_engine import generate_storyboard_prompts
-from yt_reaction_pipeline.prompt_filter import apply_safe_substitutions
-from yt_reaction_pipeline.image_engine import generate_images_from_prompts
+from transcript_normalizer import normalize_transcript
+from transcript_summary_filter import summarize_transcript, summarize_transcript_async
+from leninware_commentary import generate_leninware_commentary, generate_leninware_commentary_async
+from script_safety_filter import apply_script_safety_filter, apply_script_safety_filter_async
 
-from yt_reaction_pipeline.audio_engine import generate_tts_audio
-from yt_reaction_pipeline.video_renderer import render_reaction_video
+from storyboard_prompt_generator import generate_storyboard_prompts, generate_storyboard_prompts_async
+from safe_storyboard import generate_safe_script_and_storyboard, generate_safe_script_and_storyboard_async
+from safe_image_prompt_filter import apply_safe_substitutions
+from image_generator import generate_images_from_prompts, generate_images_from_prompts_async
+from storyboard_stream import stream_storyboard_images, stream_storyboard_images_async
 
-from yt_reaction_pipeline.youtube_uploader import upload_video
-from config import USE_MOCK_AI, ENABLE_YOUTUBE_UPLOAD
+from audio_generator import generate_tts_audio, generate_tts_audio_async
+from voiceover_stream import stream_commentary_to_audio, stream_commentary_to_audio_async
+from leninware_video_pipeline import create_leninware_video, create_leninware_video_async
 
+from youtube_uploader import upload_video
+import async_http
+import openai_scheduler
+from config import (
+    USE_MOCK_AI,
+    ENABLE_YOUTUBE_UPLOAD,
+    FUSED_SAFETY_STORYBOARD,
+    STREAM_COMMENTARY_TTS,
+    STREAM_STORYBOARD,
+)
+from telemetry import start_run, flush
+from deadlines import start_run_deadline
+from workspace import Workspace, job_workspace
+from video_ledger import get_ledger, DUPLICATE, FAILED, REJECTED, RELEASED, RENDERED, UPLOADED
+from near_duplicates import get_index
+from transcript_quality import check_transcript
+from text_analysis import analyze
+from youtube_quota import get_budget, METHOD_COSTS, HIGH
+from pipeline_logging import get_logger, set_video_id
+
+log = get_logger("pipeline")
 
-def main():
-    print("\n===== YouTube Reaction Pipeline Starting =====\n")
 
+def _rank_candidates():
+    """Steps 1-2 (ingest + virality); None when there is nothing to work on."""
     # 1. INGEST VIDEO CANDIDATES
-    print("[pipeline] (1) Fetching recent candidates...")
+    log.info("(1) Fetching recent candidates...")
     candidates = get_recent_candidates(max_results=5)
     if not candidates:
-        print("[pipeline] No recent long-form videos found.")
-        return
+        log.info("No recent long-form videos found.")
+        return None
+
+    # Already-processed sources are dropped before anything is spent on them.
+    candidates = get_ledger().filter_new(candidates)
+    if not candidates:
+        log.info("All recent videos have already been processed.")
+        return None
 
     # 2. VIRALITY RANKING
-    print("[pipeline] (2) Running virality pass...")
+    log.info("(2) Running virality pass...")
     viral_list = run_virality_pass(candidates)
     if not viral_list:
-        print("[pipeline] No videos with usable stats.")
-        return
+        log.info("No videos with usable stats.")
+        return None
 
-    print("\n[pipeline] Virality ranking:")
+    log.info("Virality ranking:")
     for v in viral_list:
-        print(f"  {v['title']} — score={v['virality']}")
+        log.info(f"  {v['title']} — score={v['virality']}")
+    return viral_list
+
+
+def _check_upload_quota(selected: dict) -> None:
+    if ENABLE_YOUTUBE_UPLOAD and not USE_MOCK_AI:
+        left = get_budget().remaining(HIGH)
+        if left < METHOD_COSTS["videos.insert"]:
+            log.warning(f"Only {left} YouTube quota units left today — the upload step will be refused")
+
+    log.info(f"Selected video:\n    Title: {selected['title']}\n    URL: {selected['url']}")
+
+
+def _upload(selected: dict, video_path: str) -> Optional[str]:
+    # 12. UPLOAD
+    if USE_MOCK_AI:
+        log.info("(12) MOCK MODE — upload disabled automatically.")
+    elif not ENABLE_YOUTUBE_UPLOAD:
+        log.info("(12) Upload disabled — skipping YouTube upload.")
+    else:
+        log.info("(12) Uploading to YouTube...")
+        return upload_video(
+            video_path,
+            title=f"Reaction: {selected['title']}",
+            description=(
+                f"Automated reaction to: {selected['title']}\n"
+                f"Original video: {selected['url']}\n"
+            )
+        )
+    return None
+
+
+def _usable_transcript(v: dict, transcript: str, analysis: dict, raw: str) -> bool:
+    """
+    Local checks on a normalized transcript before anything is spent on it:
+    the quality gate (music-only, caption loops, wrong language ...) and the
+    near-duplicate index (same story as a recently used transcript). `raw`
+    is the fetched text, for counting the non-speech tags normalization drops.
+    """
+    report = check_transcript(transcript, v.get("duration_s"), analysis, raw=raw)
+    if report:
+        reasons = "; ".join(report["reasons"])
+        log.info(f"(3) Rejecting {v['title']}: {reasons}")
+        get_ledger().mark(v["video_id"], REJECTED, error=reasons)
+        return False
+
+    match = get_index().check(v["video_id"], transcript)
+    if match:
+        other, similarity = match
+        log.info(f"(3) Skipping {v['title']}: transcript {similarity:.0%} similar to {other}")
+        get_ledger().mark(v["video_id"], DUPLICATE, duplicate_of=other)
+        return False
+    return True
+
+
+def _record_outcome(run_id: str, video_id: str, upload_id: Optional[str], transcript: str) -> None:
+    get_ledger().mark(video_id, UPLOADED if upload_id else RENDERED, run_id=run_id, upload_id=upload_id)
+    # Only a finished video makes its story a duplicate for later candidates.
+    get_index().add(video_id, transcript)
+
+
+def _record_failure(video_id: str, e: BaseException) -> None:
+    get_ledger().mark(video_id, FAILED, error=f"{type(e).__name__}: {e}"[:300])
+
+
+def main():
+    run_id = start_run()
+    start_run_deadline()
+    # Every file this run writes lives in its own workspace (output/jobs/<run_id>/).
+    with job_workspace(run_id) as ws:
+        return _run(run_id, ws)
+
+
+def _run(run_id: str, ws: Workspace):
+    log.info("===== YouTube Reaction Pipeline Starting =====")
+    log.info(f"Run ID: {run_id}")
+    log.info(f"Workspace: {ws.dir}")
+
+    viral_list = _rank_candidates()
+    if not viral_list:
+        return
 
     # 3. TRANSCRIPT SELECTION
     selected = None
     transcript_text = None
+    transcript_info = None
 
     for v in viral_list:
-        print(f"\n[pipeline] (3) Checking transcript availability for: {v['title']}")
-        tr = fetch_transcript(v["video_id"])
-        if tr:
-            transcript_text = tr
+        set_video_id(v["video_id"])
+        if not get_ledger().claim(v, run_id):
+            continue
+        log.info(f"(3) Checking transcript availability for: {v['title']}")
+        raw = fetch_transcript(v["video_id"])
+        if not raw:
+            get_ledger().mark(v["video_id"], RELEASED)
+            continue
+        # Caption overlaps, [Music] tags and filler are dropped locally first:
+        # rolling captions would inflate the word rate the quality gate sees,
+        # and the summarizer's character budget then holds more actual speech.
+        tr = normalize_transcript(raw)
+        # Language, length and token estimate, computed once and passed along.
+        info = analyze(tr)
+        if _usable_transcript(v, tr, info, raw):
+            transcript_text, transcript_info = tr, info
             selected = v
             break
 
     if not selected:
-        print("[pipeline] No videos with available transcripts.")
+        set_video_id("")
+        log.info("No videos with available transcripts.")
         return
 
-    print(f"\n[pipeline] Selected video:\n    Title: {selected['title']}\n    URL: {selected['url']}\n")
+    _check_upload_quota(selected)
+
+    try:
+        video_path, upload_id = _produce(ws, selected, transcript_text, transcript_info)
+    except BaseException as e:
+        _record_failure(selected["video_id"], e)
+        raise
+    _record_outcome(run_id, selected["video_id"], upload_id, transcript_text)
+
+    flush()
+    log.info("===== YouTube Reaction Pipeline Complete =====")
+    return video_path
 
-    # 4. TRANSCRIPT SUMMARY
-    print("[pipeline] (4) Summarizing transcript...")
+
+def _produce(ws: Workspace, selected: dict, transcript_text: str, transcript_info: dict):
+    """Steps 4-12 for the claimed video → (video_path, upload id or None)."""
+    # 4. TRANSCRIPT SUMMARY (transcript_text is already normalized)
+    log.info("(4) Summarizing transcript...")
     summary_text = summarize_transcript(
         transcript_text,
-        channel_name=selected.get("channel_title", ""),
-        author_name=selected.get("channel_title", ""),  # YouTube channel owner = author
-        video_title=selected["title"]
+        channel_name=selected.get("channel", ""),
+        author_name=selected.get("channel", ""),  # YouTube channel owner = author
+        video_title=selected["title"],
+        analysis=transcript_info,
     )
 
-    # 5. GENERATE COMMENTARY
-    print("[pipeline] (5) Generating commentary from summary...")
-    raw_commentary = generate_commentary(
-        summary=summary_text,
-        channel_name=selected.get("channel_title", ""),
-        author_name=selected.get("channel_title", ""),
-        video_title=selected["title"]
-    )
+    if STREAM_COMMENTARY_TTS:
+        # 5 + 6 + 10 overlapped: the commentary is streamed sentence by
+        # sentence through the safety filter into TTS
+        if FUSED_SAFETY_STORYBOARD:
+            log.warning("FUSED_SAFETY_STORYBOARD is ignored with STREAM_COMMENTARY_TTS=true.")
+        log.info("(5-6) Streaming commentary through the safety filter into TTS...")
+        safe_script, audio_path = stream_commentary_to_audio(summary_text, ws.audio_path)
+        storyboard = None
+    else:
+        # 5. GENERATE COMMENTARY
+        log.info("(5) Generating commentary from summary...")
+        raw_commentary = generate_leninware_commentary(summary_text)
 
-    # 6. SAFETY FILTER
-    print("[pipeline] (6) Applying script safety filter...")
-    safe_script = apply_script_safety_filter(raw_commentary)
+        if FUSED_SAFETY_STORYBOARD:
+            # 6 + 7 in one structured call
+            log.info("(6-7) Applying script safety filter and generating storyboard prompts...")
+            safe_script, storyboard = generate_safe_script_and_storyboard(
+                raw_commentary, analysis=analyze(raw_commentary)
+            )
+        else:
+            # 6. SAFETY FILTER
+            log.info("(6) Applying script safety filter...")
+            safe_script = apply_script_safety_filter(raw_commentary, analysis=analyze(raw_commentary))
+            storyboard = None
 
-    # 7. STORYBOARD
-    print("[pipeline] (7) Generating storyboard prompts...")
-    storyboard = generate_storyboard_prompts(safe_script)
+    if storyboard is None and STREAM_STORYBOARD:
+        # 7 + 8 + 9 overlapped: each prompt is filtered and drawn as soon
+        # as its line of the storyboard is written
+        log.info("(7-9) Streaming storyboard prompts into image generation...")
+        safe_prompts, image_paths = stream_storyboard_images(safe_script, output_dir=ws.images_dir)
+    else:
+        if storyboard is None:
+            # 7. STORYBOARD
+            log.info("(7) Generating storyboard prompts...")
+            storyboard = generate_storyboard_prompts(safe_script)
 
-    # 8. IMAGE PROMPT FILTERING
-    print("[pipeline] (8) Applying substitution safety filter...")
-    safe_prompts = apply_safe_substitutions(storyboard)
+        # 8. IMAGE PROMPT FILTERING
+        log.info("(8) Applying substitution safety filter...")
+        safe_prompts = apply_safe_substitutions(storyboard)
 
-    # 9. IMAGE GENERATION
-    print("[pipeline] (9) Generating images from prompts...")
-    image_paths = generate_images_from_prompts(safe_prompts)
+        # 9. IMAGE GENERATION
+        log.info("(9) Generating images from prompts...")
+        image_paths = generate_images_from_prompts(safe_prompts, output_dir=ws.images_dir)
 
-    # 10. TTS AUDIO
-    print("[pipeline] (10) Generating TTS audio...")
-    audio_path = generate_tts_audio(
-        text=safe_script,
-        output_path="output/audio.wav"
-    )
+    # 10. TTS AUDIO (already done when streaming)
+    if not STREAM_COMMENTARY_TTS:
+        log.info("(10) Generating TTS audio...")
+        audio_path = generate_tts_audio(
+            text=safe_script,
+            output_path=ws.audio_path
+        )
 
     # 11. VIDEO RENDERING
-    print("[pipeline] (11) Rendering final reaction video...")
-    video_path = render_reaction_video(
+    log.info("(11) Rendering final reaction video...")
+    video_path = create_leninware_video(
         script_text=safe_script,
         image_paths=image_paths,
-        audio_path=audio_path
+        audio_path=audio_path,
+        workdir=ws.video_dir
     )
 
-    print(f"[pipeline] Render complete: {video_path}")
+    log.info(f"Render complete: {video_path}")
 
-    # 12. UPLOAD
-    if USE_MOCK_AI:
-        print("[pipeline] (12) MOCK MODE — upload disabled automatically.")
-    elif not ENABLE_YOUTUBE_UPLOAD:
-        print("[pipeline] (12) Upload disabled — skipping YouTube upload.")
+    upload_id = _upload(selected, video_path)
+    return video_path, upload_id
+
+
+async def run_async():
+    """
+    main() on the running event loop. The OpenAI, transcript and Shotstack
+    stages are coroutines, so many runs can share one loop (each task gets
+    its own run id, deadline and spans through contextvars). The YouTube
+    Data API client is synchronous and runs in worker threads.
+    """
+    run_id = start_run()
+    start_run_deadline()
+    with job_workspace(run_id) as ws:
+        return await _run_async(run_id, ws)
+
+
+async def _run_async(run_id: str, ws: Workspace):
+    log.info("===== YouTube Reaction Pipeline Starting (async) =====")
+    log.info(f"Run ID: {run_id}")
+    log.info(f"Workspace: {ws.dir}")
+
+    viral_list = await asyncio.to_thread(_rank_candidates)
+    if not viral_list:
+        return
+
+    # 3. TRANSCRIPT SELECTION
+    selected = None
+    transcript_text = None
+    transcript_info = None
+
+    for v in viral_list:
+        set_video_id(v["video_id"])
+        if not get_ledger().claim(v, run_id):
+            continue
+        log.info(f"(3) Checking transcript availability for: {v['title']}")
+        raw = await fetch_transcript_async(v["video_id"])
+        if not raw:
+            get_ledger().mark(v["video_id"], RELEASED)
+            continue
+        # Caption overlaps, [Music] tags and filler are dropped locally first:
+        # rolling captions would inflate the word rate the quality gate sees,
+        # and the summarizer's character budget then holds more actual speech.
+        tr = normalize_transcript(raw)
+        # Language, length and token estimate, computed once and passed along.
+        info = analyze(tr)
+        if _usable_transcript(v, tr, info, raw):
+            transcript_text, transcript_info = tr, info
+            selected = v
+            break
+
+    if not selected:
+        set_video_id("")
+        log.info("No videos with available transcripts.")
+        return
+
+    _check_upload_quota(selected)
+
+    try:
+        video_path, upload_id = await _produce_async(ws, selected, transcript_text, transcript_info)
+    except BaseException as e:
+        _record_failure(selected["video_id"], e)
+        raise
+    _record_outcome(run_id, selected["video_id"], upload_id, transcript_text)
+
+    flush()
+    log.info("===== YouTube Reaction Pipeline Complete =====")
+    return video_path
+
+
+async def _produce_async(ws: Workspace, selected: dict, transcript_text: str, transcript_info: dict):
+    log.info("(4) Summarizing transcript...")
+    summary_text = await summarize_transcript_async(
+        transcript_text,
+        channel_name=selected.get("channel", ""),
+        author_name=selected.get("channel", ""),
+        video_title=selected["title"],
+        analysis=transcript_info,
+    )
+
+    if STREAM_COMMENTARY_TTS:
+        if FUSED_SAFETY_STORYBOARD:
+            log.warning("FUSED_SAFETY_STORYBOARD is ignored with STREAM_COMMENTARY_TTS=true.")
+        log.info("(5-6) Streaming commentary through the safety filter into TTS...")
+        safe_script, audio_path = await stream_commentary_to_audio_async(summary_text, ws.audio_path)
+        storyboard = None
     else:
-        print("[pipeline] (12) Uploading to YouTube...")
-        upload_video(
-            video_path,
-            title=f"Reaction: {selected['title']}",
-            description=(
-                f"Automated reaction to: {selected['title']}\n"
-                f"Original video: {selected['url']}\n"
+        log.info("(5) Generating commentary from summary...")
+        raw_commentary = await generate_leninware_commentary_async(summary_text)
+
+        if FUSED_SAFETY_STORYBOARD:
+            log.info("(6-7) Applying script safety filter and generating storyboard prompts...")
+            safe_script, storyboard = await generate_safe_script_and_storyboard_async(
+                raw_commentary, analysis=analyze(raw_commentary)
             )
+        else:
+            log.info("(6) Applying script safety filter...")
+            safe_script = await apply_script_safety_filter_async(raw_commentary, analysis=analyze(raw_commentary))
+            storyboard = None
+
+    if storyboard is None and STREAM_STORYBOARD:
+        log.info("(7-9) Streaming storyboard prompts into image generation...")
+        safe_prompts, image_paths = await stream_storyboard_images_async(safe_script, output_dir=ws.images_dir)
+    else:
+        if storyboard is None:
+            log.info("(7) Generating storyboard prompts...")
+            storyboard = await generate_storyboard_prompts_async(safe_script)
+
+        log.info("(8) Applying substitution safety filter...")
+        safe_prompts = apply_safe_substitutions(storyboard)
+
+        log.info("(9) Generating images from prompts...")
+        image_paths = await generate_images_from_prompts_async(safe_prompts, output_dir=ws.images_dir)
+
+    if not STREAM_COMMENTARY_TTS:
+        log.info("(10) Generating TTS audio...")
+        audio_path = await generate_tts_audio_async(
+            text=safe_script,
+            output_path=ws.audio_path
         )
 
-    print("\n===== YouTube Reaction Pipeline Complete =====\n")
+    log.info("(11) Rendering final reaction video...")
+    video_path = await create_leninware_video_async(
+        script_text=safe_script,
+        image_paths=image_paths,
+        audio_path=audio_path,
+        workdir=ws.video_dir
+    )
+
+    log.info(f"Render complete: {video_path}")
+
+    upload_id = await asyncio.to_thread(_upload, selected, video_path)
+    return video_path, upload_id
+
+
+def main_async():
+    """Run one pipeline through the async stages."""
+    async def run():
+        try:
+            return await run_async()
+        finally:
+            await async_http.aclose()
+            await openai_scheduler.aclose()
+
+    return asyncio.run(run())
 
 
 if __name__ == "__main__":
-    main()
+    if "--async" in sys.argv[1:]:
+        main_async()
+    else:
+        main()
@@ -3,19 +3,24 @@
 from pathlib import Path
 from typing import List
 
+from telemetry import traced
+from pipeline_logging import get_logger
+
+log = get_logger("prompt_filter")
+
 RULES_PATH = Path("prompts/safe_substitution_rules.txt")
 
 
-def _load_rules() -> List[tuple[str, str]]:
+def load_rules() -> List[tuple[str, str]]:
     """Load substitution rules from file, with debug logging."""
     if not RULES_PATH.exists():
-        print(f"[prompt_filter] WARNING: Rules file missing → {RULES_PATH}")
+        log.warning(f"Rules file missing → {RULES_PATH}")
         return []
 
     lines = RULES_PATH.read_text().splitlines()
     rules = []
 
-    print(f"[prompt_filter] Loading rules from: {RULES_PATH}")
+    log.info(f"Loading rules from: {RULES_PATH}")
 
     for raw in lines:
         line = raw.strip()
@@ -23,51 +28,55 @@ def _load_rules() -> List[tuple[str, str]]:
             continue
 
         if "=>" not in line:
-            print(f"[prompt_filter] Skipping malformed rule: {raw}")
+            log.debug(f"Skipping malformed rule: {raw}")
             continue
 
         before, after = line.split("=>", 1)
         before, after = before.strip(), after.strip()
 
         rules.append((before, after))
-        print(f"[prompt_filter]   rule: '{before}' → '{after}'")
+        log.debug(f"  rule: '{before}' → '{after}'")
 
     if not rules:
-        print("[prompt_filter] No valid rules found.")
+        log.warning("No valid rules found.")
 
     return rules
 
 
+def substitute(prompt: str, rules: List[tuple[str, str]], i: int = 1) -> str:
+    """Apply loaded rules to one prompt (i is only used in the debug log)."""
+    log.debug(f"---- Prompt {i} BEFORE ----\n{prompt}")
+
+    original = prompt
+    for before, after in rules:
+        if before in prompt:
+            log.debug(f"  Substituting '{before}' → '{after}'")
+            prompt = prompt.replace(before, after)
+
+    if prompt != original:
+        log.debug(f"---- Prompt {i} AFTER ----\n{prompt}")
+    else:
+        log.debug(f"Prompt {i}: no substitutions needed.")
+
+    return prompt
+
+
+@traced("stage.prompt_filter")
 def apply_safe_substitutions(prompts: List[str]) -> List[str]:
     """Apply safe substitutions with verbose logging."""
-    rules = _load_rules()
+    rules = load_rules()
 
     if not rules:
-        print("[prompt_filter] No rules applied (none loaded).")
+        log.info("No rules applied (none loaded).")
         return prompts
 
     safe_prompts = []
 
-    print(f"[prompt_filter] Applying {len(rules)} rules to {len(prompts)} prompts...")
+    log.info(f"Applying {len(rules)} rules to {len(prompts)} prompts...")
 
     for i, p in enumerate(prompts, start=1):
-        print(f"\n[prompt_filter] ---- Prompt {i} BEFORE ----")
-        print(p)
-
-        original = p
-        for before, after in rules:
-            if before in p:
-                print(f"[prompt_filter]   Substituting '{before}' → '{after}'")
-                p = p.replace(before, after)
-
-        if p != original:
-            print(f"[prompt_filter] ---- Prompt {i} AFTER ----")
-            print(p)
-        else:
-            print(f"[prompt_filter] Prompt {i}: no substitutions needed.")
-
-        safe_prompts.append(p)
+        safe_prompts.append(substitute(p, rules, i))
 
-    print("\n[prompt_filter] Substitution complete.\n")
+    log.info("Substitution complete.")
 
     return safe_prompts
\ No newline at end of file
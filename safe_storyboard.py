@@ -0,0 +1,275 @@
+# safe_storyboard.py
+
+import json
+from typing import List, Optional, Tuple
+from config import USE_MOCK_AI
+import openai_scheduler
+import token_budget
+from telemetry import span, traced, record_openai_usage, inc
+from script_safety_filter import (
+    apply_script_safety_filter,
+    apply_script_safety_filter_async,
+    prescreen,
+    select_rules,
+)
+from storyboard_prompt_generator import (
+    SYSTEM_PROMPT as STORYBOARD_RULES,
+    generate_storyboard_prompts,
+    generate_storyboard_prompts_async,
+    mock_prompts,
+)
+from pipeline_logging import get_logger
+
+log = get_logger("safe_storyboard")
+
+# Completion tokens per storyboard prompt, on top of the rewritten script.
+PROMPT_TOKENS = 120
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "safe_script_storyboard",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "script": {"type": "string"},
+                "storyboard": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["script", "storyboard"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+def _build_request(raw_script: str, num_images: int, safety_rules: str) -> dict:
+    """One call: the safety rewrite of the script plus its storyboard prompts."""
+    system_prompt = (
+        "You have two jobs for one political commentary video.\n\n"
+        "JOB 1 — SCRIPT SAFETY (field \"script\"):\n"
+        f"{safety_rules.strip()}\n\n"
+        "JOB 2 — STORYBOARD (field \"storyboard\"):\n"
+        f"{STORYBOARD_RULES.strip()}"
+    )
+    user_prompt = (
+        "Return the revised commentary script in \"script\": a single version "
+        "that preserves the political content and style but complies with the "
+        "safety rules.\n"
+        f"Create {num_images} symbolic storyboard image prompts based on the revised "
+        "script and return them in \"storyboard\", one prompt per item, without numbering.\n\n"
+        "<<<BEGIN_SCRIPT>>>\n"
+        f"{raw_script}\n"
+        "<<<END_SCRIPT>>>"
+    )
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        "response_format": RESPONSE_FORMAT,
+        "max_tokens": 2100,
+        "temperature": 0.6,
+    }
+
+
+def _plan_request(raw_script: str, num_images: int, safety_rules: str, analysis: dict) -> dict:
+    """Sized to the "safety" input budget; the output holds the whole script and every prompt."""
+    return token_budget.size_request(
+        "safety",
+        lambda text: _build_request(text, num_images, safety_rules),
+        raw_script,
+        min_output=int(analysis["tokens"] * 1.2) + 64 + num_images * PROMPT_TOKENS,
+    )
+
+
+def _parse(response, raw_script: str, num_images: int) -> Tuple[Optional[str], Optional[List[str]]]:
+    """
+    Validate the structured reply field by field → (script, prompts), with
+    None for a field that is missing or unusable so only that part is redone.
+    """
+    raw = (response.choices[0].message.content or "").strip()
+    try:
+        doc = json.loads(raw)
+    except ValueError as e:
+        log.error(f"Fused reply is not JSON ({e}); {len(raw)} chars.")
+        return None, None
+    if not isinstance(doc, dict):
+        log.error("Fused reply is not a JSON object.")
+        return None, None
+
+    script = doc.get("script")
+    if not isinstance(script, str) or not script.strip():
+        log.warning("Fused reply has no usable \"script\".")
+        script = None
+    elif len(script.strip()) < 0.5 * len(raw_script):
+        # A rewrite this short dropped content rather than softening it.
+        log.warning(f"Fused script is {len(script.strip())} chars for a {len(raw_script)}-char input; discarding it.")
+        script = None
+    else:
+        script = script.strip()
+
+    items = doc.get("storyboard")
+    prompts = None
+    if isinstance(items, list):
+        prompts = [p.strip() for p in items if isinstance(p, str) and p.strip()][:num_images]
+        if len(prompts) < num_images:
+            log.warning(f"Expected {num_images} prompts, got {len(prompts)}")
+        if not prompts:
+            prompts = None
+    else:
+        log.warning("Fused reply has no usable \"storyboard\".")
+
+    return script, prompts
+
+
+def _route(raw_script: str) -> str:
+    """
+    How the script is made safe, from the sentence pre-screen:
+      "clean"     — nothing flagged; storyboard only, script unchanged
+      "selective" — a few sentences flagged (SAFETY_MODE=selective); the
+                    safety filter rewrites just those and the storyboard is
+                    written from its result, since the fused call would
+                    rewrite the whole script
+      "fused"     — one structured call for both
+    """
+    _, flagged = prescreen(raw_script)
+    if flagged == {}:
+        log.info("Pre-screen clean — storyboard only, script unchanged.")
+        inc("leninware_safety_llm_skipped_total")
+        return "clean"
+    if flagged:
+        log.info("Few sentences flagged — selective safety rewrite, then a separate storyboard call.")
+        return "selective"
+    return "fused"
+
+
+@traced("stage.safe_storyboard")
+def generate_safe_script_and_storyboard(
+    raw_script: str,
+    num_images: int = 8,
+    analysis: Optional[dict] = None,
+) -> Tuple[str, List[str]]:
+    """
+    Steps 6 + 7 in one structured chat completion → (safe script, storyboard
+    prompts). A field the reply gets wrong is redone by its own stage
+    (apply_script_safety_filter / generate_storyboard_prompts), and a failed
+    call falls back to running both. When the pre-screen flags only a few
+    sentences (SAFETY_MODE=selective) the two stages run separately, so the
+    selective rewrite is kept.
+    """
+    raw_script = (raw_script or "").strip()
+    log.info(f"Received script length: {len(raw_script)} chars")
+
+    if not raw_script:
+        log.error("Empty script passed in.")
+        return raw_script, []
+
+    # ----------------------------------------------------
+    # MOCK MODE
+    # ----------------------------------------------------
+    if USE_MOCK_AI:
+        return raw_script, mock_prompts(num_images)
+
+    route = _route(raw_script)
+    if route == "clean":
+        return raw_script, generate_storyboard_prompts(raw_script, num_images)
+    if route == "selective":
+        script = apply_script_safety_filter(raw_script, analysis=analysis)
+        return script, generate_storyboard_prompts(script, num_images)
+    safety_rules, analysis = select_rules(raw_script, analysis)
+
+    # ----------------------------------------------------
+    # REAL MODE — ONE STRUCTURED CALL
+    # ----------------------------------------------------
+    log.info("REAL MODE — Safety rewrite + storyboard in one call...")
+    request = _plan_request(raw_script, num_images, safety_rules, analysis)
+
+    script, prompts = None, None
+    try:
+        client = openai_scheduler.get_client()
+        with span("openai.chat", model="gpt-4o-mini",
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            response = openai_scheduler.call(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.HIGH,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, response, "gpt-4o-mini")
+        script, prompts = _parse(response, raw_script, num_images)
+    except Exception as e:
+        log.error(f"calling OpenAI: {e}")
+
+    # ----------------------------------------------------
+    # PER-FIELD FALLBACK
+    # ----------------------------------------------------
+    if script is None:
+        inc("leninware_fused_fallback_total", field="script")
+        log.warning("FALLBACK — Separate safety filter pass.")
+        script = apply_script_safety_filter(raw_script, analysis=analysis)
+    if prompts is None:
+        inc("leninware_fused_fallback_total", field="storyboard")
+        log.warning("FALLBACK — Separate storyboard call.")
+        prompts = generate_storyboard_prompts(script, num_images)
+
+    log.info(f"Finished. Script {len(script)} chars (delta: {len(script) - len(raw_script)}), {len(prompts)} prompts")
+    return script, prompts
+
+
+@traced("stage.safe_storyboard")
+async def generate_safe_script_and_storyboard_async(
+    raw_script: str,
+    num_images: int = 8,
+    analysis: Optional[dict] = None,
+) -> Tuple[str, List[str]]:
+    """Async generate_safe_script_and_storyboard(): same result and fallbacks."""
+    raw_script = (raw_script or "").strip()
+    log.info(f"Received script length: {len(raw_script)} chars")
+
+    if not raw_script:
+        log.error("Empty script passed in.")
+        return raw_script, []
+
+    if USE_MOCK_AI:
+        return raw_script, mock_prompts(num_images)
+
+    route = _route(raw_script)
+    if route == "clean":
+        return raw_script, await generate_storyboard_prompts_async(raw_script, num_images)
+    if route == "selective":
+        script = await apply_script_safety_filter_async(raw_script, analysis=analysis)
+        return script, await generate_storyboard_prompts_async(script, num_images)
+    safety_rules, analysis = select_rules(raw_script, analysis)
+
+    log.info("REAL MODE — Safety rewrite + storyboard in one call...")
+    request = _plan_request(raw_script, num_images, safety_rules, analysis)
+
+    script, prompts = None, None
+    try:
+        client = openai_scheduler.get_async_client()
+        with span("openai.chat", model="gpt-4o-mini",
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            response = await openai_scheduler.acall(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.HIGH,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, response, "gpt-4o-mini")
+        script, prompts = _parse(response, raw_script, num_images)
+    except Exception as e:
+        log.error(f"calling OpenAI: {e}")
+
+    if script is None:
+        inc("leninware_fused_fallback_total", field="script")
+        log.warning("FALLBACK — Separate safety filter pass.")
+        script = await apply_script_safety_filter_async(raw_script, analysis=analysis)
+    if prompts is None:
+        inc("leninware_fused_fallback_total", field="storyboard")
+        log.warning("FALLBACK — Separate storyboard call.")
+        prompts = await generate_storyboard_prompts_async(script, num_images)
+
+    log.info(f"Finished. Script {len(script)} chars (delta: {len(script) - len(raw_script)}), {len(prompts)} prompts")
+    return script, prompts
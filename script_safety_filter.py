@@ -1,17 +1,37 @@
 # script_safety_filter.py
 
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from pathlib import Path
-from config import USE_MOCK_AI, require_env, LENINWARE_LANG_MODE
+from typing import Dict, List, Optional
+from config import (
+    USE_MOCK_AI,
+    LENINWARE_LANG_MODE,
+    SAFETY_MODE,
+    SAFETY_FULL_PASS_RATIO,
+    SAFETY_MAX_CONCURRENCY,
+)
+import openai_scheduler
+import token_budget
+from telemetry import span, traced, record_openai_usage, current_span, inc
+from text_analysis import analyze, resolve_language
+from pipeline_logging import get_logger
 
-# Only import OpenAI when NOT in mock mode
-if not USE_MOCK_AI:
-    from openai import OpenAI
+log = get_logger("safety_filter")
 
 SAFETY_PROMPT_PATH_EN = Path("prompts/script_safety_filter_en.txt")
 SAFETY_PROMPT_PATH_ES = Path("prompts/script_safety_filter_es.txt")
+SAFETY_PATTERNS_PATH = Path("prompts/script_safety_patterns.txt")
 
+# A sentence: up to terminal punctuation (plus closing quotes/brackets)
+# followed by a space, or a line break, with its trailing whitespace, so the
+# pieces join back exactly. "a@b.com" or "3.5" does not end a sentence.
+_SENTENCE_RE = re.compile(r".*?(?:[.!?…]+[\"'”’)\]]*(?=\s|$)|\n|$)\s*")
 
-def _load_safety_prompt(lang: str) -> str:
+
+def load_safety_prompt(lang: str) -> str:
     """Load language-specific safety rules with debug logging."""
 
     if lang == "es":
@@ -20,13 +40,13 @@ def _load_safety_prompt(lang: str) -> str:
         path = SAFETY_PROMPT_PATH_EN
 
     if path.exists():
-        print(f"[safety_filter] Loading {lang.upper()} safety rules from {path}")
+        log.info(f"Loading {lang.upper()} safety rules from {path}")
         text = path.read_text(encoding="utf-8").strip()
         if not text:
-            print(f"[safety_filter] WARNING: {path} is empty!")
+            log.warning(f"{path} is empty!")
         return text
 
-    print(f"[safety_filter] WARNING: No {lang.upper()} safety rules found. Using built-in defaults.")
+    log.warning(f"No {lang.upper()} safety rules found. Using built-in defaults.")
 
     if lang == "es":
         return (
@@ -49,83 +69,347 @@ def _load_safety_prompt(lang: str) -> str:
     )
 
 
-def _detect_language(text: str) -> str:
-    """Cheap heuristic to detect Spanish vs English."""
-    text = text.lower()
+def _build_request(raw_script: str, system_prompt: str) -> dict:
+    """Safety-filter chat arguments for a script under the given rules."""
+
+    user_content = (
+        "Here is a commentary script. Return a single revised version that "
+        "preserves the political content and style, but complies with the safety rules.\n\n"
+        "<<<BEGIN_SCRIPT>>>\n"
+        f"{raw_script}\n"
+        "<<<END_SCRIPT>>>"
+    )
+
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user",  "content": user_content},
+        ],
+        "max_tokens": 1200,
+        "temperature": 0.4,
+    }
+
+
+def select_rules(raw_script: str, analysis: Optional[dict]) -> tuple:
+    """Pick the rules language → (system prompt, analysis)."""
+
+    # ----------------------------------------------------
+    # Language (ES vs EN): override, else the script's analysis
+    # ----------------------------------------------------
+    analysis = analysis or analyze(raw_script)
+    lang = LENINWARE_LANG_MODE or resolve_language(analysis)
+    log.info(f"Detected language: {lang.upper()}")
+
+    return load_safety_prompt(lang), analysis
+
+
+def _plan_request(raw_script: str, system_prompt: str, analysis: dict) -> dict:
+    """Whole-script rewrite sized to the "safety" token budget."""
+    # The rewrite returns the whole script, so it may never be cut short.
+    return token_budget.size_request(
+        "safety",
+        lambda text: _build_request(text, system_prompt),
+        raw_script,
+        min_output=int(analysis["tokens"] * 1.2) + 64,
+    )
+
+
+# ---------------------------------------------------------
+#   SENTENCE PRE-SCREEN
+# ---------------------------------------------------------
+def load_patterns() -> List[tuple]:
+    """(category, compiled regex) rules from SAFETY_PATTERNS_PATH."""
+    if not SAFETY_PATTERNS_PATH.exists():
+        log.warning(f"Pattern list missing → {SAFETY_PATTERNS_PATH}")
+        return []
+
+    patterns = []
+    for raw in SAFETY_PATTERNS_PATH.read_text(encoding="utf-8").splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        category, sep, pattern = line.partition("|")
+        if not sep:
+            log.debug(f"Skipping malformed pattern: {raw}")
+            continue
+        try:
+            patterns.append((category.strip(), re.compile(pattern.strip(), re.IGNORECASE)))
+        except re.error as e:
+            log.warning(f"Bad pattern {pattern.strip()!r}: {e}")
+    return patterns
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences with their trailing whitespace; "".join() gives back text."""
+    return [m.group() for m in _SENTENCE_RE.finditer(text) if m.group()]
+
+
+def screen_sentences(sentences: List[str], patterns: List[tuple]) -> Dict[int, List[str]]:
+    """Index → matched categories, for every sentence that hits a pattern."""
+    flagged = {}
+    for i, sentence in enumerate(sentences):
+        hits = [category for category, rx in patterns if rx.search(sentence)]
+        if hits:
+            flagged[i] = hits
+    return flagged
+
+
+def prescreen(raw_script: str) -> tuple:
+    """
+    Split and pre-screen the script → (sentences, flagged). flagged is None
+    when the whole script should be rewritten in one pass instead.
+    """
+    patterns = load_patterns()
+    if SAFETY_MODE != "selective" or not patterns:
+        return None, None
+
+    sentences = split_sentences(raw_script)
+    flagged = screen_sentences(sentences, patterns)
+    categories = sorted({c for hits in flagged.values() for c in hits})
+    log.info(f"Pre-screen: {len(flagged)}/{len(sentences)} sentences flagged {categories if flagged else ''}".rstrip())
+    sp = current_span()
+    sp.set("sentences", len(sentences))
+    sp.set("flagged", len(flagged))
+
+    if len(flagged) > SAFETY_FULL_PASS_RATIO * len(sentences):
+        log.info("Most of the script is flagged — rewriting it in one pass.")
+        return sentences, None
+    return sentences, flagged
+
+
+def _build_sentence_request(sentences: List[str], i: int, system_prompt: str) -> dict:
+    """Rewrite one flagged sentence, with its neighbours as read-only context."""
+    before = sentences[i - 1].strip() if i > 0 else ""
+    after = sentences[i + 1].strip() if i + 1 < len(sentences) else ""
+
+    def build(text: str) -> dict:
+        user_content = (
+            "One sentence of a commentary script was flagged by an automated check. "
+            "Rewrite ONLY that sentence so it complies with the safety rules, changing "
+            "as little as possible and keeping its language, political content and tone. "
+            "Return only the rewritten sentence (nothing at all if it must be removed).\n\n"
+            f"Context before (do not rewrite): {before}\n"
+            f"Context after (do not rewrite): {after}\n\n"
+            "<<<BEGIN_SENTENCE>>>\n"
+            f"{text}\n"
+            "<<<END_SENTENCE>>>"
+        )
+        return {
+            "model": "gpt-4o-mini",
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ],
+            "max_tokens": 200,
+            "temperature": 0.4,
+        }
+
+    sentence = sentences[i].strip()
+    return token_budget.size_request(
+        "safety", build, sentence,
+        target_output=token_budget.count_tokens(len(sentence)) * 2 + 32,
+    )
+
+
+def _splice(sentences: List[str], i: int, resp) -> str:
+    """The rewritten sentence in place of sentences[i], keeping its trailing whitespace."""
+    original = sentences[i]
+    rewritten = (resp.choices[0].message.content or "").strip()
+    if not rewritten:
+        log.info(f"Sentence {i + 1} removed")
+        return ""
+    return rewritten + original[len(original.rstrip()):]
 
-    spanish_markers = ["que ", " de ", " la ", " el ", " y ", " para ", " como ",
-                       "pero", "porque", "cuando", "según", "gobierno", "política"]
 
-    matches = sum(1 for w in spanish_markers if w in text)
+def _join(sentences: List[str], rewritten: Dict[int, str], raw_script: str) -> str:
+    safe = "".join(rewritten.get(i, s) for i, s in enumerate(sentences)).strip()
+    inc("leninware_safety_sentences_rewritten_total", len(rewritten))
+    log.info(
+        f"Finished. Rewrote {len(rewritten)} sentence(s); "
+        f"output length: {len(safe)} chars (delta: {len(safe) - len(raw_script)})"
+    )
+    return safe
 
-    if matches >= 3:
-        return "es"
-    return "en"
 
+def _finish(resp, raw_script: str) -> str:
+    safe = (resp.choices[0].message.content or "").strip()
+
+    log.info(
+        f"Finished. "
+        f"Output length: {len(safe)} chars "
+        f"(delta: {len(safe) - len(raw_script)})"
+    )
+
+    return safe
 
-def apply_script_safety_filter(raw_script: str) -> str:
-    """Apply post-processing to keep the script compliant while preserving tone."""
+
+def rewrite_sentence(client, sentences: List[str], i: int, system_prompt: str) -> str:
+    """One flagged sentence through the LLM; the original is kept on error."""
+    try:
+        with span("openai.chat", model="gpt-4o-mini", sentence=i) as sp:
+            request = _build_sentence_request(sentences, i, system_prompt)
+            sp.set("bytes_out", openai_scheduler.request_chars(request))
+            resp = openai_scheduler.call(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.NORMAL,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, resp, "gpt-4o-mini")
+        return _splice(sentences, i, resp)
+    except Exception as e:
+        log.error(f"rewriting sentence {i + 1}: {e} — keeping it unchanged.")
+        return sentences[i]
+
+
+async def rewrite_sentence_async(client, sentences: List[str], i: int, system_prompt: str) -> str:
+    try:
+        with span("openai.chat", model="gpt-4o-mini", sentence=i) as sp:
+            request = _build_sentence_request(sentences, i, system_prompt)
+            sp.set("bytes_out", openai_scheduler.request_chars(request))
+            resp = await openai_scheduler.acall(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.NORMAL,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, resp, "gpt-4o-mini")
+        return _splice(sentences, i, resp)
+    except Exception as e:
+        log.error(f"rewriting sentence {i + 1}: {e} — keeping it unchanged.")
+        return sentences[i]
+
+
+@traced("stage.safety")
+def apply_script_safety_filter(raw_script: str, analysis: Optional[dict] = None) -> str:
+    """
+    Apply post-processing to keep the script compliant while preserving tone.
+    `analysis` is the script's text_analysis.analyze() result, if already computed.
+
+    With SAFETY_MODE=selective the script is pre-screened locally against
+    prompts/script_safety_patterns.txt: a clean script is returned as is,
+    otherwise only the flagged sentences are rewritten (concurrently) and
+    spliced back in place.
+    """
 
     raw_script = (raw_script or "").strip()
-    print(f"[safety_filter] Received script length: {len(raw_script)} chars")
+    log.info(f"Received script length: {len(raw_script)} chars")
 
     if not raw_script:
-        print("[safety_filter] EMPTY SCRIPT — Skipping safety filter.")
+        log.info("EMPTY SCRIPT — Skipping safety filter.")
         return raw_script
 
     # ----------------------------------------------------
     # MOCK MODE
     # ----------------------------------------------------
     if USE_MOCK_AI:
-        print("[safety_filter] MOCK MODE — Returning script unchanged.")
+        log.info("MOCK MODE — Returning script unchanged.")
         return raw_script
 
     # ----------------------------------------------------
-    # Detect language (ES vs EN)
+    # LOCAL PRE-SCREEN
     # ----------------------------------------------------
-    lang = LENINWARE_LANG_MODE or _detect_language(raw_script)
-    print(f"[safety_filter] Detected language: {lang.upper()}")
+    sentences, flagged = prescreen(raw_script)
+    if flagged == {}:
+        log.info("Pre-screen clean — skipping the OpenAI safety pass.")
+        inc("leninware_safety_llm_skipped_total")
+        return raw_script
+
+    system_prompt, analysis = select_rules(raw_script, analysis)
+    client = openai_scheduler.get_client()
 
     # ----------------------------------------------------
-    # REAL MODE — CALL OPENAI
+    # REAL MODE — FLAGGED SENTENCES ONLY
     # ----------------------------------------------------
-    print("[safety_filter] REAL MODE — Applying OpenAI safety filter...")
+    if flagged:
+        log.info(f"REAL MODE — Rewriting {len(flagged)} flagged sentence(s)...")
+        with ThreadPoolExecutor(max_workers=min(len(flagged), SAFETY_MAX_CONCURRENCY)) as pool:
+            futures = {
+                i: pool.submit(copy_context().run, rewrite_sentence, client, sentences, i, system_prompt)
+                for i in flagged
+            }
+            rewritten = {i: f.result() for i, f in futures.items()}
+        return _join(sentences, rewritten, raw_script)
 
-    api_key = require_env("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+    # ----------------------------------------------------
+    # REAL MODE — WHOLE SCRIPT
+    # ----------------------------------------------------
+    request = _plan_request(raw_script, system_prompt, analysis)
+    log.info("REAL MODE — Applying OpenAI safety filter...")
 
-    system_prompt = _load_safety_prompt(lang)
+    try:
+        with span("openai.chat", model="gpt-4o-mini",
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            resp = openai_scheduler.call(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.NORMAL,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, resp, "gpt-4o-mini")
 
-    user_content = (
-        "Here is a commentary script. Return a single revised version that "
-        "preserves the political content and style, but complies with the safety rules.\n\n"
-        "<<<BEGIN_SCRIPT>>>\n"
-        f"{raw_script}\n"
-        "<<<END_SCRIPT>>>"
-    )
+        return _finish(resp, raw_script)
 
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user",  "content": user_content},
-            ],
-            max_tokens=1200,
-            temperature=0.4,
-        )
+    except Exception as e:
+        log.error(f"calling OpenAI safety filter: {e}")
+        log.warning("FALLBACK — Returning raw script unchanged.")
+        return raw_script
 
-        safe = (resp.choices[0].message.content or "").strip()
 
-        print(
-            f"[safety_filter] Finished. "
-            f"Output length: {len(safe)} chars "
-            f"(delta: {len(safe) - len(raw_script)})"
-        )
+@traced("stage.safety")
+async def apply_script_safety_filter_async(raw_script: str, analysis: Optional[dict] = None) -> str:
+    """Async apply_script_safety_filter(): same result and fallback."""
+
+    raw_script = (raw_script or "").strip()
+    log.info(f"Received script length: {len(raw_script)} chars")
+
+    if not raw_script:
+        log.info("EMPTY SCRIPT — Skipping safety filter.")
+        return raw_script
+
+    if USE_MOCK_AI:
+        log.info("MOCK MODE — Returning script unchanged.")
+        return raw_script
+
+    sentences, flagged = prescreen(raw_script)
+    if flagged == {}:
+        log.info("Pre-screen clean — skipping the OpenAI safety pass.")
+        inc("leninware_safety_llm_skipped_total")
+        return raw_script
+
+    system_prompt, analysis = select_rules(raw_script, analysis)
+
+    if flagged:
+        log.info(f"REAL MODE — Rewriting {len(flagged)} flagged sentence(s)...")
+        client = openai_scheduler.get_async_client()
+        limit = asyncio.Semaphore(SAFETY_MAX_CONCURRENCY)
+
+        async def rewrite(i: int) -> str:
+            async with limit:
+                return await rewrite_sentence_async(client, sentences, i, system_prompt)
 
-        return safe
+        results = await asyncio.gather(*(rewrite(i) for i in flagged))
+        return _join(sentences, dict(zip(flagged, results)), raw_script)
+
+    request = _plan_request(raw_script, system_prompt, analysis)
+    log.info("REAL MODE — Applying OpenAI safety filter...")
+
+    try:
+        client = openai_scheduler.get_async_client()
+        with span("openai.chat", model="gpt-4o-mini",
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            resp = await openai_scheduler.acall(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.NORMAL,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, resp, "gpt-4o-mini")
+
+        return _finish(resp, raw_script)
 
     except Exception as e:
-        print("[safety_filter] ERROR calling OpenAI safety filter:", e)
-        print("[safety_filter] FALLBACK — Returning raw script unchanged.")
-        return raw_script
\ No newline at end of file
+        log.error(f"calling OpenAI safety filter: {e}")
+        log.warning("FALLBACK — Returning raw script unchanged.")
+        return raw_script
@@ -1,15 +1,26 @@
 # shotstack_renderer.py
 
+import asyncio
 import base64
+import json
 import time
 import wave
 from contextlib import closing
 from typing import List
 import textwrap
-import requests
 import os
 
 from config import USE_MOCK_AI, require_env, SHOTSTACK_API_URL
+import http_client
+import async_http
+import deadlines
+from telemetry import span
+from profiling import profile_stage
+from workspace import atomic_write
+from pipeline_logging import get_logger
+
+log = get_logger("shotstack")
+mock_log = get_logger("shotstack:mock")
 
 
 def _encode_file(path: str) -> str:
@@ -18,7 +29,7 @@ def _encode_file(path: str) -> str:
         with open(path, "rb") as f:
             return base64.b64encode(f.read()).decode("ascii")
     except Exception as e:
-        print(f"[shotstack] ERROR reading file '{path}': {e}")
+        log.error(f"reading file '{path}': {e}")
         return ""
 
 
@@ -29,29 +40,29 @@ def _get_wav_duration_seconds(path: str) -> float:
             frames = wf.getnframes()
             rate = wf.getframerate()
             dur = frames / float(rate or 1)
-            print(f"[shotstack] Audio duration: {dur:.2f}s")
+            log.info(f"Audio duration: {dur:.2f}s")
             return dur
     except Exception as e:
-        print(f"[shotstack] ERROR reading WAV duration: {e}")
+        log.error(f"reading WAV duration: {e}")
         return 0.0
 
 
 def _split_script(script_text: str, num_chunks: int) -> List[str]:
     """Split captions into chunks with debug info."""
     if num_chunks <= 0:
-        print("[shotstack] WARNING: num_chunks <= 0, returning entire script once.")
+        log.warning("num_chunks <= 0, returning entire script once.")
         return [script_text]
 
     wrapped = textwrap.wrap(script_text.strip(), width=160)
     if not wrapped:
-        print("[shotstack] WARNING: Script too short or empty for wrapping.")
+        log.warning("Script too short or empty for wrapping.")
         return [""]
 
     num_chunks = min(num_chunks, len(wrapped))
     approx_size = len(wrapped) // num_chunks
 
-    print(f"[shotstack] Creating {num_chunks} caption chunks "
-          f"from {len(wrapped)} wrapped lines.")
+    log.debug(f"Creating {num_chunks} caption chunks "
+              f"from {len(wrapped)} wrapped lines.")
 
     chunks = []
     idx = 0
@@ -66,53 +77,21 @@ def _split_script(script_text: str, num_chunks: int) -> List[str]:
     return chunks
 
 
-def render_video_with_shotstack(
+def _build_payload(
     audio_file: str,
     image_files: List[str],
     script_text: str,
-    output_video_path: str,
-) -> str:
-    """
-    Render a video using Shotstack.
-    MOCK MODE: Produce a tiny placeholder MP4 instead of doing an API call.
-    """
-
-    # ----------------------------------------------------
-    # MOCK MODE
-    # ----------------------------------------------------
-    if USE_MOCK_AI:
-        print("[shotstack:mock] Generating placeholder video...")
-        dummy_mp4 = (
-            b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42mp41"
-        )
-        os.makedirs(os.path.dirname(output_video_path), exist_ok=True)
-        with open(output_video_path, "wb") as f:
-            f.write(dummy_mp4)
-        print("[shotstack:mock] DONE:", output_video_path)
-        return output_video_path
-
-    # ----------------------------------------------------
-    # REAL SHOTSTACK MODE
-    # ----------------------------------------------------
-    print("[shotstack] Starting real Shotstack render...")
-    api_key = require_env("SHOTSTACK_API_KEY")
-
-    # 1. Compute audio duration
-    audio_duration = _get_wav_duration_seconds(audio_file)
-    if audio_duration <= 0:
-        print("[shotstack] WARNING: Invalid audio duration, using fallback 15s")
-        audio_duration = 15.0
-
+    segment_length: float,
+) -> dict:
+    """Assemble the Shotstack timeline (base64 images, captions, soundtrack)."""
     num_images = max(len(image_files), 1)
-    segment_length = audio_duration / num_images
-    print(f"[shotstack] Rendering {num_images} frames at {segment_length:.2f}s each")
 
     # 2. Image clips
     image_clips = []
     t = 0.0
     for path in image_files:
         if not os.path.exists(path):
-            print(f"[shotstack] WARNING: Missing image file: {path}")
+            log.warning(f"Missing image file: {path}")
         encoded = _encode_file(path)
 
         image_clips.append(
@@ -150,7 +129,7 @@ def render_video_with_shotstack(
         t += segment_length
 
     # 4. Payload assembly
-    payload = {
+    return {
         "timeline": {
             "background": "#000000",
             "soundtrack": {
@@ -168,69 +147,214 @@ def render_video_with_shotstack(
         },
     }
 
+
+DUMMY_MP4 = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42mp41"
+
+
+def _mock_render(output_video_path: str) -> str:
+    mock_log.info("Generating placeholder video...")
+    atomic_write(output_video_path, DUMMY_MP4)
+    mock_log.info(f"DONE: {output_video_path}")
+    return output_video_path
+
+
+def _prepare_render(audio_file: str, image_files: List[str], script_text: str):
+    """Timing, payload and headers for a render job → (body, headers)."""
+    log.info("Starting real Shotstack render...")
+    api_key = require_env("SHOTSTACK_API_KEY")
+
+    # 1. Compute audio duration
+    audio_duration = _get_wav_duration_seconds(audio_file)
+    if audio_duration <= 0:
+        log.warning("Invalid audio duration, using fallback 15s")
+        audio_duration = 15.0
+
+    num_images = max(len(image_files), 1)
+    segment_length = audio_duration / num_images
+    log.info(f"Rendering {num_images} frames at {segment_length:.2f}s each")
+
+    # 2-4. Image clips, caption chunks and payload assembly
+    with profile_stage("shotstack.payload"):
+        payload = _build_payload(audio_file, image_files, script_text, segment_length)
+        body = json.dumps(payload)
+
     headers = {
         "x-api-key": api_key,
         "Content-Type": "application/json",
     }
+    return body, headers
 
-    # 5. Submit render
-    print("[shotstack] Submitting render job...")
-    try:
-        resp = requests.post(SHOTSTACK_API_URL, json=payload, headers=headers)
-        resp.raise_for_status()
-        print("[shotstack] Render job accepted.")
-    except Exception as e:
-        print("[shotstack] ERROR submitting job:", e)
-        raise
 
-    data = resp.json()
+def _render_id(data: dict) -> str:
     if "response" not in data or "id" not in data["response"]:
-        print("[shotstack] ERROR: Unexpected Shotstack response:", data)
+        log.error(f"Unexpected Shotstack response: {data}")
         raise RuntimeError("Invalid Shotstack response")
 
     render_id = data["response"]["id"]
+    log.info(f"Render ID: {render_id}")
+    return render_id
+
+
+def _poll_result(status: dict, attempt: int):
+    """Video URL once done, None while rendering; raises if the render failed."""
+    s = status.get("response", {}).get("status", "unknown")
+    log.debug(f"Poll #{attempt}: Status = {s}")
+
+    if s == "done":
+        log.info("DONE — Downloading final video...")
+        return status["response"]["url"]
+
+    if s in ("failed", "errored"):
+        log.error(f"Render failed: {status}")
+        raise RuntimeError(f"Shotstack render failed: {status}")
+
+    return None
+
+
+def _save_video(video_bytes: bytes, output_video_path: str) -> None:
+    atomic_write(output_video_path, video_bytes)
+    log.info(f"Video saved: {output_video_path}")
+
+
+def render_video_with_shotstack(
+    audio_file: str,
+    image_files: List[str],
+    script_text: str,
+    output_video_path: str,
+) -> str:
+    """
+    Render a video using Shotstack.
+    MOCK MODE: Produce a tiny placeholder MP4 instead of doing an API call.
+    """
+
+    # ----------------------------------------------------
+    # MOCK MODE
+    # ----------------------------------------------------
+    if USE_MOCK_AI:
+        return _mock_render(output_video_path)
+
+    # ----------------------------------------------------
+    # REAL SHOTSTACK MODE
+    # ----------------------------------------------------
+    body, headers = _prepare_render(audio_file, image_files, script_text)
+
+    # 5. Submit render
+    log.info("Submitting render job...")
+    try:
+        with span("http.shotstack.submit", bytes_out=len(body)) as sp:
+            resp = http_client.post(SHOTSTACK_API_URL, data=body, headers=headers)
+            sp.set("status_code", resp.status_code)
+            resp.raise_for_status()
+        log.info("Render job accepted.")
+    except Exception as e:
+        log.error(f"submitting job: {e}")
+        raise
+
+    render_id = _render_id(resp.json())
     status_url = f"{SHOTSTACK_API_URL}/{render_id}"
-    print(f"[shotstack] Render ID: {render_id}")
 
-    # 6. Poll with timeout
-    timeout = time.time() + 60 * 10  # 10 minutes
+    # 6. Poll with timeout (10 minutes, or less if the stage deadline is sooner)
+    timeout = time.time() + deadlines.clamp_timeout(60 * 10)
     attempt = 0
 
-    while True:
-        attempt += 1
-        if time.time() > timeout:
-            raise TimeoutError("[shotstack] ERROR: Render timed out after 10 minutes.")
+    with span("http.shotstack.poll", render_id=render_id) as sp:
+        while True:
+            attempt += 1
+            sp.set("polls", attempt)
+            if time.time() > timeout:
+                raise TimeoutError(f"Render {render_id} timed out after {attempt - 1} polls.")
+
+            try:
+                status = http_client.get(status_url, headers=headers).json()
+            except Exception as e:
+                log.warning(f"polling status: {e}")
+                sp.add("retries")
+                time.sleep(3)
+                continue
+
+            url = _poll_result(status, attempt)
+            if url:
+                break
 
-        try:
-            status = requests.get(status_url, headers=headers).json()
-        except Exception as e:
-            print("[shotstack] ERROR polling status:", e)
             time.sleep(3)
-            continue
 
-        s = status.get("response", {}).get("status", "unknown")
-        print(f"[shotstack] Poll #{attempt}: Status = {s}")
+    # 7. Download final video
+    try:
+        with span("http.shotstack.download") as sp:
+            video_resp = http_client.get(url)
+            video_resp.raise_for_status()
+            video_bytes = video_resp.content
+            sp.set("bytes_in", len(video_bytes))
+        _save_video(video_bytes, output_video_path)
+    except Exception as e:
+        log.error(f"downloading final video: {e}")
+        raise
 
-        if s == "done":
-            url = status["response"]["url"]
-            print("[shotstack] DONE — Downloading final video...")
-            break
+    return output_video_path
 
-        if s in ("failed", "errored"):
-            print("[shotstack] ERROR: Render failed:", status)
-            raise RuntimeError(f"Shotstack render failed: {status}")
 
-        time.sleep(3)
+async def render_video_with_shotstack_async(
+    audio_file: str,
+    image_files: List[str],
+    script_text: str,
+    output_video_path: str,
+) -> str:
+    """
+    Async render_video_with_shotstack(). Payload encoding runs in a worker
+    thread so the event loop keeps serving other pipelines meanwhile.
+    """
+    if USE_MOCK_AI:
+        return _mock_render(output_video_path)
+
+    body, headers = await asyncio.to_thread(_prepare_render, audio_file, image_files, script_text)
+
+    log.info("Submitting render job...")
+    try:
+        with span("http.shotstack.submit", bytes_out=len(body)) as sp:
+            resp = await async_http.post(SHOTSTACK_API_URL, content=body, headers=headers)
+            sp.set("status_code", resp.status_code)
+            resp.raise_for_status()
+        log.info("Render job accepted.")
+    except Exception as e:
+        log.error(f"submitting job: {e}")
+        raise
+
+    render_id = _render_id(resp.json())
+    status_url = f"{SHOTSTACK_API_URL}/{render_id}"
+
+    timeout = time.time() + deadlines.clamp_timeout(60 * 10)
+    attempt = 0
+
+    with span("http.shotstack.poll", render_id=render_id) as sp:
+        while True:
+            attempt += 1
+            sp.set("polls", attempt)
+            if time.time() > timeout:
+                raise TimeoutError(f"Render {render_id} timed out after {attempt - 1} polls.")
+
+            try:
+                status = (await async_http.get(status_url, headers=headers)).json()
+            except Exception as e:
+                log.warning(f"polling status: {e}")
+                sp.add("retries")
+                await asyncio.sleep(3)
+                continue
+
+            url = _poll_result(status, attempt)
+            if url:
+                break
+
+            await asyncio.sleep(3)
 
-    # 7. Download final video
     try:
-        video_bytes = requests.get(url).content
-        os.makedirs(os.path.dirname(output_video_path), exist_ok=True)
-        with open(output_video_path, "wb") as f:
-            f.write(video_bytes)
-        print("[shotstack] Video saved:", output_video_path)
+        with span("http.shotstack.download") as sp:
+            video_resp = await async_http.get(url)
+            video_resp.raise_for_status()
+            video_bytes = video_resp.content
+            sp.set("bytes_in", len(video_bytes))
+        await asyncio.to_thread(_save_video, video_bytes, output_video_path)
     except Exception as e:
-        print("[shotstack] ERROR downloading final video:", e)
+        log.error(f"downloading final video: {e}")
         raise
 
-    return output_video_path
\ No newline at end of file
+    return output_video_path
@@ -0,0 +1,202 @@
+# stats_history.py
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    STATS_HISTORY_PATH,
+    STATS_RETENTION_DAYS,
+    STATS_MAX_SNAPSHOTS,
+    STATS_COMPACT_BYTES,
+)
+from workspace import atomic_output, file_lock
+from pipeline_logging import get_logger
+
+log = get_logger("stats")
+
+# File layout: 16-byte header, then fixed-size little-endian records.
+_MAGIC = b"LWSTATS1"
+_HEADER = _MAGIC.ljust(16, b"\0")
+
+SNAPSHOT_DTYPE = np.dtype([
+    ("video_id", "S16"),
+    ("ts", "<f8"),       # unix seconds
+    ("views", "<i8"),
+    ("likes", "<i8"),
+])
+
+# Snapshot pairs closer than this are too noisy to derive a rate from.
+MIN_INTERVAL_S = 60.0
+
+
+class StatsHistory:
+    """
+    Append-only time series of (video_id, ts, views, likes) snapshots.
+
+    Appends are plain O_APPEND writes of whole records; reads memory-map the
+    file. compact() drops snapshots older than the retention window and keeps
+    at most max_per_video per video, rewriting the file atomically. Appends
+    and compaction hold a file lock, so an append from another process is
+    never written to a file compact() is replacing.
+    """
+
+    def __init__(
+        self,
+        path: str = STATS_HISTORY_PATH,
+        retention_days: float = STATS_RETENTION_DAYS,
+        max_per_video: int = STATS_MAX_SNAPSHOTS,
+        compact_bytes: int = STATS_COMPACT_BYTES,
+    ):
+        self.path = path
+        self.retention_s = retention_days * 86400.0
+        self.max_per_video = max(max_per_video, 2)
+        self.compact_bytes = compact_bytes
+        self._next_compact = compact_bytes
+        self._lock = threading.Lock()
+
+    # -----------------------------------------------------
+    #   STORAGE
+    # -----------------------------------------------------
+    def _ensure_file(self) -> None:
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= len(_HEADER):
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "wb") as f:
+            f.write(_HEADER)
+
+    def _load(self) -> np.ndarray:
+        """Memory-mapped view of every record (empty array if none)."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return np.empty(0, dtype=SNAPSHOT_DTYPE)
+
+        count = (size - len(_HEADER)) // SNAPSHOT_DTYPE.itemsize
+        if count <= 0:
+            return np.empty(0, dtype=SNAPSHOT_DTYPE)
+
+        with open(self.path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{self.path} is not a stats snapshot file")
+        # A torn trailing record from a crashed writer is ignored via count.
+        return np.memmap(self.path, dtype=SNAPSHOT_DTYPE, mode="r", offset=len(_HEADER), shape=(count,))
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def record(self, stats: Dict[str, Dict], ts: Optional[float] = None) -> None:
+        """Append one snapshot per video from a video_id → {"views", "likes"} map."""
+        if not stats:
+            return
+
+        rec = np.empty(len(stats), dtype=SNAPSHOT_DTYPE)
+        rec["video_id"] = [vid.encode("ascii", "ignore")[:16] for vid in stats]
+        rec["ts"] = time.time() if ts is None else ts
+        rec["views"] = [s["views"] for s in stats.values()]
+        rec["likes"] = [s["likes"] for s in stats.values()]
+
+        with self._lock, file_lock(self.path):
+            self._ensure_file()
+            with open(self.path, "ab") as f:
+                f.write(rec.tobytes())
+
+            if os.path.getsize(self.path) > self._next_compact:
+                self._compact_locked()
+
+        log.debug(f"Recorded {len(rec)} stats snapshots")
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Apply retention and per-video limits; returns the records kept."""
+        with self._lock, file_lock(self.path):
+            return self._compact_locked(now)
+
+    def _compact_locked(self, now: Optional[float] = None) -> int:
+        data = np.array(self._load())
+        before = len(data)
+        now = time.time() if now is None else now
+
+        data = data[data["ts"] >= now - self.retention_s]
+        if len(data):
+            data = data[np.lexsort((data["ts"], data["video_id"]))]
+            # Position of each row counted from the end of its video's run.
+            _, starts, counts = np.unique(data["video_id"], return_index=True, return_counts=True)
+            from_end = np.repeat(starts + counts - 1, counts) - np.arange(len(data))
+            data = data[from_end < self.max_per_video]
+
+        with atomic_output(self.path) as tmp:
+            with open(tmp, "wb") as f:
+                f.write(_HEADER)
+                f.write(data.tobytes())
+
+        # If retained data alone exceeds the threshold, back off instead of
+        # rewriting the file on every append.
+        self._next_compact = max(self.compact_bytes, 2 * os.path.getsize(self.path))
+
+        log.info(f"Compacted stats history: {before} → {len(data)} snapshots")
+        return len(data)
+
+    # -----------------------------------------------------
+    #   QUERIES
+    # -----------------------------------------------------
+    def velocity(self, video_ids: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        """
+        video_id → (views per hour, acceleration in views/hour²). The rate
+        compares the latest snapshot with the latest one at least
+        MIN_INTERVAL_S older, so a snapshot taken moments after the previous
+        one is measured against an older base rather than ignored. Videos
+        without such a pair are absent; acceleration is 0.0 when only one
+        rate is known.
+        """
+        data = self._load()
+        keys = np.array([v.encode("ascii", "ignore")[:16] for v in video_ids], dtype="S16")
+        if not len(data) or not len(keys):
+            return {}
+
+        sub = data[np.isin(data["video_id"], keys)]
+        if len(sub) < 2:
+            return {}
+        sub = sub[np.lexsort((sub["ts"], sub["video_id"]))]
+
+        hours = sub["ts"] / 3600.0
+        views = sub["views"].astype(np.float64)
+        min_dt = MIN_INTERVAL_S / 3600.0
+
+        def base(h: np.ndarray, i: int) -> int:
+            """Latest snapshot at least MIN_INTERVAL_S before snapshot i (-1 if none)."""
+            return int(np.searchsorted(h, h[i] - min_dt, side="right")) - 1
+
+        out = {}
+        _, starts, counts = np.unique(sub["video_id"], return_index=True, return_counts=True)
+        for start, n in zip(starts, counts):
+            h, v = hours[start:start + n], views[start:start + n]
+            last = n - 1
+            j = base(h, last)
+            if j < 0:
+                continue
+            rate = (v[last] - v[j]) / (h[last] - h[j])
+
+            # The rate that ended at the base snapshot, measured the same way.
+            accel = 0.0
+            k = base(h, j)
+            if k >= 0:
+                prev = (v[j] - v[k]) / (h[j] - h[k])
+                accel = (rate - prev) / (h[last] - h[j])
+            out[sub["video_id"][start].decode("ascii")] = (float(rate), float(accel))
+        return out
+
+
+_history: Optional[StatsHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_history() -> StatsHistory:
+    """Process-wide store at STATS_HISTORY_PATH."""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = StatsHistory()
+        return _history
@@ -1,12 +1,15 @@
 # storyboard_prompt_generator.py
 
-from typing import List
-from config import USE_MOCK_AI, require_env
-
-# Only import OpenAI if NOT in mock mode
-if not USE_MOCK_AI:
-    from openai import OpenAI
+import time
+from typing import Callable, List
+from config import USE_MOCK_AI
+import openai_scheduler
+import token_budget
+from telemetry import span, traced, record_openai_usage
+from pipeline_logging import get_logger
 
+log = get_logger("storyboard")
+mock_log = get_logger("storyboard:mock")
 
 SYSTEM_PROMPT = """
 You are an AI storyboard artist creating symbolic illustrations for a political
@@ -34,31 +37,16 @@ Return a numbered list of prompts ONLY.
 """
 
 
-def generate_storyboard_prompts(script_text: str, num_images: int = 8) -> List[str]:
-    """Generate storyboard prompts for visual scenes."""
+def mock_prompts(num_images: int) -> List[str]:
+    mock_log.info(f"Generating {num_images} mock storyboard prompts.")
+    return [
+        f"Mock symbolic scene #{i+1}: abstract metaphorical artwork based on the script."
+        for i in range(num_images)
+    ]
 
-    if not script_text.strip():
-        print("[storyboard] ERROR: Empty script passed in.")
-        return []
-
-    # ----------------------------------------------------
-    # MOCK MODE — deterministic, no API usage
-    # ----------------------------------------------------
-    if USE_MOCK_AI:
-        print(f"[storyboard:mock] Generating {num_images} mock storyboard prompts.")
-        return [
-            f"Mock symbolic scene #{i+1}: abstract metaphorical artwork based on the script."
-            for i in range(num_images)
-        ]
-
-    # ----------------------------------------------------
-    # REAL MODE — OpenAI call
-    # ----------------------------------------------------
-    print("[storyboard] Calling OpenAI to generate storyboard prompts...")
-
-    api_key = require_env("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
 
+def _build_request(script_text: str, num_images: int) -> dict:
+    """Chat completion arguments for the storyboard call."""
     user_prompt = f"""
 Create {num_images} symbolic storyboard image prompts based on the following
 political commentary script.
@@ -76,46 +64,270 @@ Script:
 Return ONLY a numbered list.
     """.strip()
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt},
-            ],
-            max_tokens=900,
-            temperature=0.8,
-        )
-    except Exception as e:
-        print(f"[storyboard] ERROR calling OpenAI: {e}")
-        return []
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        "max_tokens": 900,
+        "temperature": 0.8,
+    }
+
+
+def _plan_request(script_text: str, num_images: int) -> dict:
+    """The storyboard request sized to the "storyboard" token budget."""
+    return token_budget.size_request(
+        "storyboard",
+        lambda text: _build_request(text, num_images),
+        script_text,
+    )
+
+
+def _parse_line(line: str) -> str:
+    """One line of the numbered list → the prompt ("" for blank lines)."""
+    line = line.strip()
+    if not line:
+        return ""
+
+    # Remove leading "1. text" or "1) text"
+    if line[0].isdigit():
+        if "." in line:
+            line = line.split(".", 1)[1].strip()
+        elif ")" in line:
+            line = line.split(")", 1)[1].strip()
+
+    return line
+
 
+def _parse_prompts(response, num_images: int) -> List[str]:
     raw = (response.choices[0].message.content or "").strip()
 
     if not raw:
-        print("[storyboard] ERROR: Empty storyboard response from OpenAI.")
+        log.error("Empty storyboard response from OpenAI.")
         return []
 
     # ----------------------------------------------------
     # PARSE NUMBERED LIST
     # ----------------------------------------------------
-    prompts = []
-    for line in raw.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-
-        # Remove leading "1. text" or "1) text"
-        if line[0].isdigit():
-            if "." in line:
-                line = line.split(".", 1)[1].strip()
-            elif ")" in line:
-                line = line.split(")", 1)[1].strip()
-
-        if line:
-            prompts.append(line)
+    prompts = [p for p in map(_parse_line, raw.splitlines()) if p]
 
     if len(prompts) < num_images:
-        print(f"[storyboard] WARNING: Expected {num_images} prompts, got {len(prompts)}")
+        log.warning(f"Expected {num_images} prompts, got {len(prompts)}")
+
+    return prompts[:num_images]
+
+
+@traced("stage.storyboard")
+def generate_storyboard_prompts(script_text: str, num_images: int = 8) -> List[str]:
+    """Generate storyboard prompts for visual scenes."""
+
+    if not script_text.strip():
+        log.error("Empty script passed in.")
+        return []
+
+    # ----------------------------------------------------
+    # MOCK MODE — deterministic, no API usage
+    # ----------------------------------------------------
+    if USE_MOCK_AI:
+        return mock_prompts(num_images)
+
+    # ----------------------------------------------------
+    # REAL MODE — OpenAI call
+    # ----------------------------------------------------
+    log.info("Calling OpenAI to generate storyboard prompts...")
+
+    client = openai_scheduler.get_client()
+
+    request = _plan_request(script_text, num_images)
+
+    try:
+        with span("openai.chat", model="gpt-4o-mini",
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            response = openai_scheduler.call(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.HIGH,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, response, "gpt-4o-mini")
+    except Exception as e:
+        log.error(f"calling OpenAI: {e}")
+        return []
+
+    return _parse_prompts(response, num_images)
+
+
+@traced("stage.storyboard")
+async def generate_storyboard_prompts_async(script_text: str, num_images: int = 8) -> List[str]:
+    """Async generate_storyboard_prompts(): same result and mock behavior."""
+
+    if not script_text.strip():
+        log.error("Empty script passed in.")
+        return []
+
+    if USE_MOCK_AI:
+        return mock_prompts(num_images)
+
+    log.info("Calling OpenAI to generate storyboard prompts...")
+
+    request = _plan_request(script_text, num_images)
+
+    try:
+        client = openai_scheduler.get_async_client()
+        with span("openai.chat", model="gpt-4o-mini",
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            response = await openai_scheduler.acall(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.HIGH,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, response, "gpt-4o-mini")
+    except Exception as e:
+        log.error(f"calling OpenAI: {e}")
+        return []
+
+    return _parse_prompts(response, num_images)
+
+
+# ---------------------------------------------------------
+#   STREAMING (see storyboard_stream.py)
+# ---------------------------------------------------------
+class _LineParser:
+    """Feeds streamed text; calls on_prompt(i, prompt) as each list line completes."""
+
+    def __init__(self, num_images: int, on_prompt: Callable[[int, str], None]):
+        self.num_images = num_images
+        self.on_prompt = on_prompt
+        self.prompts: List[str] = []
+        self._tail = ""
+
+    def feed(self, delta: str) -> None:
+        self._tail += delta
+        *lines, self._tail = self._tail.split("\n")
+        for line in lines:
+            self._emit(line)
+
+    def close(self) -> None:
+        self._emit(self._tail)
+        self._tail = ""
+        if len(self.prompts) < self.num_images:
+            log.warning(f"Expected {self.num_images} prompts, got {len(self.prompts)}")
+
+    def _emit(self, line: str) -> None:
+        prompt = _parse_line(line)
+        if prompt and len(self.prompts) < self.num_images:
+            self.prompts.append(prompt)
+            self.on_prompt(len(self.prompts), prompt)
+
+
+def _stream_request(script_text: str, num_images: int) -> dict:
+    # Streams are never hedged: a duplicate would deliver every prompt twice.
+    return dict(_plan_request(script_text, num_images), stream=True, stream_options={"include_usage": True})
+
+
+def _on_chunk(chunk, parser: _LineParser) -> None:
+    for choice in chunk.choices or []:
+        delta = getattr(choice.delta, "content", None)
+        if delta:
+            parser.feed(delta)
+
+
+@traced("stage.storyboard")
+def stream_storyboard_prompts(
+    script_text: str,
+    on_prompt: Callable[[int, str], None],
+    num_images: int = 8,
+) -> List[str]:
+    """
+    generate_storyboard_prompts() as a stream: on_prompt(i, prompt) is
+    called (i from 1) as soon as each line of the numbered list is complete.
+    Returns all prompts.
+    """
+
+    if not script_text.strip():
+        log.error("Empty script passed in.")
+        return []
+
+    parser = _LineParser(num_images, on_prompt)
+
+    if USE_MOCK_AI:
+        for prompt in mock_prompts(num_images):
+            parser.feed(prompt + "\n")
+        parser.close()
+        return parser.prompts
+
+    log.info("Streaming storyboard prompts from OpenAI...")
+
+    client = openai_scheduler.get_client()
+    request = _stream_request(script_text, num_images)
+
+    try:
+        with span("openai.chat", model="gpt-4o-mini", stream=True,
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            t0 = time.monotonic()
+            stream = openai_scheduler.call(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.HIGH,
+                **request,
+            )
+            last = None
+            for chunk in stream:
+                last = chunk
+                _on_chunk(chunk, parser)
+            parser.close()
+            record_openai_usage(sp, last, "gpt-4o-mini")
+            openai_scheduler.account_stream("gpt-4o-mini", request, last, time.monotonic() - t0)
+    except Exception as e:
+        log.error(f"streaming from OpenAI: {e}")
+
+    # Prompts already handed out stay valid even if the stream broke off.
+    return parser.prompts
+
+
+@traced("stage.storyboard")
+async def stream_storyboard_prompts_async(
+    script_text: str,
+    on_prompt: Callable[[int, str], None],
+    num_images: int = 8,
+) -> List[str]:
+    """Async stream_storyboard_prompts(); on_prompt runs on the event loop."""
+
+    if not script_text.strip():
+        log.error("Empty script passed in.")
+        return []
+
+    parser = _LineParser(num_images, on_prompt)
+
+    if USE_MOCK_AI:
+        for prompt in mock_prompts(num_images):
+            parser.feed(prompt + "\n")
+        parser.close()
+        return parser.prompts
+
+    log.info("Streaming storyboard prompts from OpenAI...")
+
+    request = _stream_request(script_text, num_images)
+
+    try:
+        client = openai_scheduler.get_async_client()
+        with span("openai.chat", model="gpt-4o-mini", stream=True,
+                  bytes_out=openai_scheduler.request_chars(request)) as sp:
+            t0 = time.monotonic()
+            stream = await openai_scheduler.acall(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.HIGH,
+                **request,
+            )
+            last = None
+            async for chunk in stream:
+                last = chunk
+                _on_chunk(chunk, parser)
+            parser.close()
+            record_openai_usage(sp, last, "gpt-4o-mini")
+            openai_scheduler.account_stream("gpt-4o-mini", request, last, time.monotonic() - t0)
+    except Exception as e:
+        log.error(f"streaming from OpenAI: {e}")
 
-    return prompts[:num_images]
\ No newline at end of file
+    return parser.prompts
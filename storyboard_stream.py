@@ -0,0 +1,131 @@
+# storyboard_stream.py
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import List, Tuple
+from config import USE_MOCK_AI, STREAM_IMAGE_CONCURRENCY
+import openai_scheduler
+from telemetry import traced, current_span
+from storyboard_prompt_generator import (
+    generate_storyboard_prompts,
+    generate_storyboard_prompts_async,
+    stream_storyboard_prompts,
+    stream_storyboard_prompts_async,
+)
+from safe_image_prompt_filter import apply_safe_substitutions, load_rules, substitute
+from image_generator import (
+    generate_frame,
+    generate_frame_async,
+    generate_images_from_prompts,
+    generate_images_from_prompts_async,
+)
+from pipeline_logging import get_logger
+
+log = get_logger("storyboard_stream")
+
+
+def _finish(safe_prompts: List[str], paths: list, t0: float, t_first: list, t_text: float) -> Tuple[List[str], List[str]]:
+    if not safe_prompts:
+        log.error("No storyboard prompts streamed")
+        raise ValueError("No prompts passed to image generator")
+
+    image_paths = [p for p in paths if p]
+    sp = current_span()
+    sp.set("prompts", len(safe_prompts))
+    if t_first:
+        sp.set("first_prompt_s", round(t_first[0] - t0, 3))
+    sp.set("storyboard_s", round(t_text - t0, 3))
+    log.info(
+        f"{len(image_paths)}/{len(safe_prompts)} images done {time.monotonic() - t0:.1f}s after start "
+        f"(first prompt at {t_first[0] - t0:.1f}s, list finished at {t_text - t0:.1f}s)"
+    )
+    return safe_prompts, image_paths
+
+
+@traced("stage.storyboard_images")
+def stream_storyboard_images(script_text: str, output_dir: str, num_images: int = 8) -> Tuple[List[str], List[str]]:
+    """
+    Steps 7, 8 and 9 overlapped → (safe prompts, image paths). The storyboard
+    is streamed; each prompt goes through the substitution rules and to the
+    image worker pool as soon as its line is complete, so the first frames
+    are being drawn while later prompts are still being written. Frames
+    keep prompt order (frame_<i>.png); failed ones are skipped, as in
+    generate_images_from_prompts().
+    """
+
+    # ----------------------------------------------------
+    # MOCK MODE — the sequential stages' mocks
+    # ----------------------------------------------------
+    if USE_MOCK_AI:
+        safe_prompts = apply_safe_substitutions(generate_storyboard_prompts(script_text, num_images))
+        return safe_prompts, generate_images_from_prompts(safe_prompts, output_dir=output_dir)
+
+    # ----------------------------------------------------
+    # REAL MODE — stream → substitutions → image pool
+    # ----------------------------------------------------
+    client = openai_scheduler.get_client()
+    rules = load_rules()
+    os.makedirs(output_dir, exist_ok=True)
+    # Frame workers run in the context of this stage, not of the storyboard
+    # stage whose callback dispatches them (and whose deadline ends first).
+    ctx = copy_context()
+    safe_prompts, futures, t_first = [], [], []
+    t0 = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=STREAM_IMAGE_CONCURRENCY) as pool:
+        def on_prompt(i: int, prompt: str) -> None:
+            if not t_first:
+                t_first.append(time.monotonic())
+            safe = substitute(prompt, rules, i)
+            safe_prompts.append(safe)
+            log.info(f"Prompt {i} ready → image worker")
+            futures.append(pool.submit(ctx.copy().run, generate_frame, client, safe, i, output_dir))
+
+        stream_storyboard_prompts(script_text, on_prompt, num_images)
+        t_text = time.monotonic()
+        paths = [f.result() for f in futures]
+
+    return _finish(safe_prompts, paths, t0, t_first, t_text)
+
+
+@traced("stage.storyboard_images")
+async def stream_storyboard_images_async(
+    script_text: str,
+    output_dir: str,
+    num_images: int = 8,
+) -> Tuple[List[str], List[str]]:
+    """Async stream_storyboard_images(): same result."""
+
+    if USE_MOCK_AI:
+        safe_prompts = apply_safe_substitutions(await generate_storyboard_prompts_async(script_text, num_images))
+        return safe_prompts, await generate_images_from_prompts_async(safe_prompts, output_dir=output_dir)
+
+    rules = load_rules()
+    os.makedirs(output_dir, exist_ok=True)
+    ctx = copy_context()
+    limit = asyncio.Semaphore(STREAM_IMAGE_CONCURRENCY)
+    safe_prompts, tasks, t_first = [], [], []
+    t0 = time.monotonic()
+
+    client = openai_scheduler.get_async_client()
+
+    async def frame(i: int, prompt: str):
+        async with limit:
+            return await generate_frame_async(client, prompt, i, output_dir)
+
+    def on_prompt(i: int, prompt: str) -> None:
+        if not t_first:
+            t_first.append(time.monotonic())
+        safe = substitute(prompt, rules, i)
+        safe_prompts.append(safe)
+        log.info(f"Prompt {i} ready → image worker")
+        tasks.append(asyncio.create_task(frame(i, safe), context=ctx.copy()))
+
+    await stream_storyboard_prompts_async(script_text, on_prompt, num_images)
+    t_text = time.monotonic()
+    paths = await asyncio.gather(*tasks)
+
+    return _finish(safe_prompts, paths, t0, t_first, t_text)
@@ -0,0 +1,296 @@
+# telemetry.py
+
+import atexit
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from config import ENABLE_TELEMETRY, TELEMETRY_DIR
+
+TRACE_FILE = "traces.jsonl"
+METRICS_FILE = "metrics.prom"
+
+# Histogram buckets (seconds) — wide enough for both a regex pass and a
+# ten-minute Shotstack render.
+DURATION_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("leninware_span", default=None)
+_run_id: ContextVar[str] = ContextVar("leninware_run_id", default="")
+
+_lock = threading.Lock()
+_finished: List[dict] = []
+
+# (metric name, sorted label tuple) → value
+_counters: Dict[Tuple[str, tuple], float] = {}
+# (metric name, sorted label tuple) → [bucket counts..., sum, count]
+_histograms: Dict[Tuple[str, tuple], list] = {}
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def start_run(run_id: Optional[str] = None) -> str:
+    """Set the trace id for every span opened in this context."""
+    run_id = run_id or new_run_id()
+    _run_id.set(run_id)
+    return run_id
+
+
+def current_run_id() -> str:
+    return _run_id.get()
+
+
+# ---------------------------------------------------------
+#   METRICS
+# ---------------------------------------------------------
+def _key(name: str, labels: Optional[dict]) -> Tuple[str, tuple]:
+    return name, tuple(sorted((labels or {}).items()))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """Increment a Prometheus counter."""
+    if not ENABLE_TELEMETRY:
+        return
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record one observation into a Prometheus histogram."""
+    if not ENABLE_TELEMETRY:
+        return
+    k = _key(name, labels)
+    with _lock:
+        h = _histograms.get(k)
+        if h is None:
+            h = [0] * (len(DURATION_BUCKETS) + 2)
+            _histograms[k] = h
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+# ---------------------------------------------------------
+#   SPANS
+# ---------------------------------------------------------
+class Span:
+    """One timed unit of work (a stage or an external call)."""
+
+    __slots__ = ("name", "span_id", "parent_id", "trace_id", "start", "attrs", "status")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: dict):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else (_run_id.get() or start_run())
+        self.start = time.time()
+        self.attrs = dict(attrs)
+        self.status = "ok"
+
+    def set(self, key: str, value) -> None:
+        self.attrs[key] = value
+
+    def add(self, key: str, value: float = 1) -> None:
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+
+class _NoopSpan:
+    """Returned when telemetry is disabled so call sites stay unconditional."""
+
+    def set(self, key: str, value) -> None:
+        pass
+
+    def add(self, key: str, value: float = 1) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def current_span():
+    """The innermost open span (a no-op span when there is none)."""
+    return _current_span.get() or _NOOP
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block of work and record it as a trace span."""
+    if not ENABLE_TELEMETRY:
+        yield _NOOP
+        return
+
+    s = Span(name, _current_span.get(), attrs)
+    token = _current_span.set(s)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "error"
+        s.attrs["error"] = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        duration = time.perf_counter() - t0
+        _current_span.reset(token)
+        _finish(s, duration)
+
+
+def traced(name: str):
+    """
+    Decorator form of span() for stage entry points. Each call also runs
+    under its share of the run deadline; stages selected by PROFILE_STAGES
+    are wrapped with the CPU/memory profiler.
+    """
+
+    def decorator(fn):
+        # deferred: both modules import telemetry
+        from profiling import profiled
+        from deadlines import stage_deadline
+
+        if inspect.iscoroutinefunction(fn):
+            # cProfile cannot attribute time across awaits; async stages are only traced.
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name), stage_deadline(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        inner = profiled(fn, name)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name), stage_deadline(name):
+                return inner(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _finish(s: Span, duration: float) -> None:
+    record = {
+        "trace_id": s.trace_id,
+        "span_id": s.span_id,
+        "parent_id": s.parent_id,
+        "name": s.name,
+        "start": round(s.start, 6),
+        "duration_s": round(duration, 6),
+        "status": s.status,
+        "attrs": s.attrs,
+    }
+    with _lock:
+        _finished.append(record)
+
+    observe("leninware_span_duration_seconds", duration, span=s.name)
+    inc("leninware_spans_total", span=s.name, status=s.status)
+
+    for attr, metric in (
+        ("bytes_in", "leninware_bytes_in_total"),
+        ("bytes_out", "leninware_bytes_out_total"),
+        ("retries", "leninware_retries_total"),
+    ):
+        if s.attrs.get(attr):
+            inc(metric, s.attrs[attr], span=s.name)
+
+
+def record_openai_usage(s, response, model: str) -> None:
+    """Copy `response.usage` token counts onto a span and the token counters."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+
+    for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = getattr(usage, field, None)
+        if value is None:
+            continue
+        s.set(field, value)
+        if field != "total_tokens":
+            inc("leninware_openai_tokens_total", value, model=model, kind=field.split("_")[0])
+
+
+# ---------------------------------------------------------
+#   EXPORT
+# ---------------------------------------------------------
+def _escape(value) -> str:
+    """Escape backslash, double quote and newline in a label value (Prometheus text format)."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render_prometheus() -> str:
+    """Render all counters and histograms in Prometheus text format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    lines = []
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), h in sorted(histograms.items()):
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        for bound, count in zip(DURATION_BUCKETS, h):
+            le = _format_labels(labels, 'le="%s"' % bound)
+            lines.append(f"{name}_bucket{le} {count}")
+        le = _format_labels(labels, 'le="+Inf"')
+        lines.append(f"{name}_bucket{le} {h[-1]}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {round(h[-2], 6)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {h[-1]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def flush(directory: str = TELEMETRY_DIR) -> None:
+    """Append finished spans to the JSONL trace file and rewrite the metrics file."""
+    if not ENABLE_TELEMETRY:
+        return
+
+    with _lock:
+        pending = list(_finished)
+        _finished.clear()
+        empty = not (_counters or _histograms)
+
+    if not pending and empty:
+        return
+
+    os.makedirs(directory, exist_ok=True)
+
+    if pending:
+        with open(os.path.join(directory, TRACE_FILE), "a", encoding="utf-8") as f:
+            for record in pending:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    tmp = os.path.join(directory, METRICS_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, os.path.join(directory, METRICS_FILE))
+
+    if pending:
+        from pipeline_logging import get_logger  # deferred: pipeline_logging imports telemetry
+        get_logger("telemetry").info(f"Flushed {len(pending)} spans → {directory}")
+
+
+atexit.register(flush)
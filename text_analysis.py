@@ -0,0 +1,85 @@
+# text_analysis.py
+
+import re
+from typing import Optional
+
+from config import LANGUAGE_MODE
+from token_budget import count_tokens
+
+# Only this much of a document is scanned; language and word density are
+# estimated from it, length is exact.
+SAMPLE_CHARS = 8000
+
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+# Most frequent function words; running speech or prose in either language
+# is roughly 40% these, other languages almost none.
+_EN = (
+    "the a an and or but of to in on at for with from by is are was were be been "
+    "it this that these those i you he she we they not no so do does did have has "
+    "had will would can could what which who there their his her my your our as if"
+)
+_ES = (
+    "el la los las un una unos unas y o pero de del al en con por para es son fue "
+    "era ser está están que qué no sí se lo le les su sus mi tu nuestro como cómo "
+    "cuando porque hay muy más este esta esto ese esa yo tú él ella nosotros ellos"
+)
+LANGS = ("en", "es")
+
+
+def _stopword_table() -> dict:
+    """word → (is English stopword, is Spanish stopword); one dict lookup per word."""
+    en, es = set(_EN.split()), set(_ES.split())
+    return {w: (int(w in en), int(w in es)) for w in en | es}
+
+
+_STOPWORDS = _stopword_table()
+
+# Stopword share at which language confidence reaches 1.0.
+_FULL_CONFIDENCE_SHARE = 0.25
+# Below this confidence the configured language is assumed instead.
+MIN_CONFIDENCE = 0.3
+
+
+def analyze(text: str) -> dict:
+    """
+    One pass over a bounded sample of text:
+
+        lang              "en" / "es" / "" (no words)
+        lang_confidence   0-1, from stopword share
+        chars             exact length
+        words             estimated from the sample's density
+        tokens            approximate OpenAI tokens (calibrated, see token_budget.py)
+
+    Compute this once per document and pass it along with the text.
+    """
+    text = text or ""
+    sample = text[:SAMPLE_CHARS].lower()
+
+    words = en = es = 0
+    stop = _STOPWORDS
+    for m in _WORD_RE.finditer(sample):
+        words += 1
+        hit = stop.get(m.group())
+        if hit:
+            en += hit[0]
+            es += hit[1]
+
+    lang, hits = ("es", es) if es > en else ("en", en)
+    if not words:
+        lang = ""
+
+    return {
+        "lang": lang,
+        "lang_confidence": round(min(hits / max(words, 1) / _FULL_CONFIDENCE_SHARE, 1.0), 3),
+        "chars": len(text),
+        "words": round(words * len(text) / len(sample)) if sample else 0,
+        "tokens": count_tokens(len(text)),
+    }
+
+
+def resolve_language(analysis: Optional[dict]) -> str:
+    """The detected language, or LANGUAGE_MODE when nothing was detected confidently."""
+    if analysis and analysis["lang"] and analysis["lang_confidence"] >= MIN_CONFIDENCE:
+        return analysis["lang"]
+    return LANGUAGE_MODE if LANGUAGE_MODE in LANGS else "en"
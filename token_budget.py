@@ -0,0 +1,275 @@
+# token_budget.py
+
+import atexit
+import json
+import math
+import threading
+from typing import Callable, Dict, Optional
+
+from config import LLM_TOKEN_BUDGETS, OPENAI_PRICES, TOKEN_CALIBRATION_PATH
+from telemetry import current_span, inc
+from workspace import atomic_write, file_lock
+from pipeline_logging import get_logger
+
+log = get_logger("tokens")
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Context window and maximum completion per model.
+MODEL_LIMITS = {
+    "gpt-4o-mini": (128_000, 16_384),
+}
+_FALLBACK_LIMITS = (16_000, 4_096)
+
+# Uncalibrated defaults: ~4 chars per token, and a chat message costs a few
+# tokens of framing on top of its content.
+CHARS_PER_TOKEN = 4.0
+MESSAGE_OVERHEAD_TOKENS = 4
+# Assumed until a model has been observed: time to first token + per-token time.
+DEFAULT_LATENCY = (0.8, 0.012)
+
+# Older observations fade out so the estimate follows model/tokenizer changes.
+_DECAY = 0.98
+# Observed prompt tokens before the learned ratio replaces the default.
+_MIN_CALIBRATION_TOKENS = 2_000
+# Observations between saves of the calibration file (and one more at exit).
+_SAVE_EVERY = 20
+# Tokens left unused at the top of the context (estimate error).
+_CONTEXT_MARGIN = 256
+
+
+def parse_budgets(spec: str) -> Dict[str, tuple]:
+    """Parse "summary=3000/900,safety=8000/1200" into stage → (input tokens, output tokens)."""
+    budgets = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        stage, _, value = part.partition("=")
+        max_in, _, max_out = value.partition("/")
+        budgets[stage.strip()] = (int(max_in or 0), int(max_out or 0))
+    return budgets
+
+
+def parse_prices(spec: str) -> Dict[str, tuple]:
+    """Parse "gpt-4o-mini=0.15/0.60" into model → (USD per 1M input, per 1M output tokens)."""
+    prices = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        model, _, value = part.partition("=")
+        p_in, _, p_out = value.partition("/")
+        prices[model.strip()] = (float(p_in or 0), float(p_out or 0))
+    return prices
+
+
+_BUDGETS = parse_budgets(LLM_TOKEN_BUDGETS)
+_PRICES = parse_prices(OPENAI_PRICES)
+
+
+def _empty() -> dict:
+    return {"chars": 0.0, "tokens": 0.0, "latency": [0.0] * 5}
+
+
+class TokenEstimator:
+    """
+    Offline token and latency estimates per model, calibrated from
+    `response.usage` of earlier calls:
+
+        prompt tokens   ≈ prompt chars / learned chars-per-token
+        latency         ≈ a + b · completion tokens  (least squares)
+
+    Sums decay with every observation. Every _SAVE_EVERY observations and
+    at exit they are merged into a small JSON file (under a file lock,
+    rewritten atomically), so the calibration carries across runs and
+    concurrent processes add to each other's instead of overwriting it.
+    """
+
+    def __init__(self, path: str = TOKEN_CALIBRATION_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._models: Dict[str, dict] = self._read()
+        # Per model: observations since the last save and their decayed sums.
+        self._pending: Dict[str, dict] = {}
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self) -> None:
+        """Merge the pending observations into the file and reload it."""
+        with self._lock:
+            if not self._pending:
+                return
+            try:
+                with file_lock(self.path):
+                    models = self._read()
+                    for model, p in self._pending.items():
+                        # The file's sums are older than everything observed here.
+                        m = models.setdefault(model, _empty())
+                        k = _DECAY ** p["n"]
+                        m["chars"] = m["chars"] * k + p["chars"]
+                        m["tokens"] = m["tokens"] * k + p["tokens"]
+                        k = _DECAY ** p["timed"]
+                        m["latency"] = [v * k + d for v, d in zip(m["latency"], p["latency"])]
+                    atomic_write(self.path, json.dumps(models, indent=2).encode("utf-8"))
+            except OSError as e:
+                log.warning(f"Could not save token calibration: {e}")
+                return
+            self._models = models
+            self._pending = {}
+
+    # -----------------------------------------------------
+    #   ESTIMATES
+    # -----------------------------------------------------
+    def chars_per_token(self, model: str = DEFAULT_MODEL) -> float:
+        m = self._models.get(model)
+        if not m or m["tokens"] < _MIN_CALIBRATION_TOKENS:
+            return CHARS_PER_TOKEN
+        return m["chars"] / m["tokens"]
+
+    def count(self, chars: int, model: str = DEFAULT_MODEL) -> int:
+        return math.ceil(chars / self.chars_per_token(model))
+
+    def chars_for(self, tokens: int, model: str = DEFAULT_MODEL) -> int:
+        return int(tokens * self.chars_per_token(model))
+
+    def prompt_tokens(self, request: dict) -> int:
+        model = request.get("model", DEFAULT_MODEL)
+        tokens = 0
+        for msg in request.get("messages") or []:
+            tokens += self.count(len(msg.get("content") or ""), model) + MESSAGE_OVERHEAD_TOKENS
+        for field in ("prompt", "input"):
+            if isinstance(request.get(field), str):
+                tokens += self.count(len(request[field]), model)
+        return tokens
+
+    def latency(self, completion_tokens: int, model: str = DEFAULT_MODEL) -> float:
+        a, b = DEFAULT_LATENCY
+        lat = (self._models.get(model) or {}).get("latency")
+        if lat:
+            n, sx, sy, sxx, sxy = lat
+            denom = n * sxx - sx * sx
+            if n >= 3 and denom > 1e-9:
+                b = max((n * sxy - sx * sy) / denom, 0.0)
+                a = max((sy - b * sx) / n, 0.0)
+        return a + b * completion_tokens
+
+    # -----------------------------------------------------
+    #   CALIBRATION
+    # -----------------------------------------------------
+    def observe(self, model: str, request: dict, usage, elapsed_s: float) -> None:
+        """Fold one completed call's usage (and wall time) into the model's calibration."""
+        prompt = getattr(usage, "prompt_tokens", None)
+        completion = getattr(usage, "completion_tokens", None)
+        if not prompt:
+            return
+        messages = request.get("messages") or []
+        chars = sum(len(m.get("content") or "") for m in messages)
+        content_tokens = prompt - MESSAGE_OVERHEAD_TOKENS * len(messages)
+        if chars <= 0 or content_tokens <= 0:
+            return
+
+        with self._lock:
+            p = self._pending.setdefault(model, dict(_empty(), n=0, timed=0))
+            p["n"] += 1
+            p["timed"] += bool(completion)
+            for m in (self._models.setdefault(model, _empty()), p):
+                m["chars"] = m["chars"] * _DECAY + chars
+                m["tokens"] = m["tokens"] * _DECAY + content_tokens
+                if completion:
+                    x, y = float(completion), float(elapsed_s)
+                    m["latency"] = [v * _DECAY + d for v, d in zip(m["latency"], (1.0, x, y, x * x, x * y))]
+            due = sum(q["n"] for q in self._pending.values()) >= _SAVE_EVERY
+        if due:
+            self.save()
+        log.debug(f"{model}: {chars} chars → {content_tokens} tokens; now {self.chars_per_token(model):.2f} chars/token")
+
+
+_estimator: Optional[TokenEstimator] = None
+_estimator_lock = threading.Lock()
+
+
+def get_estimator() -> TokenEstimator:
+    global _estimator
+    with _estimator_lock:
+        if _estimator is None:
+            _estimator = TokenEstimator()
+            atexit.register(_estimator.save)
+        return _estimator
+
+
+def count_tokens(chars: int, model: str = DEFAULT_MODEL) -> int:
+    """Shortcut for get_estimator().count(...)."""
+    return get_estimator().count(chars, model)
+
+
+# ---------------------------------------------------------
+#   PLANNING
+# ---------------------------------------------------------
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD at OPENAI_PRICES (0 for models without a price)."""
+    p_in, p_out = _PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * p_in + completion_tokens * p_out) / 1e6
+
+
+def _fit_text(text: str, tokens: int, model: str) -> str:
+    """Cut text to about `tokens` tokens, at a word boundary where possible."""
+    est = get_estimator()
+    if est.count(len(text), model) <= tokens:
+        return text
+    limit = max(est.chars_for(max(tokens, 0), model), 0)
+    cut = text[:limit]
+    space = cut.rfind(" ", int(limit * 0.9))
+    return cut[:space] if space > 0 else cut
+
+
+def size_request(
+    stage: str,
+    build: Callable[[str], dict],
+    text: str,
+    target_output: Optional[int] = None,
+    min_output: int = 0,
+) -> dict:
+    """
+    Build a chat request for `stage` with its variable input `text` trimmed
+    to the stage's input budget and the room left in the model's context
+    window, and `max_tokens` set to the target output length (the stage's
+    LLM_TOKEN_BUDGETS value unless given, and at least `min_output`). Logs
+    and records the expected tokens, cost and latency on the current span
+    before the call is made.
+
+    `build(text)` must return the complete request for a given input text.
+    """
+    est = get_estimator()
+    cap_in, budget_out = _BUDGETS.get(stage, (0, 0))
+
+    request = build("")
+    model = request.get("model", DEFAULT_MODEL)
+    context, max_completion = MODEL_LIMITS.get(model, _FALLBACK_LIMITS)
+    out = target_output or budget_out or request.get("max_tokens") or max_completion
+    out = min(max(out, min_output), max_completion)
+
+    fixed = est.prompt_tokens(request)
+    room = context - out - _CONTEXT_MARGIN - fixed
+    if cap_in > 0:
+        room = min(room, cap_in - fixed)
+    fitted = _fit_text(text, room, model)
+    if len(fitted) < len(text):
+        log.info(f"{stage}: input trimmed to ~{room} tokens ({len(text)} → {len(fitted)} chars)")
+        inc("leninware_llm_input_trimmed_total", stage=stage)
+
+    request = build(fitted)
+    prompt = est.prompt_tokens(request)
+    request["max_tokens"] = max(min(out, context - prompt - _CONTEXT_MARGIN), 1)
+
+    cost = estimate_cost(model, prompt, request["max_tokens"])
+    latency = est.latency(request["max_tokens"], model)
+    sp = current_span()
+    sp.set("est_prompt_tokens", prompt)
+    sp.set("max_tokens", request["max_tokens"])
+    sp.set("est_cost_usd", round(cost, 6))
+    sp.set("est_latency_s", round(latency, 2))
+    log.info(
+        f"{stage}: ~{prompt} prompt + ≤{request['max_tokens']} completion tokens "
+        f"(context {context}), est ${cost:.5f}, ~{latency:.1f}s"
+    )
+    return request
@@ -1,10 +1,17 @@
 # transcript_fetcher.py
 
 import re
-import requests
-from config import USE_MOCK_AI, TRANSCRIPT_API_KEY
+from config import USE_MOCK_AI, TRANSCRIPT_API_KEY, TRANSCRIPT_API_V2_URL
+import http_client
+import async_http
+import hedging
+from telemetry import span, traced
+from pipeline_logging import get_logger
 
-TRANSCRIPT_API_URL = "https://transcriptapi.com/api/v2/youtube/transcript"
+log = get_logger("transcript")
+mock_log = get_logger("transcript:mock")
+
+TRANSCRIPT_API_URL = f"{TRANSCRIPT_API_V2_URL}/transcript"
 
 
 def _extract_video_id(url_or_id: str) -> str:
@@ -21,37 +28,23 @@ def _extract_video_id(url_or_id: str) -> str:
         m = re.search(p, url_or_id)
         if m:
             extracted = m.group(1)
-            print(f"[transcript] Extracted video ID: {extracted}")
+            log.debug(f"Extracted video ID: {extracted}")
             return extracted
 
-    print(f"[transcript] Using raw ID: {url_or_id.strip()}")
+    log.debug(f"Using raw ID: {url_or_id.strip()}")
     return url_or_id.strip()
 
 
-def fetch_transcript(video_url_or_id: str) -> str | None:
-    """
-    Fetch transcript from transcriptAPI.com.
-    In MOCK MODE, returns a fixed dummy transcript instead of calling API.
-    """
-
-    print(f"[transcript] Fetching transcript for: {video_url_or_id}")
+def _mock_transcript(video_id: str) -> str:
+    mock_log.info(f"Returning mock transcript for {video_id}")
+    return (
+        "This is a mock transcript for video ID "
+        f"{video_id}. It simulates a real transcript so "
+        "the pipeline can run without using TranscriptAPI."
+    )
 
-    video_id = _extract_video_id(video_url_or_id)
 
-    # ----------------------------------------------------
-    # MOCK MODE — return free dummy transcript
-    # ----------------------------------------------------
-    if USE_MOCK_AI:
-        print(f"[transcript:mock] Returning mock transcript for {video_id}")
-        return (
-            "This is a mock transcript for video ID "
-            f"{video_id}. It simulates a real transcript so "
-            "the pipeline can run without using TranscriptAPI."
-        )
-
-    # ----------------------------------------------------
-    # REAL MODE — call transcriptAPI.com
-    # ----------------------------------------------------
+def _request_args(video_id: str) -> dict:
     headers = {
         "Authorization": f"Bearer {TRANSCRIPT_API_KEY}"
     }
@@ -61,53 +54,107 @@ def fetch_transcript(video_url_or_id: str) -> str | None:
         "format": "json",
     }
 
-    print(f"[transcript] Requesting transcript from API: {TRANSCRIPT_API_URL}")
-    print(f"[transcript] Params: {params}")
+    log.info(f"Requesting transcript from API: {TRANSCRIPT_API_URL}")
+    log.debug(f"Params: {params}")
+    return {"params": params, "headers": headers}
 
-    try:
-        resp = requests.get(
-            TRANSCRIPT_API_URL,
-            params=params,
-            headers=headers,
-            timeout=30,
-        )
-    except Exception as e:
-        print(f"[transcript] NETWORK ERROR fetching transcript: {e}")
-        return None
+
+def _parse_response(resp) -> str | None:
+    """Shared by the sync and async clients (requests / httpx responses)."""
 
     # Not 200 → fail
     if resp.status_code != 200:
-        print(f"[transcript] HTTP {resp.status_code} — {resp.text[:300]}")
+        log.warning(f"HTTP {resp.status_code} — {resp.text[:300]}")
         return None
 
     # Try JSON parse
     try:
         data = resp.json()
     except Exception as e:
-        print(f"[transcript] ERROR parsing JSON: {e}")
+        log.error(f"parsing JSON: {e}")
         return None
 
     # API-level errors
     if "error" in data:
-        print(f"[transcript] API ERROR: {data['error']}")
+        log.error(f"API ERROR: {data['error']}")
         return None
 
     transcript = data.get("transcript")
     if not transcript:
-        print("[transcript] Transcript missing or empty in API response")
+        log.warning("Transcript missing or empty in API response")
         return None
 
     # transcriptAPI usually returns list of chunks
+    # (one caption per line, so the normalizer can see segment boundaries)
     if isinstance(transcript, list):
-        print(f"[transcript] Received {len(transcript)} transcript chunks")
-        merged = " ".join(chunk.get("text", "") for chunk in transcript)
-        print(f"[transcript] Transcript merged length: {len(merged)} chars")
+        log.info(f"Received {len(transcript)} transcript chunks")
+        merged = "\n".join(chunk.get("text", "") for chunk in transcript)
+        log.info(f"Transcript merged length: {len(merged)} chars")
         return merged
 
     # Rare: raw string
     if isinstance(transcript, str):
-        print(f"[transcript] Received raw transcript string ({len(transcript)} chars)")
+        log.info(f"Received raw transcript string ({len(transcript)} chars)")
         return transcript
 
-    print(f"[transcript] Unexpected transcript format: {type(transcript)}")
-    return None
\ No newline at end of file
+    log.warning(f"Unexpected transcript format: {type(transcript)}")
+    return None
+
+
+@traced("stage.transcript")
+def fetch_transcript(video_url_or_id: str) -> str | None:
+    """
+    Fetch transcript from transcriptAPI.com.
+    In MOCK MODE, returns a fixed dummy transcript instead of calling API.
+    """
+
+    log.info(f"Fetching transcript for: {video_url_or_id}")
+
+    video_id = _extract_video_id(video_url_or_id)
+
+    # ----------------------------------------------------
+    # MOCK MODE — return free dummy transcript
+    # ----------------------------------------------------
+    if USE_MOCK_AI:
+        return _mock_transcript(video_id)
+
+    # ----------------------------------------------------
+    # REAL MODE — call transcriptAPI.com
+    # ----------------------------------------------------
+    args = _request_args(video_id)
+
+    try:
+        with span("http.transcriptapi", video_id=video_id) as sp:
+            resp = hedging.hedged("transcript", lambda: http_client.get(TRANSCRIPT_API_URL, **args))
+            sp.set("status_code", resp.status_code)
+            sp.set("bytes_in", len(resp.content))
+    except Exception as e:
+        log.error(f"NETWORK ERROR fetching transcript: {e}")
+        return None
+
+    return _parse_response(resp)
+
+
+@traced("stage.transcript")
+async def fetch_transcript_async(video_url_or_id: str) -> str | None:
+    """Async fetch_transcript(): same result and mock behavior, on async_http."""
+
+    log.info(f"Fetching transcript for: {video_url_or_id}")
+
+    video_id = _extract_video_id(video_url_or_id)
+
+    if USE_MOCK_AI:
+        return _mock_transcript(video_id)
+
+    args = _request_args(video_id)
+
+    try:
+        with span("http.transcriptapi", video_id=video_id) as sp:
+            resp = await hedging.ahedged("transcript", lambda: async_http.get(TRANSCRIPT_API_URL, **args))
+            sp.set("status_code", resp.status_code)
+            sp.set("bytes_in", len(resp.content))
+    except Exception as e:
+        log.error(f"NETWORK ERROR fetching transcript: {e}")
+        return None
+
+    return _parse_response(resp)
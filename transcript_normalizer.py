@@ -0,0 +1,90 @@
+# transcript_normalizer.py
+
+import re
+from typing import Iterable, Iterator, List
+
+from telemetry import traced, current_span, inc
+from pipeline_logging import get_logger
+
+log = get_logger("normalize")
+
+# Auto-captions roll: each caption often repeats the tail of the previous
+# one. Overlaps longer than MAX_OVERLAP_WORDS are not looked for; a single
+# repeated word ("very, very") is kept as speech.
+MAX_OVERLAP_WORDS = 16
+MIN_OVERLAP_WORDS = 2
+
+# Non-speech: [Music], [Applause], ♪, (laughs), ">>" speaker-change markers.
+_TAG_RE = re.compile(
+    r"\[[^\]\n]{0,40}\]|♪+|>>+|\((?:music|applause|laughter|laughs|inaudible|música|aplausos|risas)\)",
+    re.IGNORECASE,
+)
+# Hesitations only; words like "like" or "so" carry meaning too often.
+_FILLER_RE = re.compile(
+    r"(?<![\w'])(?:u+[hm]+|e+r+m*|a+h+|h*m{2,}|eh+|mhm)(?![\w'])[,.]?",
+    re.IGNORECASE,
+)
+_SPACE_RE = re.compile(r"\s+")
+_PUNCT_SPACE_RE = re.compile(r"\s+([,.!?;:])")
+_KEY_STRIP = ".,!?;:\"'()-–—…"
+
+
+def _clean(segment: str) -> str:
+    text = _TAG_RE.sub(" ", segment)
+    text = _FILLER_RE.sub(" ", text)
+    text = _SPACE_RE.sub(" ", text).strip()
+    return _PUNCT_SPACE_RE.sub(r"\1", text)
+
+
+def _key(word: str) -> str:
+    return word.strip(_KEY_STRIP).lower()
+
+
+def _overlap(tail: List[str], head: List[str]) -> int:
+    """Longest n such that the last n words of tail equal the first n of head."""
+    for n in range(min(len(tail), len(head)), MIN_OVERLAP_WORDS - 1, -1):
+        if tail[-n:] == head[:n]:
+            return n
+    return 0
+
+
+def normalize_segments(segments: Iterable[str]) -> Iterator[str]:
+    """
+    Clean caption segments one at a time: drop non-speech tags and filler,
+    collapse whitespace and strip words that repeat the end of the previous
+    segment. Work per segment is bounded by MAX_OVERLAP_WORDS, so the whole
+    transcript is processed in linear time.
+    """
+    tail: List[str] = []  # comparison keys of the last words emitted
+    for segment in segments:
+        words = _clean(segment).split(" ")
+        if words == [""]:
+            continue
+        keys = [_key(w) for w in words[:MAX_OVERLAP_WORDS]]
+        skip = _overlap(tail, keys)
+        words = words[skip:]
+        if not words:
+            continue
+        tail = (tail + [_key(w) for w in words[-MAX_OVERLAP_WORDS:]])[-MAX_OVERLAP_WORDS:]
+        yield " ".join(words)
+
+
+@traced("stage.normalize")
+def normalize_transcript(transcript: str) -> str:
+    """
+    Normalized transcript for the summarizer. Caption segments are the
+    lines of the fetched transcript (see transcript_fetcher._parse_response).
+    """
+    text = transcript or ""
+    normalized = " ".join(normalize_segments(text.splitlines()))
+
+    saved = len(text) - len(normalized)
+    sp = current_span()
+    sp.set("chars_in", len(text))
+    sp.set("chars_out", len(normalized))
+    inc("leninware_transcript_chars_removed_total", max(saved, 0))
+    log.info(
+        f"Normalized transcript: {len(text)} → {len(normalized)} chars "
+        f"({saved / max(len(text), 1):.0%} removed)"
+    )
+    return normalized
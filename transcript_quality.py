@@ -0,0 +1,106 @@
+# transcript_quality.py
+
+import re
+from typing import Optional
+
+from config import (
+    ENABLE_QUALITY_GATE,
+    QUALITY_MIN_WORDS,
+    QUALITY_MAX_REPETITION,
+    QUALITY_MAX_TAG_SHARE,
+    QUALITY_MIN_LANG_CONFIDENCE,
+    QUALITY_MIN_WPM,
+    QUALITY_MAX_WPM,
+)
+from telemetry import span, inc
+from text_analysis import analyze
+from pipeline_logging import get_logger
+
+log = get_logger("quality")
+
+# Caption tags for sound rather than speech: [Music], [Applause], ♪, (laughs) ...
+_TAG_RE = re.compile(
+    r"\[[^\]\n]{1,40}\]|♪+|\((?:music|applause|laughter|laughs|inaudible|música|aplausos|risas)\)",
+    re.IGNORECASE,
+)
+_WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+def _repetition_ratio(words: list) -> float:
+    """Share of word trigrams that already occurred (caption loops, stuck auto-captions)."""
+    if len(words) < 4:
+        return 0.0
+    trigrams = list(zip(words, words[1:], words[2:]))
+    return 1.0 - len(set(trigrams)) / len(trigrams)
+
+
+def score_transcript(
+    text: str,
+    duration_s: Optional[float] = None,
+    analysis: Optional[dict] = None,
+    raw: Optional[str] = None,
+) -> dict:
+    """
+    Local, no-network quality metrics for a transcript. `raw` is the text
+    before normalization, if `text` was normalized; non-speech tags are
+    counted there since normalization removes them.
+
+        words           spoken words (tags removed)
+        repetition      share of repeated word trigrams
+        tag_share       non-speech tags / (tags + words)
+        lang, lang_confidence   from the shared text analysis
+        wpm             words per minute of video (None without duration_s)
+        reasons         thresholds the transcript fails (empty = usable)
+    """
+    tags = _TAG_RE.findall(text if raw is None else raw)
+    words = _WORD_RE.findall(_TAG_RE.sub(" ", text).lower())
+    analysis = analysis or analyze(text)
+    lang, confidence = analysis["lang"], analysis["lang_confidence"]
+    wpm = len(words) / (duration_s / 60.0) if duration_s else None
+
+    report = {
+        "words": len(words),
+        "repetition": round(_repetition_ratio(words), 3),
+        "tag_share": round(len(tags) / max(len(tags) + len(words), 1), 3),
+        "lang": lang,
+        "lang_confidence": round(confidence, 3),
+        "wpm": round(wpm, 1) if wpm is not None else None,
+    }
+
+    reasons = []
+    if report["words"] < QUALITY_MIN_WORDS:
+        reasons.append(f"only {report['words']} words")
+    if report["repetition"] > QUALITY_MAX_REPETITION:
+        reasons.append(f"{report['repetition']:.0%} repeated")
+    if report["tag_share"] > QUALITY_MAX_TAG_SHARE:
+        reasons.append(f"{report['tag_share']:.0%} non-speech tags")
+    if report["lang_confidence"] < QUALITY_MIN_LANG_CONFIDENCE:
+        reasons.append(f"language unclear ({lang or '?'} {report['lang_confidence']:.2f})")
+    if wpm is not None and not QUALITY_MIN_WPM <= wpm <= QUALITY_MAX_WPM:
+        reasons.append(f"{wpm:.0f} words/min over {duration_s:.0f}s")
+    report["reasons"] = reasons
+    return report
+
+
+def check_transcript(
+    text: str,
+    duration_s: Optional[float] = None,
+    analysis: Optional[dict] = None,
+    raw: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Score a transcript; returns the report if it should be rejected, else None.
+    With ENABLE_QUALITY_GATE=false nothing is rejected.
+    """
+    if not ENABLE_QUALITY_GATE:
+        return None
+    with span("quality.transcript") as sp:
+        report = score_transcript(text, duration_s, analysis, raw)
+        for key in ("words", "repetition", "tag_share", "lang_confidence", "wpm"):
+            sp.set(key, report[key])
+        sp.set("rejected", bool(report["reasons"]))
+    if not report["reasons"]:
+        log.debug(f"Transcript quality ok: {report}")
+        return None
+    inc("leninware_transcripts_rejected_total")
+    return report
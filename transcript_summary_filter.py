@@ -1,12 +1,15 @@
 # transcript_summary_filter.py
 
 from typing import Optional
-import re
-from config import USE_MOCK_AI, require_env
-
-if not USE_MOCK_AI:
-    from openai import OpenAI
+from config import USE_MOCK_AI
+import openai_scheduler
+import token_budget
+from text_analysis import analyze, resolve_language
+from telemetry import span, traced, record_openai_usage
+from pipeline_logging import get_logger
 
+log = get_logger("summary")
+mock_log = get_logger("summary:mock")
 
 SYSTEM_PROMPT = """
 You are a political summarizer for long-form video transcripts.
@@ -35,17 +38,6 @@ Format:
 """
 
 
-def _detect_spanish(text: str) -> bool:
-    spanish_markers = [
-        r"\bel\b", r"\bla\b", r"\blos\b", r"\blas\b",
-        r"\bpero\b", r"\bporque\b", r"\buna\b", r"\bun\b",
-        r"\bqué\b", r"\bcómo\b", r"\bhay\b", r"\bestá\b",
-    ]
-    hits = sum(1 for pat in spanish_markers if re.search(pat, text, re.IGNORECASE))
-    ratio = hits / max(len(spanish_markers), 1)
-    return ratio > 0.15
-
-
 def _safe_fallback_summary(transcript: str, channel: str, author: str, title: str) -> str:
     """Minimal fallback if OpenAI errors — now includes metadata."""
     snippet = (transcript or "").strip()
@@ -65,53 +57,22 @@ def _safe_fallback_summary(transcript: str, channel: str, author: str, title: st
     )
 
 
-def summarize_transcript(
-    transcript: str,
-    max_chars: int = 12000,
-    channel_name: str = "",
-    author_name: str = "",
-    video_title: str = ""
-) -> str:
-    """
-    Summarize a long transcript into a structured hybrid summary.
-
-    UPDATED:
-    - Accepts explicit metadata about channel/author/title.
-    - Summary is required to include a 'Source' block so attribution is never lost.
-    """
-
-    raw = (transcript or "").strip()
-    print(f"[summary] Received transcript length: {len(raw)} chars")
-
-    if not raw:
-        print("[summary] ERROR: Empty transcript.")
-        return _safe_fallback_summary("", channel_name, author_name, video_title)
-
-    is_spanish = _detect_spanish(raw)
-    lang = "Spanish" if is_spanish else "English"
-    print(f"[summary] Auto-detected language: {lang}")
+def _mock_summary(channel_name: str, author_name: str, video_title: str) -> str:
+    mock_log.info("Returning deterministic mock summary.")
+    return (
+        "## Source\n"
+        f"- **Channel:** {channel_name}\n"
+        f"- **Author:** {author_name}\n"
+        f"- **Title:** {video_title}\n\n"
+        "## Mock Topic 1: Media framing\n\n"
+        "- Mock summary bullet.\n\n"
+        "## Mock Topic 2: Class analysis\n\n"
+        "- Mock bullet for downstream testing.\n"
+    )
 
-    if USE_MOCK_AI:
-        print("[summary:mock] Returning deterministic mock summary.")
-        return (
-            "## Source\n"
-            f"- **Channel:** {channel_name}\n"
-            f"- **Author:** {author_name}\n"
-            f"- **Title:** {video_title}\n\n"
-            "## Mock Topic 1: Media framing\n\n"
-            "- Mock summary bullet.\n\n"
-            "## Mock Topic 2: Class analysis\n\n"
-            "- Mock bullet for downstream testing.\n"
-        )
-
-    print("[summary] REAL MODE: Calling OpenAI summarizer (gpt-4o-mini)")
-
-    if len(raw) > max_chars:
-        print(f"[summary] Transcript too long; truncating to {max_chars} chars.")
-        raw = raw[:max_chars]
 
-    api_key = require_env("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+def _build_request(raw: str, lang: str, channel_name: str, author_name: str, video_title: str) -> dict:
+    """Chat completion arguments for the summarizer."""
 
     # ---- NEW: metadata block injected for the model ----
     metadata_block = f"""
@@ -139,25 +100,148 @@ Transcript:
 -----
     """.strip()
 
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        "max_tokens": 900,
+        "temperature": 0.5,
+    }
+
+
+def _prepare(transcript: str, analysis: Optional[dict]) -> tuple:
+    """Strip and take the language from the transcript's analysis. Returns (raw, lang)."""
+    raw = (transcript or "").strip()
+    log.info(f"Received transcript length: {len(raw)} chars")
+
+    if not raw:
+        return raw, ""
+
+    lang = "Spanish" if resolve_language(analysis or analyze(raw)) == "es" else "English"
+    log.info(f"Auto-detected language: {lang}")
+    return raw, lang
+
+
+def _truncate(raw: str, max_chars: Optional[int]) -> str:
+    if max_chars and len(raw) > max_chars:
+        log.info(f"Transcript too long; truncating to {max_chars} chars.")
+        raw = raw[:max_chars]
+    return raw
+
+
+def _plan_request(raw: str, lang: str, channel_name: str, author_name: str, video_title: str) -> dict:
+    """The summarizer request with the transcript sized to the "summary" token budget."""
+    return token_budget.size_request(
+        "summary",
+        lambda text: _build_request(text, lang, channel_name, author_name, video_title),
+        raw,
+    )
+
+
+@traced("stage.summary")
+def summarize_transcript(
+    transcript: str,
+    max_chars: Optional[int] = None,
+    channel_name: str = "",
+    author_name: str = "",
+    video_title: str = "",
+    analysis: Optional[dict] = None,
+) -> str:
+    """
+    Summarize a long transcript into a structured hybrid summary.
+
+    UPDATED:
+    - Accepts explicit metadata about channel/author/title.
+    - Summary is required to include a 'Source' block so attribution is never lost.
+    - `analysis` is the transcript's text_analysis.analyze() result, if the
+      caller already has it (the transcript is not scanned again).
+    - The transcript is sized to the "summary" entry of LLM_TOKEN_BUDGETS;
+      max_chars is an optional extra character cap.
+    """
+
+    raw, lang = _prepare(transcript, analysis)
+
+    if not raw:
+        log.error("Empty transcript.")
+        return _safe_fallback_summary("", channel_name, author_name, video_title)
+
+    if USE_MOCK_AI:
+        return _mock_summary(channel_name, author_name, video_title)
+
+    log.info("REAL MODE: Calling OpenAI summarizer (gpt-4o-mini)")
+
+    raw = _truncate(raw, max_chars)
+
+    client = openai_scheduler.get_client()
+
+    request = _plan_request(raw, lang, channel_name, author_name, video_title)
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt},
-            ],
-            max_tokens=900,
-            temperature=0.5,
-        )
+        with span("openai.chat", model="gpt-4o-mini", bytes_out=openai_scheduler.request_chars(request)) as sp:
+            response = openai_scheduler.call(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.LOW,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, response, "gpt-4o-mini")
     except Exception as e:
-        print(f"[summary] ERROR calling OpenAI: {e}")
+        log.error(f"calling OpenAI: {e}")
         return _safe_fallback_summary(raw, channel_name, author_name, video_title)
 
+    return _finish(response, raw, channel_name, author_name, video_title)
+
+
+@traced("stage.summary")
+async def summarize_transcript_async(
+    transcript: str,
+    max_chars: Optional[int] = None,
+    channel_name: str = "",
+    author_name: str = "",
+    video_title: str = "",
+    analysis: Optional[dict] = None,
+) -> str:
+    """Async summarize_transcript(): same result and fallbacks, on AsyncOpenAI."""
+
+    raw, lang = _prepare(transcript, analysis)
+
+    if not raw:
+        log.error("Empty transcript.")
+        return _safe_fallback_summary("", channel_name, author_name, video_title)
+
+    if USE_MOCK_AI:
+        return _mock_summary(channel_name, author_name, video_title)
+
+    log.info("REAL MODE: Calling OpenAI summarizer (gpt-4o-mini)")
+
+    raw = _truncate(raw, max_chars)
+    request = _plan_request(raw, lang, channel_name, author_name, video_title)
+
+    try:
+        client = openai_scheduler.get_async_client()
+        with span("openai.chat", model="gpt-4o-mini", bytes_out=openai_scheduler.request_chars(request)) as sp:
+            response = await openai_scheduler.acall(
+                client.chat.completions.with_raw_response.create,
+                priority=openai_scheduler.LOW,
+                hedge="openai.chat",
+                **request,
+            )
+            record_openai_usage(sp, response, "gpt-4o-mini")
+    except Exception as e:
+        log.error(f"calling OpenAI: {e}")
+        return _safe_fallback_summary(raw, channel_name, author_name, video_title)
+
+    return _finish(response, raw, channel_name, author_name, video_title)
+
+
+def _finish(response, raw: str, channel_name: str, author_name: str, video_title: str) -> str:
     content: Optional[str] = (response.choices[0].message.content or "").strip()
 
     if not content:
-        print("[summary] ERROR: Empty summary from OpenAI.")
+        log.error("Empty summary from OpenAI.")
         return _safe_fallback_summary(raw, channel_name, author_name, video_title)
 
-    print(f"[summary] Summary generated ({len(content)} chars)")
-    return content
\ No newline at end of file
+    log.info(f"Summary generated ({len(content)} chars)")
+    return content
@@ -0,0 +1,235 @@
+# video_ledger.py
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from config import (
+    ENABLE_LEDGER,
+    LEDGER_PATH,
+    LEDGER_STALE_CLAIM_H,
+    LEDGER_MAX_ATTEMPTS,
+)
+from telemetry import inc
+from workspace import file_lock
+from pipeline_logging import get_logger
+
+log = get_logger("ledger")
+
+# Record status of a source video.
+CLAIMED = "claimed"          # a run has picked it and is spending on it
+RENDERED = "rendered"        # reaction video produced (upload off or skipped)
+UPLOADED = "uploaded"        # reaction published
+FAILED = "failed"            # run errored after claiming; retried up to LEDGER_MAX_ATTEMPTS
+RELEASED = "released"        # claimed, then given up before any paid work (e.g. no transcript)
+DUPLICATE = "duplicate"      # transcript nearly identical to one already used (see near_duplicates.py)
+REJECTED = "rejected"        # transcript failed the quality gate (see transcript_quality.py)
+
+DONE_STATUSES = frozenset({RENDERED, UPLOADED, DUPLICATE, REJECTED})
+
+# Rewrite the log once it holds this many superseded records per live entry.
+_COMPACT_RATIO = 4
+_COMPACT_MIN_RECORDS = 1024
+
+
+class VideoLedger:
+    """
+    Durable record of which source videos have been turned into reactions.
+
+    The file is an append-only JSON-lines log (one record per status change);
+    the latest record per video id is held in a dict, so lookups are O(1).
+    Appends from other processes are picked up by reading only the bytes
+    added since the last refresh. Claims take an exclusive file lock, so two
+    concurrent runs cannot both start paying for the same video.
+    """
+
+    def __init__(
+        self,
+        path: str = LEDGER_PATH,
+        stale_claim_h: float = LEDGER_STALE_CLAIM_H,
+        max_attempts: int = LEDGER_MAX_ATTEMPTS,
+    ):
+        self.path = path
+        self.stale_claim_s = stale_claim_h * 3600.0
+        self.max_attempts = max_attempts
+        self._entries: Dict[str, dict] = {}
+        self._offset = 0
+        self._records = 0
+        self._inode = None
+        self._lock = threading.Lock()
+
+    # -----------------------------------------------------
+    #   STORAGE
+    # -----------------------------------------------------
+    def _refresh(self) -> None:
+        """Apply records appended since the last read. Caller holds _lock."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            # First read, or the file was compacted by another process.
+            self._entries.clear()
+            self._offset = 0
+            self._records = 0
+            self._inode = st.st_ino
+        if st.st_size == self._offset:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # ignore a half-written trailing line
+        for line in data[:end].splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            self._entries[rec["video_id"]] = rec
+            self._records += 1
+        self._offset += end
+
+    def _append(self, rec: dict) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self) -> None:
+        """Rewrite the log with only the latest record per video. Caller holds both locks."""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            for rec in self._entries.values():
+                f.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        st = os.stat(self.path)
+        self._inode, self._offset, self._records = st.st_ino, st.st_size, len(self._entries)
+        log.debug(f"Compacted ledger to {len(self._entries)} entries")
+
+    def _write(self, video_id: str, status: str, **fields) -> dict:
+        """Append a status change for video_id. Caller holds both locks and has refreshed."""
+        now = time.time()
+        prev = self._entries.get(video_id) or {}
+        rec = {
+            "video_id": video_id,
+            "status": status,
+            "first_seen": prev.get("first_seen", now),
+            "updated_at": now,
+            "attempts": prev.get("attempts", 0) + (status == CLAIMED),
+        }
+        for key in ("title", "channel", "run_id", "upload_id", "duplicate_of"):
+            if key in prev:
+                rec[key] = prev[key]
+        rec.update({k: v for k, v in fields.items() if v is not None})
+
+        self._append(rec)
+        self._entries[video_id] = rec
+        self._records += 1
+        self._offset = os.path.getsize(self.path)
+        inc("leninware_ledger_writes_total", status=status)
+
+        if self._records >= max(_COMPACT_MIN_RECORDS, _COMPACT_RATIO * len(self._entries)):
+            self._compact()
+        return rec
+
+    # -----------------------------------------------------
+    #   QUERIES
+    # -----------------------------------------------------
+    def get(self, video_id: str) -> Optional[dict]:
+        with self._lock:
+            self._refresh()
+            rec = self._entries.get(video_id)
+            return dict(rec) if rec else None
+
+    def _blocks(self, rec: Optional[dict], now: float) -> Optional[str]:
+        """Why a video must not be processed again (None = free to use)."""
+        if rec is None:
+            return None
+        status = rec["status"]
+        if status in DONE_STATUSES:
+            return status
+        if status == CLAIMED and now - rec["updated_at"] < self.stale_claim_s:
+            return "in progress"
+        if rec.get("attempts", 0) >= self.max_attempts:
+            return f"{rec['attempts']} failed attempts"
+        return None
+
+    def filter_new(self, candidates: Iterable[dict]) -> List[dict]:
+        """Drop candidates already processed, uploaded or claimed by a live run."""
+        now = time.time()
+        kept, dropped = [], 0
+        with self._lock:
+            self._refresh()
+            for c in candidates:
+                reason = self._blocks(self._entries.get(c["video_id"]), now)
+                if reason:
+                    dropped += 1
+                    log.debug(f"Skipping {c['video_id']} ({reason})")
+                else:
+                    kept.append(c)
+        if dropped:
+            inc("leninware_ledger_skipped_total", dropped)
+            log.info(f"Ledger: skipped {dropped} already-processed candidate(s), {len(kept)} left")
+        return kept
+
+    # -----------------------------------------------------
+    #   STATUS CHANGES
+    # -----------------------------------------------------
+    def claim(self, candidate: dict, run_id: str = "") -> bool:
+        """
+        Atomically mark a candidate as taken by this run. Returns False if
+        another run (in any process) already holds or finished it.
+        """
+        video_id = candidate["video_id"]
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            reason = self._blocks(self._entries.get(video_id), time.time())
+            if reason:
+                log.info(f"Ledger: {video_id} not available ({reason})")
+                return False
+            self._write(
+                video_id, CLAIMED,
+                title=candidate.get("title"),
+                channel=candidate.get("channel"),
+                run_id=run_id or None,
+            )
+        return True
+
+    def mark(self, video_id: str, status: str, **fields) -> None:
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            self._write(video_id, status, **fields)
+
+
+class _DisabledLedger:
+    """ENABLE_LEDGER=false: every candidate is new and nothing is recorded."""
+
+    def get(self, video_id: str) -> Optional[dict]:
+        return None
+
+    def filter_new(self, candidates: Iterable[dict]) -> List[dict]:
+        return list(candidates)
+
+    def claim(self, candidate: dict, run_id: str = "") -> bool:
+        return True
+
+    def mark(self, video_id: str, status: str, **fields) -> None:
+        pass
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = VideoLedger() if ENABLE_LEDGER else _DisabledLedger()
+        return _ledger
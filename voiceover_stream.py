@@ -0,0 +1,271 @@
+# voiceover_stream.py
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import List, Optional, Tuple
+from config import (
+    USE_MOCK_AI,
+    LANGUAGE_MODE,
+    LENINWARE_LANG_MODE,
+    SAFETY_MODE,
+    STREAM_TTS_MIN_CHARS,
+    STREAM_TTS_CONCURRENCY,
+)
+import openai_scheduler
+from telemetry import traced, current_span, inc
+from leninware_commentary import (
+    generate_leninware_commentary,
+    generate_leninware_commentary_async,
+    stream_leninware_commentary,
+    stream_leninware_commentary_async,
+)
+from script_safety_filter import (
+    apply_script_safety_filter,
+    apply_script_safety_filter_async,
+    load_patterns,
+    load_safety_prompt,
+    rewrite_sentence,
+    rewrite_sentence_async,
+    screen_sentences,
+    split_sentences,
+)
+from audio_generator import (
+    generate_tts_audio,
+    generate_tts_audio_async,
+    select_voice,
+    synthesize_pcm,
+    synthesize_pcm_async,
+    write_wav,
+)
+from pipeline_logging import get_logger
+
+log = get_logger("voiceover")
+
+
+class SentenceBuffer:
+    """Cuts streamed text into sentences (split_sentences()) as soon as each one is complete."""
+
+    def __init__(self):
+        self._tail = ""
+
+    def feed(self, delta: str) -> List[str]:
+        self._tail += delta
+        parts = split_sentences(self._tail)
+        if len(parts) < 2:
+            return []
+        # The last piece may still grow; everything before it is final.
+        self._tail = parts[-1]
+        return parts[:-1]
+
+    def flush(self) -> List[str]:
+        rest, self._tail = self._tail, ""
+        return [rest] if rest else []
+
+
+class _Units:
+    """
+    Groups finished sentences into TTS units of at least STREAM_TTS_MIN_CHARS
+    (one speech request per sentence would be slow and choppy) and hands
+    each unit, with the sentence before it as context, to `dispatch`.
+    """
+
+    def __init__(self, dispatch):
+        self.dispatch = dispatch
+        self.buffer = SentenceBuffer()
+        self.pending: List[str] = []
+        self.before = ""
+
+    def on_text(self, delta: str) -> None:
+        for sentence in self.buffer.feed(delta):
+            self.pending.append(sentence)
+            if sum(len(s) for s in self.pending) >= STREAM_TTS_MIN_CHARS:
+                self._send()
+
+    def close(self) -> None:
+        self.pending.extend(self.buffer.flush())
+        if self.pending:
+            self._send()
+
+    def _send(self) -> None:
+        unit, self.pending = self.pending, []
+        self.dispatch(unit, self.before)
+        self.before = unit[-1]
+
+
+def _stream_safety() -> Optional[tuple]:
+    """
+    (patterns, safety rules) for checking the stream sentence by sentence,
+    or None when the sentence pre-screen is off (SAFETY_MODE=full) or has no
+    patterns; the voiceover then runs commentary → safety filter → TTS in
+    sequence, so nothing is spoken without a safety pass.
+    """
+    patterns = load_patterns() if SAFETY_MODE == "selective" else []
+    if not patterns:
+        log.warning(
+            f"No sentence pre-screen (SAFETY_MODE={SAFETY_MODE}, {len(patterns)} patterns) — "
+            "voiceover not streamed; running commentary, safety filter and TTS in sequence."
+        )
+        return None
+    # The commentary is written in LANGUAGE_MODE; one sentence is too short
+    # to detect its language reliably.
+    lang = LENINWARE_LANG_MODE or LANGUAGE_MODE
+    return patterns, load_safety_prompt(lang)
+
+
+def _voice_unit(client, unit: List[str], before: str, patterns: list, rules: str, voice: str) -> Tuple[str, bytes]:
+    """Safety-check one unit sentence by sentence, then speak it → (safe text, PCM)."""
+    # Flagged sentences are rewritten with the sentences on both sides as context.
+    context = [before, *unit]
+    for i in sorted(screen_sentences(unit, patterns)):
+        unit[i] = rewrite_sentence(client, context, i + 1, rules)
+    safe = "".join(unit)
+    return safe, synthesize_pcm(client, safe.strip(), voice) if safe.strip() else b""
+
+
+async def _voice_unit_async(client, unit: List[str], before: str, patterns: list, rules: str, voice: str) -> Tuple[str, bytes]:
+    context = [before, *unit]
+    for i in sorted(screen_sentences(unit, patterns)):
+        unit[i] = await rewrite_sentence_async(client, context, i + 1, rules)
+    safe = "".join(unit)
+    return safe, await synthesize_pcm_async(client, safe.strip(), voice) if safe.strip() else b""
+
+
+def _sequential(summary_text: str, output_path: str) -> Tuple[str, Optional[str]]:
+    """Steps 5, 6 and 10 one after another."""
+    commentary = generate_leninware_commentary(summary_text)
+    if not commentary:
+        return "", None
+    safe_script = apply_script_safety_filter(commentary)
+    return safe_script, generate_tts_audio(safe_script, output_path)
+
+
+async def _sequential_async(summary_text: str, output_path: str) -> Tuple[str, Optional[str]]:
+    commentary = await generate_leninware_commentary_async(summary_text)
+    if not commentary:
+        return "", None
+    safe_script = await apply_script_safety_filter_async(commentary)
+    return safe_script, await generate_tts_audio_async(safe_script, output_path)
+
+
+def _assemble(results: List[Tuple[str, bytes]], output_path: str, t0: float, t_text: float) -> Tuple[str, str]:
+    safe_script = "".join(text for text, _ in results).strip()
+    write_wav(output_path, (pcm for _, pcm in results))
+
+    sp = current_span()
+    sp.set("units", len(results))
+    sp.set("generation_s", round(t_text - t0, 3))
+    sp.set("audio_ready_s", round(time.monotonic() - t0, 3))
+    log.info(
+        f"Voiceover ready {time.monotonic() - t0:.1f}s after start "
+        f"(text finished at {t_text - t0:.1f}s, {len(results)} TTS units)"
+    )
+    return safe_script, output_path
+
+
+@traced("stage.voiceover")
+def stream_commentary_to_audio(summary_text: str, output_path: str) -> Tuple[str, Optional[str]]:
+    """
+    Steps 5, 6 and 10 overlapped → (safe script, audio path). The commentary
+    is streamed; each finished group of sentences is safety-checked (local
+    pre-screen, LLM rewrite of flagged sentences only) and sent to TTS while
+    the rest is still being written. The PCM pieces are joined in order
+    into one WAV. If any piece fails, the whole safe script is spoken in
+    one TTS call instead. Without a sentence pre-screen (SAFETY_MODE=full or
+    no patterns) the steps run in sequence.
+    """
+    voice = select_voice()
+
+    # ----------------------------------------------------
+    # MOCK MODE — the sequential stages' mocks
+    # ----------------------------------------------------
+    if USE_MOCK_AI:
+        return _sequential(summary_text, output_path)
+
+    safety = _stream_safety()
+    if safety is None:
+        return _sequential(summary_text, output_path)
+    patterns, rules = safety
+
+    # ----------------------------------------------------
+    # REAL MODE — stream → sentences → safety → TTS
+    # ----------------------------------------------------
+    client = openai_scheduler.get_client()
+    # Unit workers run in the context of this stage, not of the commentary
+    # stage whose callback dispatches them (and whose deadline ends first).
+    ctx = copy_context()
+    futures = []
+    t0 = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=STREAM_TTS_CONCURRENCY) as pool:
+        units = _Units(lambda unit, before: futures.append(
+            pool.submit(ctx.copy().run, _voice_unit, client, unit, before, patterns, rules, voice)
+        ))
+        commentary = stream_leninware_commentary(summary_text, units.on_text)
+        units.close()
+        t_text = time.monotonic()
+
+        results, failed = [], 0
+        for f in futures:
+            try:
+                results.append(f.result())
+            except Exception as e:
+                log.error(f"TTS unit failed: {e}")
+                failed += 1
+
+    if not commentary:
+        return "", None
+
+    if failed:
+        inc("leninware_voiceover_fallback_total")
+        log.warning(f"FALLBACK — {failed} unit(s) failed; safety filter + TTS over the whole script.")
+        safe_script = apply_script_safety_filter(commentary)
+        return safe_script, generate_tts_audio(safe_script, output_path)
+
+    return _assemble(results, output_path, t0, t_text)
+
+
+@traced("stage.voiceover")
+async def stream_commentary_to_audio_async(summary_text: str, output_path: str) -> Tuple[str, Optional[str]]:
+    """Async stream_commentary_to_audio(): same result and fallback."""
+    voice = select_voice()
+
+    if USE_MOCK_AI:
+        return await _sequential_async(summary_text, output_path)
+
+    safety = _stream_safety()
+    if safety is None:
+        return await _sequential_async(summary_text, output_path)
+    patterns, rules = safety
+
+    ctx = copy_context()
+    limit = asyncio.Semaphore(STREAM_TTS_CONCURRENCY)
+    tasks = []
+    t0 = time.monotonic()
+
+    client = openai_scheduler.get_async_client()
+
+    async def voice_unit(unit: List[str], before: str) -> Tuple[str, bytes]:
+        async with limit:
+            return await _voice_unit_async(client, unit, before, patterns, rules, voice)
+
+    units = _Units(lambda unit, before: tasks.append(
+        asyncio.create_task(voice_unit(unit, before), context=ctx.copy())
+    ))
+    commentary = await stream_leninware_commentary_async(summary_text, units.on_text)
+    units.close()
+    t_text = time.monotonic()
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+
+    if not commentary:
+        return "", None
+
+    failed = [o for o in outcomes if isinstance(o, BaseException)]
+    if failed:
+        inc("leninware_voiceover_fallback_total")
+        log.warning(f"FALLBACK — {len(failed)} unit(s) failed ({failed[0]}); safety filter + TTS over the whole script.")
+        safe_script = await apply_script_safety_filter_async(commentary)
+        return safe_script, await generate_tts_audio_async(safe_script, output_path)
+
+    return _assemble(outcomes, output_path, t0, t_text)
@@ -0,0 +1,251 @@
+# workspace.py
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+from config import WORKSPACE_ROOT, WORKSPACE_DISK_BUDGET_MB, RUN_DEADLINE_S
+from telemetry import inc
+from pipeline_logging import get_logger
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: only in-process locking
+    fcntl = None
+
+log = get_logger("workspace")
+
+STATE_FILE = "job.json"
+
+ACTIVE = "active"
+DONE = "done"
+FAILED = "failed"
+
+# An active workspace older than the run deadline plus this is abandoned
+# even if its pid is alive (pid reuse, or a run on another host).
+STALE_GRACE_S = 600
+
+_gc_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+#   ATOMIC WRITES AND FILE LOCKS
+# ---------------------------------------------------------
+@contextmanager
+def atomic_output(path: str):
+    """
+    Yield a temporary path next to `path`; on success it is renamed over
+    `path`, on error it is removed. Readers never see a partial file.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def atomic_write(path: str, data: bytes) -> str:
+    with atomic_output(path) as tmp:
+        with open(tmp, "wb") as f:
+            f.write(data)
+    return path
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Exclusive lock on `<path>.lock` across processes, for a file several
+    runs read-modify-write. Without fcntl (not POSIX) it is a no-op and
+    only the caller's in-process lock applies.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as lf:
+        fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+
+
+# ---------------------------------------------------------
+#   WORKSPACE
+# ---------------------------------------------------------
+class Workspace:
+    """
+    Private directory for one pipeline run:
+
+        <root>/<job_id>/images/frame_<i>.png
+        <root>/<job_id>/audio.wav
+        <root>/<job_id>/final.mp4
+        <root>/<job_id>/job.json     state (active / done / failed) + timestamps
+    """
+
+    def __init__(self, job_id: str, root: str = WORKSPACE_ROOT):
+        self.job_id = job_id
+        self.root = root
+        self.dir = os.path.join(root, job_id)
+
+    @property
+    def images_dir(self) -> str:
+        return os.path.join(self.dir, "images")
+
+    @property
+    def audio_path(self) -> str:
+        return os.path.join(self.dir, "audio.wav")
+
+    @property
+    def video_dir(self) -> str:
+        return self.dir
+
+    def create(self) -> "Workspace":
+        os.makedirs(self.images_dir, exist_ok=True)
+        self._write_state({
+            "state": ACTIVE,
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "started_at": time.time(),
+        })
+        log.debug(f"Workspace ready: {self.dir}")
+        return self
+
+    def finish(self, state: str = DONE) -> None:
+        info = _read_state(self.dir) or {}
+        info.update(state=state, finished_at=time.time())
+        self._write_state(info)
+
+    def _write_state(self, info: dict) -> None:
+        atomic_write(os.path.join(self.dir, STATE_FILE), json.dumps(info).encode("utf-8"))
+
+
+@contextmanager
+def job_workspace(job_id: str, root: str = WORKSPACE_ROOT):
+    """
+    Create a workspace for the duration of a run. On exit it is marked done
+    (or failed) and finished workspaces are trimmed to the disk budget.
+    """
+    ws = Workspace(job_id, root).create()
+    try:
+        yield ws
+    except BaseException:
+        ws.finish(FAILED)
+        collect_garbage(root, keep=ws.job_id)
+        raise
+    ws.finish(DONE)
+    collect_garbage(root, keep=ws.job_id)
+
+
+# ---------------------------------------------------------
+#   GARBAGE COLLECTION
+# ---------------------------------------------------------
+def _read_state(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(path, STATE_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # exists, owned by another user
+        return True
+    return True
+
+
+def _abandoned(info: dict, now: float) -> bool:
+    """
+    An active workspace whose run can no longer finish: its process is gone
+    (checked only on the host that created it), or it started longer ago
+    than any run may last.
+    """
+    pid = info.get("pid")
+    if isinstance(pid, int) and info.get("host") == socket.gethostname() and not _pid_alive(pid):
+        return True
+    started = info.get("started_at")
+    if RUN_DEADLINE_S > 0 and isinstance(started, (int, float)):
+        return now - started > RUN_DEADLINE_S + STALE_GRACE_S
+    return False
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    try:
+                        total += entry.stat(follow_symlinks=False).st_size
+                    except FileNotFoundError:
+                        pass
+    return total
+
+
+def collect_garbage(
+    root: str = WORKSPACE_ROOT,
+    budget_bytes: Optional[int] = None,
+    keep: str = "",
+) -> List[str]:
+    """
+    Delete finished workspaces, oldest first, until every workspace under
+    `root` fits in the budget. Active workspaces are kept unless abandoned
+    (their process died, or they outlived the run deadline); `keep` is never
+    removed. Returns the removed job ids.
+    """
+    if budget_bytes is None:
+        budget_bytes = int(WORKSPACE_DISK_BUDGET_MB * 1024 * 1024)
+    if budget_bytes <= 0 or not os.path.isdir(root):
+        return []
+
+    with _gc_lock:
+        total = 0
+        finished = []
+        now = time.time()
+        with os.scandir(root) as it:
+            dirs = [e for e in it if e.is_dir(follow_symlinks=False)]
+        for entry in dirs:
+            size = _dir_size(entry.path)
+            total += size
+            info = _read_state(entry.path) or {}
+            if entry.name == keep:
+                continue
+            if info.get("state") in (DONE, FAILED):
+                finished.append((info.get("finished_at", 0), entry.name, entry.path, size))
+            elif info.get("state") == ACTIVE and _abandoned(info, now):
+                log.debug(f"Workspace {entry.name} is abandoned (pid {info.get('pid')})")
+                finished.append((info.get("started_at", 0), entry.name, entry.path, size))
+
+        removed = []
+        for _, name, path, size in sorted(finished):
+            if total <= budget_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed.append(name)
+            inc("leninware_workspaces_removed_total")
+
+    if removed:
+        log.info(f"Removed {len(removed)} finished or abandoned workspace(s); {total / 1024 / 1024:.1f} MiB in use")
+    return removed
@@ -1,12 +1,20 @@
 # youtube_ingester.py
 
 import re
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import List, Dict
-import requests
 import isodate
 
-from config import USE_MOCK_AI, YOUTUBE_API_KEY
+from config import USE_MOCK_AI, YOUTUBE_API_KEY, YOUTUBE_API_BASE_URL
+import http_client
+from deadlines import DeadlineExceeded
+from telemetry import span, traced
+from youtube_quota import get_budget, is_quota_error, LOW
+from pipeline_logging import get_logger
+
+log = get_logger("ingest")
+mock_log = get_logger("ingest:mock")
 
 CHANNELS_FILE = Path("prompts/youtube_channels.txt")
 CHANNEL_URL_RE = re.compile(r"/channel/([A-Za-z0-9_-]+)")
@@ -27,7 +35,7 @@ def load_channel_ids() -> List[str]:
         else:
             ids.append(line)
 
-    print(f"[ingest] Loaded {len(ids)} channels from {CHANNELS_FILE}")
+    log.info(f"Loaded {len(ids)} channels from {CHANNELS_FILE}")
     return ids
 
 
@@ -37,40 +45,54 @@ def _get_video_duration(video_id: str) -> int:
     Returns 0 for Shorts or unknown.
     """
 
-    print(f"[ingest] Fetching duration for video: {video_id}")
+    log.debug(f"Fetching duration for video: {video_id}")
+
+    if not get_budget().try_spend("videos.list", LOW):
+        log.debug(f"Deferring duration lookup for {video_id} — quota reserved")
+        return 0
 
     url = (
-        "https://www.googleapis.com/youtube/v3/videos"
+        f"{YOUTUBE_API_BASE_URL}/videos"
         f"?key={YOUTUBE_API_KEY}"
         "&part=contentDetails"
         f"&id={video_id}"
     )
 
     try:
-        resp = requests.get(url).json()
+        with span("http.youtube.videos", part="contentDetails") as sp:
+            raw = http_client.get(url)
+            sp.set("bytes_in", len(raw.content))
+            resp = raw.json()
+    except DeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"[ingest] ERROR requesting duration for {video_id}: {e}")
+        log.error(f"requesting duration for {video_id}: {e}")
+        return 0
+
+    if is_quota_error(resp):
+        get_budget().mark_exhausted()
         return 0
 
     items = resp.get("items", [])
     if not items:
-        print(f"[ingest] No duration info for {video_id} (items empty)")
+        log.debug(f"No duration info for {video_id} (items empty)")
         return 0
 
     iso = items[0]["contentDetails"].get("duration")
     if not iso:
-        print(f"[ingest] Missing ISO duration for {video_id}")
+        log.debug(f"Missing ISO duration for {video_id}")
         return 0
 
     try:
         duration = int(isodate.parse_duration(iso).total_seconds())
-        print(f"[ingest] Duration for {video_id}: {duration}s")
+        log.debug(f"Duration for {video_id}: {duration}s")
         return duration
     except Exception as e:
-        print(f"[ingest] Failed to parse duration '{iso}' for {video_id}: {e}")
+        log.warning(f"Failed to parse duration '{iso}' for {video_id}: {e}")
         return 0
 
 
+@traced("stage.ingest")
 def get_recent_candidates(max_results: int = 5) -> List[Dict]:
     """
     Returns list of video candidates.
@@ -81,18 +103,19 @@ def get_recent_candidates(max_results: int = 5) -> List[Dict]:
     # MOCK MODE
     # ----------------------------------------------------
     if USE_MOCK_AI:
-        print("[ingest:mock] Returning mock YouTube videos.")
+        mock_log.info("Returning mock YouTube videos.")
         mock = [
             {
                 "video_id": f"mockvideo{i}",
                 "title": f"Mock Video #{i}",
                 "channel": "Mock Channel",
                 "duration_s": 300 + i * 10,
+                "published_at": (datetime.now(timezone.utc) - timedelta(hours=6 * i)).isoformat(),
                 "url": f"https://www.youtube.com/watch?v=mockvideo{i}",
             }
             for i in range(1, max_results + 1)
         ]
-        print(f"[ingest:mock] Produced {len(mock)} mock videos")
+        mock_log.info(f"Produced {len(mock)} mock videos")
         return mock
 
     # ----------------------------------------------------
@@ -101,72 +124,97 @@ def get_recent_candidates(max_results: int = 5) -> List[Dict]:
     channel_ids = load_channel_ids()
     candidates = []
 
-    print(f"[ingest] Starting ingest across {len(channel_ids)} channels...")
-
-    for channel_id in channel_ids:
-        print(f"\n[ingest] Querying channel: {channel_id}")
-
-        url = (
-            "https://www.googleapis.com/youtube/v3/search"
-            f"?key={YOUTUBE_API_KEY}"
-            f"&channelId={channel_id}"
-            "&part=snippet"
-            "&order=date"
-            f"&maxResults={max_results}"
-        )
-
-        try:
-            resp = requests.get(url).json()
-        except Exception as e:
-            print(f"[ingest] ERROR calling YouTube search for {channel_id}: {e}")
-            continue
+    log.info(f"Starting ingest across {len(channel_ids)} channels...")
 
-        items = resp.get("items", [])
-        print(f"[ingest] API returned {len(items)} items")
+    budget = get_budget()
 
-        if "error" in resp:
-            print(f"[ingest] YT API ERROR: {resp['error']}")
-            continue
+    # Once the stage deadline passes every request raises; stop there and
+    # rank what was found instead of failing each remaining channel.
+    n = 0
+    try:
+        for n, channel_id in enumerate(channel_ids):
+            if not budget.try_spend("search.list", LOW):
+                log.info(
+                    f"Quota reserved for uploads — deferring {len(channel_ids) - n} channel refreshes "
+                    f"({budget.used()}/{budget.daily_budget} units used today)"
+                )
+                break
+
+            log.debug(f"Querying channel: {channel_id}")
+
+            url = (
+                f"{YOUTUBE_API_BASE_URL}/search"
+                f"?key={YOUTUBE_API_KEY}"
+                f"&channelId={channel_id}"
+                "&part=snippet"
+                "&order=date"
+                f"&maxResults={max_results}"
+            )
 
-        for item in items:
-            kind = item.get("id", {}).get("kind")
-            if kind != "youtube#video":
-                print(f"[ingest] Skipping non-video item: {kind}")
+            try:
+                with span("http.youtube.search", channel_id=channel_id) as sp:
+                    raw = http_client.get(url)
+                    sp.set("bytes_in", len(raw.content))
+                    resp = raw.json()
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                log.error(f"calling YouTube search for {channel_id}: {e}")
                 continue
 
-            video_id = item["id"].get("videoId")
-            title = item["snippet"]["title"]
-            channel_title = item["snippet"]["channelTitle"]
-            watch_url = f"https://www.youtube.com/watch?v={video_id}"
-
-            print(f"\n[ingest] Found video:")
-            print(f"         Title: {title}")
-            print(f"         ID:    {video_id}")
-
-            # ------------------------------------------------
-            # Fetch duration
-            # ------------------------------------------------
-            dur_s = _get_video_duration(video_id)
+            items = resp.get("items", [])
+            log.debug(f"API returned {len(items)} items")
 
-            if dur_s <= 0:
-                print(f"[ingest] Rejecting '{title}' — could not determine duration")
+            if "error" in resp:
+                log.error(f"YT API ERROR: {resp['error']}")
+                if is_quota_error(resp):
+                    budget.mark_exhausted()
+                    break
                 continue
 
-            if dur_s < 300:
-                print(f"[ingest] Rejecting '{title}' — too short ({dur_s}s)")
-                continue
-
-            print(f"[ingest] ACCEPTING '{title}' ({dur_s}s)")
-
-            candidates.append(
-                {
-                    "video_id": video_id,
-                    "title": title,
-                    "channel": channel_title,
-                    "duration_s": dur_s,
-                    "url": watch_url,
-                }
-            )
+            for item in items:
+                kind = item.get("id", {}).get("kind")
+                if kind != "youtube#video":
+                    log.debug(f"Skipping non-video item: {kind}")
+                    continue
+
+                video_id = item["id"].get("videoId")
+                title = item["snippet"]["title"]
+                channel_title = item["snippet"]["channelTitle"]
+                watch_url = f"https://www.youtube.com/watch?v={video_id}"
+
+                log.debug(f"Found video: {title} ({video_id})")
+
+                # ------------------------------------------------
+                # Fetch duration
+                # ------------------------------------------------
+                dur_s = _get_video_duration(video_id)
+
+                if dur_s <= 0:
+                    log.debug(f"Rejecting '{title}' — could not determine duration")
+                    continue
+
+                if dur_s < 300:
+                    log.debug(f"Rejecting '{title}' — too short ({dur_s}s)")
+                    continue
+
+                log.debug(f"ACCEPTING '{title}' ({dur_s}s)")
+
+                candidates.append(
+                    {
+                        "video_id": video_id,
+                        "title": title,
+                        "channel": channel_title,
+                        "duration_s": dur_s,
+                        "published_at": item["snippet"].get("publishedAt"),
+                        "url": watch_url,
+                    }
+                )
+    except DeadlineExceeded:
+        log.warning(
+            f"Ingest deadline reached after {n} of {len(channel_ids)} channels; "
+            f"keeping {len(candidates)} candidates"
+        )
 
-    print(f"\n[ingest] Finished ingest. Accepted {len(candidates)} videos total.")
+    log.info(f"Finished ingest. Accepted {len(candidates)} videos total.")
     return candidates
\ No newline at end of file
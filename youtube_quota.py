@@ -0,0 +1,153 @@
+# youtube_quota.py
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from config import (
+    YOUTUBE_QUOTA_DAILY,
+    YOUTUBE_QUOTA_UPLOAD_RESERVE,
+    YOUTUBE_QUOTA_STATE_PATH,
+)
+from telemetry import inc
+from workspace import atomic_write, file_lock
+from pipeline_logging import get_logger
+
+log = get_logger("quota")
+
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TZ = ZoneInfo("America/Los_Angeles")  # YouTube quota resets at midnight Pacific
+except Exception:
+    _QUOTA_TZ = timezone.utc
+
+# Quota units per YouTube Data API v3 method.
+METHOD_COSTS = {
+    "search.list": 100,
+    "videos.list": 1,
+    "channels.list": 1,
+    "videos.insert": 1600,
+}
+
+# Call priorities. Only HIGH may spend the upload reserve.
+HIGH = "high"        # uploads
+NORMAL = "normal"    # virality stats
+LOW = "low"          # ingest refreshes — deferred first
+
+
+class QuotaExceeded(RuntimeError):
+    """Raised when a HIGH-priority call does not fit in today's remaining quota."""
+
+
+class QuotaBudget:
+    """
+    Daily YouTube quota ledger shared by every module in the process.
+
+    Usage is persisted to a small JSON file (rewritten atomically) so the
+    budget carries across runs. Each charge re-reads, checks and rewrites it
+    under an exclusive file lock, so separate processes (ingest, virality,
+    upload) never lose each other's spending. LOW and NORMAL calls may only use
+    the budget above the upload reserve; when they do not fit they are
+    deferred (try_spend returns False) instead of failing later at the API.
+    """
+
+    def __init__(
+        self,
+        daily_budget: int = YOUTUBE_QUOTA_DAILY,
+        upload_reserve: int = YOUTUBE_QUOTA_UPLOAD_RESERVE,
+        state_path: str = YOUTUBE_QUOTA_STATE_PATH,
+    ):
+        self.daily_budget = daily_budget
+        self.upload_reserve = min(upload_reserve, daily_budget)
+        self.state_path = state_path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(_QUOTA_TZ).date().isoformat()
+
+    def _read(self) -> dict:
+        today = self._today()
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if state.get("day") != today:
+            state = {"day": today, "used": 0, "by_method": {}}
+        return state
+
+    def _write(self, state: dict) -> None:
+        atomic_write(self.state_path, json.dumps(state).encode("utf-8"))
+
+    def _limit(self, priority: str) -> int:
+        if priority == HIGH:
+            return self.daily_budget
+        return self.daily_budget - self.upload_reserve
+
+    def used(self) -> int:
+        with self._lock:
+            return self._read()["used"]
+
+    def remaining(self, priority: str = LOW) -> int:
+        """Units still available to calls of this priority today."""
+        with self._lock:
+            return max(self._limit(priority) - self._read()["used"], 0)
+
+    def try_spend(self, method: str, priority: str = LOW, calls: int = 1) -> bool:
+        """Charge `calls` × the method's cost if it fits; False means defer."""
+        cost = METHOD_COSTS[method] * calls
+        with self._lock, file_lock(self.state_path):
+            state = self._read()
+            if state["used"] + cost > self._limit(priority):
+                inc("leninware_youtube_quota_deferred_total", calls, method=method, priority=priority)
+                log.debug(
+                    f"Deferring {method} ×{calls} ({cost} units, {priority}): "
+                    f"{state['used']}/{self.daily_budget} used"
+                )
+                return False
+            state["used"] += cost
+            state["by_method"][method] = state["by_method"].get(method, 0) + cost
+            self._write(state)
+
+        inc("leninware_youtube_quota_units_total", cost, method=method, priority=priority)
+        return True
+
+    def spend(self, method: str, priority: str = HIGH, calls: int = 1) -> None:
+        """Like try_spend, but raises QuotaExceeded instead of deferring."""
+        if not self.try_spend(method, priority, calls):
+            raise QuotaExceeded(
+                f"YouTube quota exhausted: {method} needs {METHOD_COSTS[method] * calls} units, "
+                f"{self.remaining(priority)} left today"
+            )
+
+    def mark_exhausted(self) -> None:
+        """The API reported quotaExceeded; stop spending until the daily reset."""
+        with self._lock, file_lock(self.state_path):
+            state = self._read()
+            state["used"] = max(state["used"], self.daily_budget)
+            self._write(state)
+        log.warning("YouTube API reported quota exhausted; deferring calls until reset")
+
+
+def is_quota_error(resp: dict) -> bool:
+    """True for a YouTube API error body whose reason is a quota/rate limit."""
+    err = resp.get("error") if isinstance(resp, dict) else None
+    if not isinstance(err, dict):
+        return False
+    reasons = {e.get("reason") for e in err.get("errors", []) if isinstance(e, dict)}
+    return bool(reasons & {"quotaExceeded", "dailyLimitExceeded"})
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_budget() -> QuotaBudget:
+    """Process-wide budget shared by ingest, virality and upload."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = QuotaBudget()
+        return _budget
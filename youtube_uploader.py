@@ -1,39 +1,294 @@
 # youtube_uploader.py
 
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
 from typing import List, Optional
 
-from config import USE_MOCK_AI, require_env
+from config import (
+    USE_MOCK_AI,
+    require_env,
+    GOOGLE_TOKEN_URI,
+    YOUTUBE_DISCOVERY_URL,
+    YOUTUBE_UPLOAD_CHUNK_MB,
+    YOUTUBE_UPLOAD_MAX_RETRIES,
+    YOUTUBE_UPLOAD_SESSION_DIR,
+    YOUTUBE_TOKEN_REFRESH_MARGIN_S,
+)
+import http_client
+from http_client import RETRY_STATUSES, backoff, fits_deadline
+from telemetry import span, traced, inc
+from youtube_quota import get_budget, HIGH
+from workspace import atomic_write
+from pipeline_logging import get_logger
 
 # Only import Google APIs if NOT in mock mode
 if not USE_MOCK_AI:
+    import httplib2
+    from google.auth.transport.requests import Request as GoogleAuthRequest
     from google.oauth2.credentials import Credentials
-    from googleapiclient.discovery import build
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+    from googleapiclient.errors import HttpError
     from googleapiclient.http import MediaFileUpload
 
+log = get_logger("upload")
+mock_log = get_logger("upload:mock")
+
 YOUTUBE_UPLOAD_SCOPE = "https://www.googleapis.com/auth/youtube.upload"
-TOKEN_URI = "https://oauth2.googleapis.com/token"
+TOKEN_URI = GOOGLE_TOKEN_URI
+
+# Resumable chunks must be a multiple of 256 KiB (except the last one).
+CHUNK_GRANULARITY = 256 * 1024
+# YouTube keeps an upload session for about a week; don't try older ones.
+SESSION_MAX_AGE_S = 6 * 24 * 3600
+
+_MIB = 1024 * 1024
+
+
+class _SessionExpired(Exception):
+    """The saved session URI is no longer known to YouTube."""
+
+
+# ---------------------------------------------------------
+#   CLIENT + CREDENTIALS (built once per process)
+# ---------------------------------------------------------
+_auth_lock = threading.Lock()
+_credentials = None
+_discovery_doc: Optional[dict] = None
+_local = threading.local()
+
+
+def _get_credentials():
+    """
+    Process-wide OAuth credentials. The access token is exchanged once and
+    only refreshed when it is within YOUTUBE_TOKEN_REFRESH_MARGIN_S of expiry.
+    """
+    global _credentials
+    with _auth_lock:
+        if _credentials is None:
+            # ✔ FIXED: match config.py variable names exactly
+            _credentials = Credentials(
+                token=None,
+                refresh_token=require_env("GOOGLE_REFRESH_TOKEN"),
+                token_uri=TOKEN_URI,
+                client_id=require_env("GOOGLE_CLIENT_ID"),
+                client_secret=require_env("GOOGLE_CLIENT_SECRET"),
+                scopes=[YOUTUBE_UPLOAD_SCOPE],
+            )
+
+        creds = _credentials
+        now = datetime.now(timezone.utc).replace(tzinfo=None)  # google-auth keeps naive UTC
+        if creds.token is None or (
+            creds.expiry is not None
+            and (creds.expiry - now).total_seconds() < YOUTUBE_TOKEN_REFRESH_MARGIN_S
+        ):
+            with span("http.google.token"):
+                creds.refresh(GoogleAuthRequest(http_client.get_session()))
+            inc("leninware_google_token_refreshes_total")
+            log.debug(f"Refreshed YouTube access token (expires {creds.expiry})")
+        return creds
+
+
+def _discovery_document() -> dict:
+    """
+    The YouTube v3 discovery document: the static copy bundled with
+    googleapiclient, or (for stand-in servers) YOUTUBE_DISCOVERY_URL fetched
+    once per process.
+    """
+    global _discovery_doc
+    with _auth_lock:
+        if _discovery_doc is None:
+            if YOUTUBE_DISCOVERY_URL:
+                url = YOUTUBE_DISCOVERY_URL.format(api="youtube", apiVersion="v3")
+                with span("http.youtube.discovery"):
+                    resp = http_client.get(url)
+                    resp.raise_for_status()
+                _discovery_doc = resp.json()
+            else:
+                doc = get_static_doc("youtube", "v3")
+                if doc is None:
+                    raise RuntimeError("googleapiclient has no bundled youtube v3 discovery document")
+                _discovery_doc = json.loads(doc)
+        return _discovery_doc
 
 
 def _get_youtube_client():
-    """Build an authenticated YouTube client using OAuth refresh token."""
-
-    # ✔ FIXED: match config.py variable names exactly
-    client_id = require_env("GOOGLE_CLIENT_ID")
-    client_secret = require_env("GOOGLE_CLIENT_SECRET")
-    refresh_token = require_env("GOOGLE_REFRESH_TOKEN")
-
-    creds = Credentials(
-        token=None,
-        refresh_token=refresh_token,
-        token_uri=TOKEN_URI,
-        client_id=client_id,
-        client_secret=client_secret,
-        scopes=[YOUTUBE_UPLOAD_SCOPE],
+    """
+    Authenticated YouTube client. Built once per thread (httplib2 connections
+    are not thread-safe) from the cached discovery document; all threads
+    share one set of credentials.
+    """
+    creds = _get_credentials()
+    client = getattr(_local, "youtube", None)
+    if client is None:
+        client = build_from_document(_discovery_document(), credentials=creds)
+        _local.youtube = client
+    return client
+
+
+def _chunk_size() -> int:
+    """YOUTUBE_UPLOAD_CHUNK_MB in bytes, rounded to 256 KiB; -1 = single request."""
+    if YOUTUBE_UPLOAD_CHUNK_MB <= 0:
+        return -1
+    size = int(YOUTUBE_UPLOAD_CHUNK_MB * _MIB)
+    return max(CHUNK_GRANULARITY, size // CHUNK_GRANULARITY * CHUNK_GRANULARITY)
+
+
+# ---------------------------------------------------------
+#   SESSION STATE (one small JSON file per in-progress upload)
+# ---------------------------------------------------------
+def _session_key(video_path: str, body: dict) -> str:
+    """Content hash of the file plus its metadata: a session only resumes the same upload."""
+    h = hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8"))
+    with open(video_path, "rb") as f:
+        for block in iter(lambda: f.read(_MIB), b""):
+            h.update(block)
+    return h.hexdigest()[:32]
+
+
+def _session_path(key: str) -> str:
+    return os.path.join(YOUTUBE_UPLOAD_SESSION_DIR, f"{key}.json")
+
+
+def _load_session(key: str) -> Optional[dict]:
+    try:
+        with open(_session_path(key), encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - state.get("created_at", 0) > SESSION_MAX_AGE_S:
+        log.info("Saved upload session is too old to resume; starting a new one")
+        _clear_session(key)
+        return None
+    return state
+
+
+def _save_session(key: str, state: dict) -> None:
+    atomic_write(_session_path(key), json.dumps(state).encode("utf-8"))
+
+
+def _clear_session(key: str) -> None:
+    try:
+        os.remove(_session_path(key))
+    except FileNotFoundError:
+        pass
+
+
+# ---------------------------------------------------------
+#   CHUNK LOOP
+# ---------------------------------------------------------
+def _query_session(request, total: int) -> tuple:
+    """
+    Ask YouTube how much of the session at request.resumable_uri it holds,
+    as the resumable upload protocol describes: an empty PUT with
+    "Content-Range: bytes */<size>" → (confirmed bytes, the video resource
+    if the upload had already completed, else None).
+    """
+    resp, content = request.http.request(
+        request.resumable_uri,
+        "PUT",
+        headers={"Content-Range": f"bytes */{total}", "content-length": "0"},
+    )
+    if resp.status in (200, 201):
+        return total, json.loads(content)
+    if resp.status == 308:
+        # "Range: bytes=0-<last byte received>", absent when nothing arrived yet.
+        received = resp.get("range", "")
+        return (int(received.rsplit("-", 1)[1]) + 1 if received else 0), None
+    raise HttpError(resp, content, uri=request.resumable_uri)
+
+
+def _with_retries(call, request, sp):
+    """
+    call() (a chunk or a session query) with jittered backoff on 5xx/429 and
+    transport errors. After a failed chunk googleapiclient asks the server
+    how many bytes it has before sending again, so a retry never re-sends
+    confirmed data.
+    """
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except HttpError as e:
+            status = e.resp.status
+            if status in (404, 410) and request.resumable_uri:
+                raise _SessionExpired(str(e)) from e
+            if status not in RETRY_STATUSES or attempt >= YOUTUBE_UPLOAD_MAX_RETRIES:
+                raise
+            error, reason = e, f"HTTP {status}"
+        except (OSError, httplib2.HttpLib2Error) as e:
+            if attempt >= YOUTUBE_UPLOAD_MAX_RETRIES:
+                raise
+            error, reason = e, type(e).__name__
+
+        delay = backoff(attempt)
+        if not fits_deadline(delay):
+            raise error
+        log.warning(f"Upload chunk failed ({reason}); retry {attempt + 1}/{YOUTUBE_UPLOAD_MAX_RETRIES} in {delay:.2f}s")
+        sp.add("retries")
+        attempt += 1
+        time.sleep(delay)
+
+
+def _send(youtube, video_path: str, body: dict, key: str, session: Optional[dict]) -> dict:
+    media = MediaFileUpload(video_path, chunksize=_chunk_size(), resumable=True)
+    total = media.size()
+
+    request = youtube.videos().insert(
+        part="snippet,status",
+        body=body,
+        media_body=media,
     )
 
-    return build("youtube", "v3", credentials=creds)
+    with span("http.youtube.upload", bytes_out=total, chunk_size=media.chunksize()) as sp:
+        response = None
+        if session:
+            # Resume: continue from whatever YouTube confirms it holds.
+            request.resumable_uri = session["uri"]
+            confirmed, response = _with_retries(lambda: _query_session(request, total), request, sp)
+            request.resumable_progress = confirmed
+            session["confirmed"] = confirmed
+            log.info(f"Resuming upload session ({confirmed / _MIB:.1f} MiB confirmed by YouTube)")
+        else:
+            session = {"uri": None, "video_path": video_path, "size": total, "created_at": time.time(), "confirmed": 0}
+
+        # Bytes already on the server before this process sent anything.
+        start = session["confirmed"]
+        sp.set("resumed_from", start)
 
+        t0 = time.perf_counter()
+        while response is None:
+            status, response = _with_retries(request.next_chunk, request, sp)
+            sp.add("chunks")
 
+            confirmed = total if response is not None else request.resumable_progress
+            if response is None and (request.resumable_uri != session["uri"] or confirmed != session["confirmed"]):
+                session.update(uri=request.resumable_uri, confirmed=confirmed)
+                _save_session(key, session)
+
+            elapsed = time.perf_counter() - t0
+            rate = (confirmed - start) / elapsed if elapsed > 0 else 0.0
+            if status:
+                log.info(
+                    f"Upload progress: {int(status.progress() * 100)}% "
+                    f"({confirmed / _MIB:.1f}/{total / _MIB:.1f} MiB, {rate / _MIB:.2f} MiB/s)"
+                )
+
+        sent = total - start
+        elapsed = time.perf_counter() - t0
+        sp.set("bytes_sent", sent)
+        sp.set("throughput_bps", round(sent / elapsed) if elapsed > 0 else 0)
+        inc("leninware_upload_bytes_total", sent)
+
+    log.info(f"Uploaded {sent / _MIB:.1f} MiB in {elapsed:.1f}s ({sent / _MIB / max(elapsed, 1e-9):.2f} MiB/s)")
+    return response
+
+
+@traced("stage.upload")
 def upload_video(
     video_path: str,
     title: str,
@@ -48,6 +303,11 @@ def upload_video(
         - Skip upload entirely
         - Return fake video ID
         - Do NOT require OAuth or Google credentials
+
+    REAL MODE:
+        - Chunked resumable upload (YOUTUBE_UPLOAD_CHUNK_MB), retried per chunk
+        - An unfinished session for the same file and metadata is resumed
+          from the last confirmed byte instead of starting over
     """
 
     # ----------------------------------------------------
@@ -55,14 +315,12 @@ def upload_video(
     # ----------------------------------------------------
     if USE_MOCK_AI:
         fake_id = "MOCK_VIDEO_ID_12345"
-        print(f"[upload:mock] Skipping YouTube upload. Returning fake ID: {fake_id}")
+        mock_log.info(f"Skipping YouTube upload. Returning fake ID: {fake_id}")
         return fake_id
 
     # ----------------------------------------------------
     # REAL MODE — upload to YouTube
     # ----------------------------------------------------
-    youtube = _get_youtube_client()
-
     body = {
         "snippet": {
             "title": title,
@@ -76,20 +334,25 @@ def upload_video(
     if tags:
         body["snippet"]["tags"] = tags
 
-    media = MediaFileUpload(video_path, chunksize=-1, resumable=True)
+    key = _session_key(video_path, body)
+    session = _load_session(key)
 
-    request = youtube.videos().insert(
-        part="snippet,status",
-        body=body,
-        media_body=media,
-    )
+    # The insert was charged when the saved session was opened.
+    if not session:
+        # Raises QuotaExceeded before any bytes are sent if today's budget is spent.
+        get_budget().spend("videos.insert", HIGH)
+
+    youtube = _get_youtube_client()
 
-    response = None
-    while response is None:
-        status, response = request.next_chunk()
-        if status:
-            print(f"[upload] Upload progress: {int(status.progress() * 100)}%")
+    try:
+        response = _send(youtube, video_path, body, key, session)
+    except _SessionExpired:
+        log.warning("Saved upload session expired; restarting the upload")
+        _clear_session(key)
+        get_budget().spend("videos.insert", HIGH)
+        response = _send(youtube, video_path, body, key, None)
 
+    _clear_session(key)
     video_id = response.get("id")
-    print(f"[upload] Video uploaded. ID: {video_id}")
-    return video_id
\ No newline at end of file
+    log.info(f"Video uploaded. ID: {video_id}")
+    return video_id
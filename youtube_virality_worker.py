@@ -1,13 +1,59 @@
 #youtube_virality_worker.py
 
-import requests
 from typing import List, Dict
-from config import USE_MOCK_AI, YOUTUBE_API_KEY
+from config import (
+    USE_MOCK_AI,
+    YOUTUBE_API_KEY,
+    YOUTUBE_API_BASE_URL,
+    VIRALITY_MODE,
+    VIRALITY_WEIGHTS,
+    VIRALITY_TOP_K,
+    ENABLE_STATS_HISTORY,
+)
+from candidate_store import CandidateStore, parse_weights, DEFAULT_WEIGHTS, VELOCITY_WEIGHTS
+from stats_history import get_history
+from youtube_quota import get_budget, is_quota_error, NORMAL
+import http_client
+from telemetry import span, traced
+from pipeline_logging import get_logger
+
+log = get_logger("virality")
+mock_log = get_logger("virality:mock")
+
+_WEIGHTS = parse_weights(
+    VIRALITY_WEIGHTS,
+    VELOCITY_WEIGHTS if VIRALITY_MODE == "velocity" else DEFAULT_WEIGHTS,
+)
+
+
+# videos.list accepts up to 50 comma-separated ids per request.
+STATS_BATCH_SIZE = 50
+
+
+def _parse_stats(stats: dict) -> Dict:
+    return {
+        "views": int(stats.get("viewCount", 0)),
+        "likes": int(stats.get("likeCount", 0)) if "likeCount" in stats else 0,
+    }
 
 
-def _get_stats(video_id: str):
+def _get_stats_batch(video_ids: List[str]) -> Dict[str, Dict]:
+    """
+    Fetch YouTube stats for many videos, STATS_BATCH_SIZE ids per request.
+    Returns video_id → {"views", "likes"}; videos without stats are absent.
+    Every observation is appended to the stats history.
+    """
+    out = _fetch_stats(video_ids)
+    if ENABLE_STATS_HISTORY and out:
+        try:
+            get_history().record(out)
+        except Exception as e:
+            log.warning(f"recording stats history: {e}")
+    return out
+
+
+def _fetch_stats(video_ids: List[str]) -> Dict[str, Dict]:
     """
-    Fetch YouTube stats for a video.
     MOCK MODE: Return fake stats.
     """
 
@@ -15,91 +61,99 @@ def _get_stats(video_id: str):
     # MOCK MODE — return stable fake stats
     # ----------------------------------------------------
     if USE_MOCK_AI:
-        base = abs(hash(video_id)) % 5000
-        print(f"[virality:mock] Stats for {video_id}: views={5000+base}, likes={100+(base%300)}")
-        return {
-            "views": 5000 + base,
-            "likes": 100 + (base % 300),
-        }
+        out = {}
+        for video_id in video_ids:
+            base = abs(hash(video_id)) % 5000
+            mock_log.debug(f"Stats for {video_id}: views={5000+base}, likes={100+(base%300)}")
+            out[video_id] = {
+                "views": 5000 + base,
+                "likes": 100 + (base % 300),
+            }
+        return out
 
     # ----------------------------------------------------
     # REAL MODE — call YouTube API
     # ----------------------------------------------------
-    print(f"[virality] Fetching stats for video: {video_id}")
-
-    url = (
-        "https://www.googleapis.com/youtube/v3/videos"
-        f"?key={YOUTUBE_API_KEY}"
-        f"&part=statistics"
-        f"&id={video_id}"
-    )
-
-    try:
-        resp = requests.get(url).json()
-    except Exception as e:
-        print(f"[virality] ERROR requesting stats for {video_id}: {e}")
-        return None
-
-    if "error" in resp:
-        print(f"[virality] API ERROR for {video_id}: {resp['error']}")
-        return None
-
-    items = resp.get("items", [])
-    if not items:
-        print(f"[virality] No stats available for {video_id} (items empty)")
-        return None
-
-    stats = items[0].get("statistics", {})
-    if not stats:
-        print(f"[virality] Stats missing for {video_id}")
-        return None
+    out = {}
+    for i in range(0, len(video_ids), STATS_BATCH_SIZE):
+        batch = video_ids[i:i + STATS_BATCH_SIZE]
+        log.debug(f"Fetching stats for {len(batch)} videos")
+
+        if not get_budget().try_spend("videos.list", NORMAL):
+            log.warning(f"Quota reserved for uploads — skipping stats for {len(video_ids) - i} videos")
+            break
+
+        url = (
+            f"{YOUTUBE_API_BASE_URL}/videos"
+            f"?key={YOUTUBE_API_KEY}"
+            f"&part=statistics"
+            f"&id={','.join(batch)}"
+        )
+
+        try:
+            with span("http.youtube.videos", part="statistics", ids=len(batch)) as sp:
+                raw = http_client.get(url)
+                sp.set("bytes_in", len(raw.content))
+                resp = raw.json()
+        except Exception as e:
+            log.error(f"requesting stats for {len(batch)} videos: {e}")
+            continue
 
-    views = int(stats.get("viewCount", 0))
-    likes = int(stats.get("likeCount", 0)) if "likeCount" in stats else 0
+        if "error" in resp:
+            log.error(f"API ERROR for stats batch: {resp['error']}")
+            if is_quota_error(resp):
+                get_budget().mark_exhausted()
+                break
+            continue
 
-    print(f"[virality] Stats for {video_id}: views={views}, likes={likes}")
+        for item in resp.get("items", []):
+            stats = item.get("statistics", {})
+            if not stats:
+                log.debug(f"Stats missing for {item.get('id')}")
+                continue
+            out[item["id"]] = _parse_stats(stats)
+            log.debug(f"Stats for {item['id']}: views={out[item['id']]['views']}, likes={out[item['id']]['likes']}")
 
-    return {
-        "views": views,
-        "likes": likes,
-    }
+    return out
 
 
-def run_virality_pass(candidates: List[Dict]) -> List[Dict]:
+def _get_stats(video_id: str):
     """
-    Calculate a virality score and sort the candidates.
+    Fetch YouTube stats for a single video (None if unavailable).
     """
+    return _get_stats_batch([video_id]).get(video_id)
 
-    print(f"[virality] Starting virality scoring for {len(candidates)} candidates")
-
-    scored = []
 
-    for c in candidates:
-        print(f"\n[virality] Processing candidate: {c['title']} ({c['video_id']})")
+@traced("stage.virality")
+def run_virality_pass(candidates: List[Dict], top_k: int = VIRALITY_TOP_K) -> List[Dict]:
+    """
+    Calculate a virality score and return the top_k candidates, best first.
+    top_k <= 0 returns the full ranking.
+    """
 
-        stats = _get_stats(c["video_id"])
-        if not stats:
-            print(f"[virality] Skipping {c['video_id']} — no stats available")
-            continue
+    log.info(f"Starting virality scoring for {len(candidates)} candidates")
 
-        views = stats["views"]
-        likes = stats["likes"]
-        score = views + (likes * 20)
+    video_ids = [c["video_id"] for c in candidates]
+    stats = _get_stats_batch(video_ids)
 
-        print(f"[virality] Computed score: {score}  (views={views}, likes={likes})")
+    history = None
+    if VIRALITY_MODE == "velocity" and ENABLE_STATS_HISTORY:
+        history = get_history().velocity(video_ids)
+        log.info(f"Velocity from history for {len(history)}/{len(video_ids)} candidates")
 
-        scored.append({
-            **c,
-            "views": views,
-            "likes": likes,
-            "virality": score,
-        })
+    store = CandidateStore.from_stats(candidates, stats, history)
+    skipped = len(candidates) - len(store)
+    if skipped:
+        log.debug(f"Skipped {skipped} candidates with no stats available")
 
-    print(f"\n[virality] Sorting {len(scored)} scored candidates...")
-    scored.sort(key=lambda x: x["virality"], reverse=True)
+    log.info(f"Ranking {len(store)} scored candidates...")
+    scored = store.ranked(top_k, _WEIGHTS)
 
-    print("[virality] Final ranking:")
+    log.info("Final ranking:")
     for s in scored:
-        print(f"  {s['title']} — score={s['virality']} (views={s['views']}, likes={s['likes']})")
+        log.info(
+            f"  {s['title']} — score={s['virality']} (views={s['views']}, likes={s['likes']}, "
+            f"views/h={s['views_per_hour']}, accel={s['accel']})"
+        )
 
-    return scored
\ No newline at end of file
+    return scored